@@ -0,0 +1,67 @@
+'''Micro-benchmark: single pass inline lexer vs the five stage split pipeline
+
+    python3 bench/bench_inline.py [--links N] [--repeat R]
+'''
+import os
+import sys
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from textnode import TextNode, TextType
+from inline import tokenize_inline
+from utils import split_nodes_delimiter, split_nodes_image, split_nodes_link
+
+def split_pipeline(text):
+    '''text_to_textnodes as it was before the single pass lexer'''
+    nodes = [TextNode(text, TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+def link_heavy_paragraph(links):
+    '''Links and images with no other markup, so each stays in one long text node'''
+    parts = []
+    for i in range(links):
+        parts.append(f"See [series number {i}](https://example.com/posts/{i}) or ![figure {i}](/images/figure-{i}.png).")
+    return " ".join(parts)
+
+def mixed_paragraph(links):
+    parts = []
+    for i in range(links):
+        parts.append(f"Read **part {i}** of the [series number {i}](https://example.com/posts/{i}) "
+                     f"or see ![figure {i}](/images/figure-{i}.png) and `snippet{i}`.")
+    return " ".join(parts)
+
+PARAGRAPHS = {
+    "links": link_heavy_paragraph,
+    "mixed": mixed_paragraph,
+}
+
+def without_empty_text(nodes):
+    return [node for node in nodes if node.text_type != TextType.TEXT or node.text != ""]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, nargs="+", default=[10, 100, 1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'paragraph':>9} {'links':>7} {'chars':>9} {'split (ms)':>12} {'lexer (ms)':>12} {'speedup':>8}")
+    for name, make_paragraph in PARAGRAPHS.items():
+        for links in args.links:
+            text = make_paragraph(links)
+            if without_empty_text(split_pipeline(text)) != tokenize_inline(text):
+                raise Exception(f"lexer output differs from the split pipeline for {name} with {links} links")
+            number = max(1, 2000 // links)
+            split_time = min(timeit.repeat(lambda: split_pipeline(text), number=number, repeat=args.repeat)) / number
+            lexer_time = min(timeit.repeat(lambda: tokenize_inline(text), number=number, repeat=args.repeat)) / number
+            print(f"{name:>9} {links:>7} {len(text):>9} {split_time * 1000:>12.3f} {lexer_time * 1000:>12.3f} {split_time / lexer_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+'''Node count and memory per node for the HTMLNode trees of the largest pages
+
+    python3 bench/bench_nodes.py [markdown files or directories...] [--top N]
+'''
+import os
+import sys
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from htmlnode import LeafNode, ParentNode
+from textnode import TextNode, TextType
+from utils import iter_markdown_files, markdown_to_html_node
+
+def count_nodes(node):
+    counts = {"LeafNode": 0, "ParentNode": 0}
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        counts[type(item).__name__] += 1
+        if item.children:
+            stack.extend(item.children)
+    return counts
+
+class DictNode():
+    '''Same four attributes as the node classes, kept in a regular instance __dict__'''
+    def __init__(self, a, b, c, d):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.d = d
+
+def bytes_per_instance(factory, count=10000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Don't charge the list holding them to the instances
+    return (after - before - sys.getsizeof(instances)) / len(instances)
+
+def find_pages(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for rel_path in iter_markdown_files(path):
+                yield os.path.join(path, rel_path)
+        else:
+            yield path
+
+def measure(path):
+    with open(path) as f:
+        markdown = f.read()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree = markdown_to_html_node(markdown)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    counts = count_nodes(tree)
+    return path, len(markdown), counts, after - before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=["content"])
+    parser.add_argument("--top", type=int, default=10, help="how many of the largest pages to report")
+    args = parser.parse_args()
+
+    pages = sorted(find_pages(args.paths), key=os.path.getsize, reverse=True)[:args.top]
+    print(f"{'page':<50} {'chars':>9} {'nodes':>8} {'tree bytes':>11} {'bytes/node':>10}")
+    for path, chars, counts, tree_bytes in map(measure, pages):
+        nodes = sum(counts.values())
+        print(f"{path[-50:]:<50} {chars:>9} {nodes:>8} {tree_bytes:>11} {tree_bytes / nodes:>10.1f}")
+
+    print()
+    print(f"{'node':<12} {'slotted':>8} {'with __dict__':>14}")
+    samples = {
+        "TextNode": lambda: TextNode("text", TextType.LINK, "/url"),
+        "LeafNode": lambda: LeafNode("a", "text"),
+        "ParentNode": lambda: ParentNode("p", None),
+    }
+    dict_size = bytes_per_instance(lambda: DictNode("a", "text", None, None))
+    for name, factory in samples.items():
+        print(f"{name:<12} {bytes_per_instance(factory):>8.1f} {dict_size:>14.1f}")
+
+if __name__ == "__main__":
+    main()
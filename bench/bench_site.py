@@ -0,0 +1,217 @@
+'''Times every build stage on synthetic corpora and prints the results as JSON
+
+    python3 bench/bench_site.py [--pages N ...] [--seed S] [--output FILE] [--keep DIR]
+
+Each corpus is generated into a temporary directory (or DIR with --keep, reused when
+it already holds a corpus of that size) and built one page at a time, timing the
+stages separately: discovery, reading, block splitting, inline parsing (blocks to
+node trees), serialization, templating, writing, and the static copy.
+'''
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from assets import sync_dir_to_dest
+from blocktypes import scan_blocks
+from serializer import render_html
+from template import Template
+from utils import block_to_html_node, decode_markdown, extract_title, iter_markdown_files, output_rel_path, page_url
+
+STAGES = ("discovery", "read", "blocks", "inline", "serialize", "template", "write", "static")
+
+# Pages per directory, so large corpora are spread out the way a real content/ tree is
+PAGES_PER_DIR = 100
+# One static file per this many pages
+PAGES_PER_ASSET = 20
+
+WORDS = ("the", "ring", "was", "forged", "in", "fire", "and", "shadow", "over", "hills",
+         "river", "old", "forest", "songs", "of", "elves", "long", "road", "under", "mountain")
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def link_paragraph(rng, i):
+    '''A paragraph dense with links, images and emphasis'''
+    parts = []
+    for j in range(rng.randint(3, 8)):
+        parts.append(f"{sentence(rng, 6)} See [chapter {j}](/pages/{i}/{j}) and ![figure {j}](/images/{i % 50}-{j}.png),"
+                     f" **{rng.choice(WORDS)}** or _{rng.choice(WORDS)}_ with `code{j}`.")
+    return " ".join(parts)
+
+def make_page(rng, i):
+    blocks = [f"# Page {i}: {sentence(rng, 4)}"]
+    for _ in range(rng.randint(4, 10)):
+        kind = rng.random()
+        if kind < 0.35:
+            blocks.append(link_paragraph(rng, i))
+        elif kind < 0.55:
+            blocks.append(" ".join(sentence(rng) for _ in range(rng.randint(2, 5))))
+        elif kind < 0.63:
+            blocks.append(f"{'#' * rng.randint(2, 4)} {sentence(rng, 5)}")
+        elif kind < 0.72:
+            blocks.append("\n".join(f"- {sentence(rng, 5)} [more](/pages/{i})" for _ in range(rng.randint(2, 6))))
+        elif kind < 0.80:
+            blocks.append("\n".join(f"{n}. {sentence(rng, 5)}" for n in range(1, rng.randint(3, 7))))
+        elif kind < 0.90:
+            blocks.append("\n".join(f"> {sentence(rng, 8)}" for _ in range(rng.randint(1, 4))))
+        else:
+            code = "\n".join(f"    value_{n} = compute({n}) < {i}" for n in range(rng.randint(2, 8)))
+            blocks.append(f"```\ndef page_{i}():\n{code}\n```")
+    return "\n\n".join(blocks) + "\n"
+
+def generate_corpus(root, pages, seed):
+    '''Writes pages markdown files under root/content and their images under root/static'''
+    rng = random.Random(seed)
+    content = os.path.join(root, "content")
+    static = os.path.join(root, "static")
+    for i in range(pages):
+        dir_path = os.path.join(content, f"section{i // PAGES_PER_DIR}")
+        if i % PAGES_PER_DIR == 0:
+            os.makedirs(dir_path, exist_ok=True)
+        name = "index.md" if i % PAGES_PER_DIR == 0 else f"page{i}.md"
+        with open(os.path.join(dir_path, name), 'w') as f:
+            f.write(make_page(rng, i))
+    os.makedirs(os.path.join(static, "images"), exist_ok=True)
+    for i in range(max(1, pages // PAGES_PER_ASSET)):
+        with open(os.path.join(static, "images", f"{i}.png"), 'wb') as f:
+            f.write(rng.randbytes(rng.randint(1024, 16384)))
+    shutil.copy(os.path.join(ROOT, "template.html"), os.path.join(root, "template.html"))
+    with open(os.path.join(root, ".corpus"), 'w') as f:
+        f.write(str(pages))
+
+def has_corpus(root, pages):
+    try:
+        with open(os.path.join(root, ".corpus")) as f:
+            return f.read() == str(pages)
+    except FileNotFoundError:
+        return False
+
+def bench_build(root, basepath="/"):
+    '''Builds root/content into root/public, returns the seconds spent per stage and counters'''
+    content = os.path.join(root, "content")
+    public = os.path.join(root, "public")
+    if os.path.exists(public):
+        shutil.rmtree(public)
+    with open(os.path.join(root, "template.html")) as f:
+        template = Template(f.read(), basepath)
+    clock = time.perf_counter
+    times = dict.fromkeys(STAGES, 0.0)
+    counts = {"pages": 0, "blocks": 0, "markdown_bytes": 0, "html_bytes": 0}
+
+    start = clock()
+    rel_paths = list(iter_markdown_files(content))
+    times["discovery"] = clock() - start
+
+    for rel_path in rel_paths:
+        t0 = clock()
+        with open(os.path.join(content, rel_path), 'rb') as f:
+            data = f.read()
+        md_text = decode_markdown(data)
+        t1 = clock()
+        blocks = list(scan_blocks(md_text))
+        title = extract_title(md_text)
+        t2 = clock()
+        children = [block_to_html_node(block, block_type) for block, block_type in blocks]
+        t3 = clock()
+        html = "".join(render_html(child, basepath) for child in children)
+        t4 = clock()
+        page = io.StringIO()
+        values = {"Title": title, "Basepath": basepath, "Path": page_url(rel_path, basepath),
+                  "Content": lambda sink: sink.write(f"<div>{html}</div>")}
+        template.render_to(page, values)
+        page = page.getvalue()
+        t5 = clock()
+        output_file = os.path.join(public, output_rel_path(rel_path))
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, 'w') as f:
+            f.write(page)
+        t6 = clock()
+
+        times["read"] += t1 - t0
+        times["blocks"] += t2 - t1
+        times["inline"] += t3 - t2
+        times["serialize"] += t4 - t3
+        times["template"] += t5 - t4
+        times["write"] += t6 - t5
+        counts["pages"] += 1
+        counts["blocks"] += len(blocks)
+        counts["markdown_bytes"] += len(data)
+        counts["html_bytes"] += len(page)
+
+    start = clock()
+    with contextlib.redirect_stdout(io.StringIO()):
+        static_counts = sync_dir_to_dest(os.path.join(root, "static"), public)
+    times["static"] = clock() - start
+    counts["static_files"] = sum(static_counts.values())
+    return times, counts
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def run(pages, seed, keep_dir=None):
+    if keep_dir is not None:
+        root = os.path.join(keep_dir, f"corpus-{pages}")
+        if not has_corpus(root, pages):
+            if os.path.exists(root):
+                shutil.rmtree(root)
+            generate_corpus(root, pages, seed)
+        return bench_build(root)
+    with tempfile.TemporaryDirectory() as root:
+        generate_corpus(root, pages, seed)
+        return bench_build(root)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 10000, 100000],
+                        help="corpus sizes to generate and build")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the corpus generator")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--keep", metavar="DIR", help="generate corpora under DIR and reuse them on later runs")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "runs": [],
+    }
+    for pages in args.pages:
+        times, counts = run(pages, args.seed, args.keep)
+        total = sum(times.values())
+        print(f"{pages} pages: {total:.2f}s " + " ".join(f"{stage}={seconds:.3f}" for stage, seconds in times.items()),
+              file=sys.stderr)
+        results["runs"].append({
+            **counts,
+            "seconds": {stage: round(seconds, 6) for stage, seconds in times.items()},
+            "total_seconds": round(total, 6),
+            "pages_per_second": round(counts["pages"] / total, 1) if total else None,
+        })
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == "__main__":
+    main()
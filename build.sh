@@ -1 +1 @@
-python3 src/main.py "/site-generator/"
\ No newline at end of file
+python3 src/main.py build "/site-generator/"
\ No newline at end of file
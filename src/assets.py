@@ -0,0 +1,115 @@
+import os
+import shutil
+import logging
+
+from manifest import hash_file, remove_empty_dirs
+
+logger = logging.getLogger(__name__)
+
+LINK_MODES = ("copy", "hardlink", "reflink")
+
+# ioctl request to share extents between two files on btrfs/xfs (linux/fs.h)
+FICLONE = 0x40049409
+
+def iter_files(dir_path):
+    '''Yields (rel_path, DirEntry) for every file under dir_path'''
+    stack = [dir_path]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield os.path.relpath(entry.path, dir_path), entry
+
+def is_unchanged(source_stat, source, dest, use_hash=False) -> bool:
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return False
+    if os.path.samestat(source_stat, dest_stat):
+        # Hardlinked by a previous sync
+        return True
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    if use_hash and hash_file(source) == hash_file(dest):
+        # Same bytes with a new mtime (checkout, touch), refresh it so the next sync is a stat
+        os.utime(dest, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        return True
+    return False
+
+def reflink_file(source, dest):
+    import fcntl
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, dest)
+
+def place_file(source, dest, link_mode="copy") -> str:
+    '''Puts source at dest by the requested link mode, returns the mode actually used
+
+    Falls back to a plain copy when the filesystem can't link or clone. The new file
+    is moved over dest, so an old hardlink at dest never has its source rewritten.
+    '''
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_dest = f"{dest}.sync-tmp"
+    if os.path.lexists(tmp_dest):
+        os.remove(tmp_dest)
+    used = "copy"
+    try:
+        if link_mode == "hardlink":
+            os.link(source, tmp_dest)
+            used = link_mode
+        elif link_mode == "reflink":
+            reflink_file(source, tmp_dest)
+            used = link_mode
+    except (OSError, ImportError):
+        if os.path.lexists(tmp_dest):
+            os.remove(tmp_dest)
+    if used == "copy":
+        shutil.copy2(source, tmp_dest)
+    os.replace(tmp_dest, dest)
+    return used
+
+def sync_dir_to_dest(from_dir, dest_dir, manifest=None, use_hash=False, link_mode="copy", skip_suffixes=()):
+    '''Mirrors from_dir into dest_dir, only touching files that changed
+
+    Files are compared by size and mtime, and by content hash when use_hash is set.
+    Files ending in one of skip_suffixes are left to another stage (optimize_images).
+    With a BuildManifest, files that were synced before but have since been deleted
+    from from_dir are removed from dest_dir; the caller saves the manifest.
+    Returns a dict counting the files per outcome.
+    '''
+    if not os.path.exists(from_dir):
+        raise ValueError(f"Source directory does not exist: {from_dir}")
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"invalid link mode: {link_mode}")
+
+    logger.info(f"Syncing files from {from_dir} to {dest_dir}...")
+    counts = {"unchanged": 0, "copy": 0, "hardlink": 0, "reflink": 0, "removed": 0}
+    seen_paths = set()
+    for rel_path, entry in iter_files(from_dir):
+        if skip_suffixes and rel_path.lower().endswith(skip_suffixes):
+            continue
+        seen_paths.add(rel_path)
+        dest = os.path.join(dest_dir, rel_path)
+        if is_unchanged(entry.stat(), entry.path, dest, use_hash):
+            counts["unchanged"] += 1
+            continue
+        counts[place_file(entry.path, dest, link_mode)] += 1
+
+    if manifest is not None:
+        for rel_path in sorted(manifest.assets - seen_paths):
+            dest = os.path.join(dest_dir, rel_path)
+            if os.path.isfile(dest):
+                logger.debug(f"Removing stale file {dest}...")
+                os.remove(dest)
+                remove_empty_dirs(os.path.dirname(dest), dest_dir)
+            counts["removed"] += 1
+        manifest.assets = seen_paths
+
+    summary = ", ".join(f"{count} {outcome}" for outcome, count in counts.items() if count)
+    logger.info(f"Synced {len(seen_paths)} files from {from_dir} ({summary or 'nothing to do'})...")
+    return counts
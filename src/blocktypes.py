@@ -10,65 +10,146 @@ class BlockType(Enum):
     UNORDERED_LIST = "unordered_list"
     ORDERED_LIST = "ordered_list"
 
+HEADING_REGEX = re.compile(r"#{1,6} ")
+CODE_LINE_REGEX = re.compile(r"```.*```")
+
+class _BlockLines():
+    '''Lines of one block plus the list checks, updated as each line arrives'''
+    __slots__ = ("lines", "unordered", "ordered")
+
+    def __init__(self, first_line: str):
+        self.lines = [first_line]
+        self.unordered = True
+        self.ordered = True
+
+    def _check(self, index: int):
+        # Every line must be "- " or numbered 1-9 in order for a list, checked as scan_blocks adds it
+        line = self.lines[index]
+        self.unordered = self.unordered and line.startswith("- ")
+        self.ordered = self.ordered and index < 9 and line.startswith(f"{index + 1}. ")
+
+    def add(self, line: str):
+        self._check(len(self.lines) - 1)
+        self.lines.append(line)
+
+    def finish(self):
+        self._check(len(self.lines) - 1)
+
+    def block_type(self) -> BlockType:
+        first = self.lines[0]
+        lead = first[:1]
+        if lead == "#":
+            if HEADING_REGEX.match(first):
+                return BlockType.HEADING
+        elif lead == "`":
+            # "```code```" alone on its line, a trailing newline is allowed like regex $ does
+            if len(self.lines) == 1 or self.lines[1:] == [""]:
+                if CODE_LINE_REGEX.fullmatch(first):
+                    return BlockType.CODE
+            elif first.startswith("```") and self.lines[-1].startswith("```"):
+                return BlockType.CODE
+        elif lead == ">":
+            return BlockType.QUOTE
+        elif lead == "-":
+            if self.unordered:
+                return BlockType.UNORDERED_LIST
+        elif "0" <= lead <= "9":
+            if self.ordered:
+                return BlockType.ORDERED_LIST
+        return BlockType.PARAGRAPH
+
+def iter_lines(text: str):
+    '''Yields the lines of text without splitting the whole document up front'''
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+def iter_byte_lines(buffer):
+    '''Yields the decoded lines of UTF-8 bytes (an mmap, bytes) one line at a time
+
+    Newlines are handled like decode_markdown: \r\n and a lone \r both end a line.
+    Only the current line is ever copied out of buffer.
+    '''
+    start = 0
+    size = len(buffer)
+    while start <= size:
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            end = size
+            line = buffer[start:end]
+        else:
+            line = buffer[start:end]
+            if line.endswith(b"\r"):
+                line = line[:-1]
+        line = line.decode()
+        if "\r" in line:
+            yield from line.split("\r")
+        else:
+            yield line
+        start = end + 1
+
+def iter_blocks(lines, fences: bool=True):
+    '''Groups lines into blocks in one pass, yields (block, BlockType)
+
+    Blocks are separated by empty lines and stripped, like splitting on "\\n\\n". With
+    fences set, empty lines between an opening ``` and its closing ``` stay part of
+    the code block; a fence that is never closed falls back to plain splitting.
+    '''
+    block = None
+    # Whitespace only lines are only kept once another line follows them
+    pending = []
+    in_fence = False
+    for line in lines:
+        if in_fence:
+            block.add(line)
+            if line.startswith("```"):
+                in_fence = False
+            continue
+        if line == "":
+            if block is not None:
+                pending.clear()
+                yield _finish_block(block)
+                block = None
+            continue
+        if line.isspace():
+            pending.append(line)
+            continue
+        if block is None:
+            pending.clear()
+            first = line.lstrip()
+            block = _BlockLines(first)
+            in_fence = fences and first.startswith("```") and not CODE_LINE_REGEX.fullmatch(first.rstrip())
+            continue
+        for blank in pending:
+            block.add(blank)
+        pending.clear()
+        block.add(line)
+    if block is None:
+        return
+    if in_fence:
+        # Never closed, split it on its empty lines like any other text
+        yield from iter_blocks(block.lines + pending, fences=False)
+        return
+    yield _finish_block(block)
+
+def _finish_block(block):
+    block.lines[-1] = block.lines[-1].rstrip()
+    block.finish()
+    return "\n".join(block.lines), block.block_type()
+
+def scan_blocks(markdown: str):
+    '''Yields (block, BlockType) for every block of a markdown document'''
+    return iter_blocks(iter_lines(markdown))
+
 def block_to_block_type(block: str) -> BlockType:
-    if is_heading_block(block):
-        return BlockType.HEADING
-    if is_code_block(block):
-        return BlockType.CODE
-    if is_quote_block(block):
-        return BlockType.QUOTE
-    if is_unordered_list(block):
-        return BlockType.UNORDERED_LIST
-    if is_ordered_list(block):
-        return BlockType.ORDERED_LIST
-    return BlockType.PARAGRAPH
-
-def is_heading_block(block: str) -> bool:
-    heading_regex = r"^#{1,6} "
-    heading = re.findall(heading_regex, block)
-    if len(heading) > 0:
-        return True
-    return False
-
-def is_code_block(block: str) -> bool:
-    code_online_regex = r"^```.*```$"
-    code = re.findall(code_online_regex, block)
-    if len(code) > 0:
-        return True
-    block = block.split("\n")
-    if len(block) > 1 and block[0].startswith('```') and block[-1].startswith('```'):
-        return True
-    return False
-
-def is_quote_block(block: str) -> bool:
-    quote_regex = r"^>"
-    quote = re.findall(quote_regex, block)
-    if len(quote) > 0:
-        return True
-    return False
-
-def is_unordered_list(block: str) -> bool:
-    unordered_regex = r"^- "
-    unord_list = block.split('\n')
-    count = 0
-    for unord in unord_list:
-        unordered = re.findall(unordered_regex, unord)
-        if len(unordered) > 0:
-            count += 1
-    if count == len(unord_list):
-        return True
-    return False
-
-def is_ordered_list(block: str) -> bool:
-    ordered_regex = r"^\d\. "
-    ord_list = block.split("\n")
-    count = 0
-    for i in range(len(ord_list)):
-        ordered = re.findall(ordered_regex, ord_list[i])
-        if len(ordered) > 0:
-            if int(ordered[0][0]) == (i + 1):
-                count += 1
-
-    if count == len(ord_list):
-        return True
-    return False
\ No newline at end of file
+    lines = iter_lines(block)
+    builder = _BlockLines(next(lines))
+    for line in lines:
+        builder.add(line)
+    builder.finish()
+    return builder.block_type()
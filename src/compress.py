@@ -0,0 +1,144 @@
+import os
+import gzip
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+from assets import iter_files
+from manifest import remove_empty_dirs
+
+logger = logging.getLogger(__name__)
+
+# Output worth compressing, images and fonts are compressed already
+TEXT_SUFFIXES = (".html", ".css", ".js", ".mjs", ".json", ".xml", ".svg", ".txt", ".map")
+SIDECAR_FORMATS = ("gz", "zst")
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 19
+# Files this small gain nothing once the compression headers are added
+MIN_COMPRESS_BYTES = 256
+
+def compress_gz(data: bytes) -> bytes:
+    # mtime=0 and no file name in the header, the same input always gives the same bytes
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+def compress_zst(data: bytes) -> bytes:
+    import zstandard
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+COMPRESSORS = {"gz": compress_gz, "zst": compress_zst}
+
+def available_formats(formats):
+    '''The formats that can be written here, zst needs the zstandard package'''
+    available = []
+    for fmt in formats:
+        if fmt not in SIDECAR_FORMATS:
+            raise ValueError(f"invalid sidecar format: {fmt}")
+        if fmt == "zst":
+            try:
+                import zstandard
+            except ImportError:
+                logger.warning("zstandard is not installed, not writing .zst sidecars")
+                continue
+        if fmt not in available:
+            available.append(fmt)
+    return available
+
+def is_sidecar_fresh(source_stat, sidecar) -> bool:
+    # Sidecars carry the mtime of the file they were made from
+    try:
+        return os.stat(sidecar).st_mtime_ns == source_stat.st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def write_sidecar(task):
+    '''Compresses one file into its sidecar, returns (bytes in, bytes out)'''
+    source, fmt = task
+    # Stat first, a file rewritten while it is read then gets a stale-looking sidecar
+    source_stat = os.stat(source)
+    with open(source, 'rb') as f:
+        data = f.read()
+    compressed = COMPRESSORS[fmt](data)
+    sidecar = f"{source}.{fmt}"
+    tmp_sidecar = f"{sidecar}.tmp"
+    with open(tmp_sidecar, 'wb') as f:
+        f.write(compressed)
+    os.utime(tmp_sidecar, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    os.replace(tmp_sidecar, sidecar)
+    return len(data), len(compressed)
+
+def sidecar_source(rel_path: str):
+    '''The file a sidecar was compressed from, None when rel_path is not one of ours'''
+    source, dot, fmt = rel_path.rpartition(".")
+    if dot and fmt in SIDECAR_FORMATS and source.endswith(TEXT_SUFFIXES):
+        return source
+    return None
+
+def prune_sidecars(dest_dir, rewrite_formats=()) -> int:
+    '''Removes the sidecars whose file is gone, too small to compress or rewritten since
+
+    Run on every build, with --precompress or not, so a server sending index.html.gz
+    in place of index.html never serves a page that changed or went away. Directories
+    left empty go too. Out of date sidecars in rewrite_formats are left for
+    write_sidecars to replace. Returns how many sidecars were removed.
+    '''
+    stale = []
+    for rel_path, entry in iter_files(dest_dir):
+        source = sidecar_source(rel_path)
+        if source is None:
+            continue
+        try:
+            source_stat = os.stat(os.path.join(dest_dir, source))
+        except FileNotFoundError:
+            stale.append(entry.path)
+            continue
+        if source_stat.st_size < MIN_COMPRESS_BYTES:
+            stale.append(entry.path)
+        elif not is_sidecar_fresh(source_stat, entry.path) and rel_path.rpartition(".")[2] not in rewrite_formats:
+            stale.append(entry.path)
+    # Removed once the walk is done, it never sees a directory go away under it
+    for sidecar in stale:
+        logger.debug(f"Removing stale sidecar {sidecar}...")
+        os.remove(sidecar)
+        remove_empty_dirs(os.path.dirname(sidecar), dest_dir)
+    if stale:
+        logger.info(f"Removed {len(stale)} stale sidecars...")
+    return len(stale)
+
+def write_sidecars(dest_dir, formats=("gz",), jobs=1):
+    '''Writes a compressed copy next to every text file under dest_dir (index.html.gz)
+
+    Stale sidecars are removed first (see prune_sidecars), those already up to date
+    are skipped; .gz and .zst files that are not sidecars of a text file are left
+    alone. Compression runs on jobs threads, zlib and zstandard release the GIL while
+    they work. Returns a dict counting the files per outcome.
+    '''
+    formats = available_formats(formats)
+    counts = {"written": 0, "fresh": 0, "removed": prune_sidecars(dest_dir, formats), "bytes_in": 0, "bytes_out": 0}
+    if not formats:
+        return counts
+    logger.info(f"Writing {', '.join('.' + fmt for fmt in formats)} sidecars in {dest_dir}...")
+    tasks = []
+    for rel_path, entry in iter_files(dest_dir):
+        if sidecar_source(rel_path) is not None:
+            continue
+        if not rel_path.endswith(TEXT_SUFFIXES):
+            continue
+        stat = entry.stat()
+        if stat.st_size < MIN_COMPRESS_BYTES:
+            continue
+        for fmt in formats:
+            if is_sidecar_fresh(stat, f"{entry.path}.{fmt}"):
+                counts["fresh"] += 1
+            else:
+                tasks.append((entry.path, fmt))
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for size, compressed_size in executor.map(write_sidecar, tasks):
+            counts["written"] += 1
+            counts["bytes_in"] += size
+            counts["bytes_out"] += compressed_size
+
+    ratio = counts["bytes_out"] / counts["bytes_in"] if counts["bytes_in"] else 0.0
+    logger.info(f"Wrote {counts['written']} sidecars ({counts['fresh']} up to date, {counts['removed']} removed, "
+                f"{ratio:.0%} of the original size)...")
+    return counts
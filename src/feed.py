@@ -0,0 +1,99 @@
+import os
+import heapq
+import logging
+
+from datetime import datetime, timezone
+from html import escape
+
+from layouts import split_front_matter
+from sitemap import absolute_url, commit_if_changed, front_matter_time
+from utils import page_url
+
+logger = logging.getLogger(__name__)
+
+FEED_NAME = "feed.xml"
+FEED_SECTION = "blog"
+FEED_ENTRIES = 20
+ATOM_NS = "http://www.w3.org/2005/Atom"
+
+def read_head(source_file: str):
+    '''Returns (front matter, title) reading only as far as the first "# " heading'''
+    with open(source_file) as f:
+        metadata, lines = split_front_matter(line.rstrip("\n") for line in f)
+        metadata = metadata or {}
+        if metadata.get("title"):
+            return metadata, metadata["title"]
+        for line in lines:
+            if line.startswith("# "):
+                return metadata, line[2:].strip()
+    return metadata, None
+
+def atom_time(time: datetime) -> str:
+    return time.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FeedWriter():
+    '''Writes an Atom feed of the newest pages under one section, blog/feed.xml by default
+
+    Pages are offered in discovery order and only the newest FEED_ENTRIES are kept, in
+    a heap, so memory stays the same however many posts the section grows to. Only
+    their front matter and title are read. The section's own index page is not an
+    entry, nor is a post without an "updated" or "date" in its front matter (see
+    front_matter_time): an entry needs a time and the file's mtime only says when it
+    was checked out. Like the sitemap, the feed is only rewritten when its bytes change.
+    '''
+    def __init__(self, dest_dir: str, site_url: str, basepath: str="/", section: str=FEED_SECTION,
+                 title: str=None, limit: int=FEED_ENTRIES):
+        self.dest_dir = dest_dir
+        self.site_url = site_url
+        self.basepath = basepath
+        self.section = section.strip("/")
+        self.title = title or self.section.capitalize()
+        self.limit = limit
+        # (timestamp, rel_path, title) of the newest pages, oldest first
+        self.entries = []
+
+    def add(self, rel_path: str, source_file: str):
+        parts = rel_path.split(os.sep)
+        depth = len(self.section.split("/"))
+        if parts[:depth] != self.section.split("/") or parts[depth:] in ([], ["index.md"]):
+            return
+        metadata, title = read_head(source_file)
+        try:
+            time = front_matter_time(metadata, source_file)
+        except ValueError as e:
+            # Called while pages are discovered, raising would stop the whole build
+            logger.warning(f"{e}, leaving it out of the feed")
+            return
+        if time is None:
+            logger.debug(f"{rel_path} has no date, leaving it out of the feed")
+            return
+        entry = (time.timestamp(), rel_path, title or rel_path)
+        if len(self.entries) < self.limit:
+            heapq.heappush(self.entries, entry)
+        elif entry > self.entries[0]:
+            heapq.heapreplace(self.entries, entry)
+
+    def close(self):
+        feed = os.path.join(self.dest_dir, self.section, FEED_NAME)
+        if not self.entries:
+            if os.path.exists(feed):
+                os.remove(feed)
+            return
+        entries = sorted(self.entries, reverse=True)
+        section_url = absolute_url(self.site_url, f"{self.basepath}{self.section}/")
+        os.makedirs(os.path.dirname(feed), exist_ok=True)
+        with open(f"{feed}.tmp", 'w') as f:
+            f.write(f'<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="{ATOM_NS}">\n')
+            f.write(f"<title>{escape(self.title)}</title>\n<id>{escape(section_url)}</id>\n")
+            f.write(f'<link href="{escape(section_url)}"/>\n')
+            f.write(f'<link rel="self" href="{escape(section_url + FEED_NAME)}"/>\n')
+            f.write(f"<updated>{atom_time(datetime.fromtimestamp(entries[0][0], timezone.utc))}</updated>\n")
+            for timestamp, rel_path, title in entries:
+                url = escape(absolute_url(self.site_url, page_url(rel_path, self.basepath)))
+                updated = atom_time(datetime.fromtimestamp(timestamp, timezone.utc))
+                f.write(f'<entry><title>{escape(title)}</title><id>{url}</id><link href="{url}"/>'
+                        f"<updated>{updated}</updated></entry>\n")
+            f.write("</feed>\n")
+        changed = commit_if_changed(f"{feed}.tmp", feed)
+        logger.info(f"Feed: {len(entries)} entries in {feed}{'' if changed else ', unchanged'}...")
@@ -0,0 +1,192 @@
+import re
+import hashlib
+
+from rendercache import BlockCache
+from serializer import escape_text
+
+# Highlighted snippets kept per process, keyed by language and a hash of the code
+HIGHLIGHT_CACHE_SIZE = 512
+# Spans get class="hl-<kind>", see static/index.css
+CLASS_PREFIX = "hl-"
+
+NUMBER = r"\b(?:0[xX][0-9a-fA-F_]+|0[bB][01_]+|\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?)\b"
+IDENTIFIER = r"[A-Za-z_]\w*"
+
+def words(*names: str) -> str:
+    return r"\b(?:" + "|".join(names) + r")\b"
+
+def c_like(keywords, constants=(), strings=(r'"(?:[^"\\\n]|\\.)*"', r"'(?:[^'\\\n]|\\.)*'")):
+    '''Rules of a language with // and /* */ comments'''
+    return [
+        ("comment", r"//[^\n]*|/\*.*?\*/"),
+        *(("string", pattern) for pattern in strings),
+        ("keyword", words(*keywords)),
+        ("constant", words(*constants)) if constants else None,
+        ("number", NUMBER),
+        (None, IDENTIFIER),
+    ]
+
+def python_rules():
+    return [
+        ("comment", r"#[^\n]*"),
+        ("string", r"(?i:[rbuf]{0,2})(?:'''.*?'''|\"\"\".*?\"\"\"|'(?:[^'\\\n]|\\.)*'|\"(?:[^\"\\\n]|\\.)*\")"),
+        ("keyword", words("and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del",
+                          "elif", "else", "except", "finally", "for", "from", "global", "if", "import", "in", "is",
+                          "lambda", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while", "with",
+                          "yield")),
+        ("constant", words("True", "False", "None", "self")),
+        ("number", NUMBER),
+        (None, IDENTIFIER),
+    ]
+
+def javascript_rules():
+    return c_like(("async", "await", "break", "case", "catch", "class", "const", "continue", "default", "delete",
+                   "do", "else", "export", "extends", "finally", "for", "from", "function", "if", "import", "in",
+                   "instanceof", "interface", "let", "new", "of", "return", "static", "switch", "throw", "try",
+                   "type", "typeof", "var", "void", "while", "yield"),
+                  ("true", "false", "null", "undefined", "this"),
+                  (r'"(?:[^"\\\n]|\\.)*"', r"'(?:[^'\\\n]|\\.)*'", r"`(?:[^`\\]|\\.)*`"))
+
+def go_rules():
+    return c_like(("break", "case", "chan", "const", "continue", "default", "defer", "else", "fallthrough", "for",
+                   "func", "go", "goto", "if", "import", "interface", "map", "package", "range", "return", "select",
+                   "struct", "switch", "type", "var"),
+                  ("true", "false", "nil", "iota"),
+                  (r'"(?:[^"\\\n]|\\.)*"', r"`[^`]*`", r"'(?:[^'\\\n]|\\.)*'"))
+
+def c_rules():
+    return c_like(("auto", "break", "case", "char", "class", "const", "continue", "default", "delete", "do",
+                   "double", "else", "enum", "extern", "float", "for", "goto", "if", "inline", "int", "long",
+                   "namespace", "new", "private", "protected", "public", "return", "short", "signed", "sizeof",
+                   "static", "struct", "switch", "template", "typedef", "union", "unsigned", "using", "virtual",
+                   "void", "volatile", "while"),
+                  ("true", "false", "NULL", "nullptr", "this"))
+
+def rust_rules():
+    return c_like(("as", "async", "await", "break", "const", "continue", "crate", "dyn", "else", "enum", "extern",
+                   "fn", "for", "if", "impl", "in", "let", "loop", "match", "mod", "move", "mut", "pub", "ref",
+                   "return", "static", "struct", "trait", "type", "unsafe", "use", "where", "while"),
+                  ("true", "false", "self", "Self", "None", "Some"))
+
+def shell_rules():
+    return [
+        ("comment", r"(?<![^\s;|&(])#[^\n]*"),
+        ("string", r"'[^']*'|\"(?:[^\"\\]|\\.)*\""),
+        ("variable", r"\$(?:\{[^}\n]*\}|\w+|[@*#?$!-])"),
+        ("keyword", words("case", "do", "done", "elif", "else", "esac", "export", "fi", "for", "function", "if",
+                          "in", "local", "return", "then", "until", "while")),
+        (None, r"[\w.-]+"),
+    ]
+
+def json_rules():
+    return [
+        ("string", r'"(?:[^"\\\n]|\\.)*"'),
+        ("constant", words("true", "false", "null")),
+        ("number", r"-?" + NUMBER),
+    ]
+
+def css_rules():
+    return [
+        ("comment", r"/\*.*?\*/"),
+        ("string", r"'[^'\n]*'|\"[^\"\n]*\""),
+        ("keyword", r"@[\w-]+|!important"),
+        ("number", r"#[0-9a-fA-F]{3,8}\b|-?\b\d+(?:\.\d+)?(?:%|[a-z]+)?"),
+        (None, r"[\w-]+"),
+    ]
+
+def html_rules():
+    return [
+        ("comment", r"<!--.*?-->"),
+        ("keyword", r"</?[\w:-]+|/?>|<!\w+"),
+        ("string", r"\"[^\"]*\"|'[^']*'"),
+    ]
+
+# Language names and aliases as written after the opening ```, the rules are only
+# built and compiled the first time a page uses the language
+LANGUAGES = {
+    "python": python_rules, "py": python_rules,
+    "javascript": javascript_rules, "js": javascript_rules, "typescript": javascript_rules, "ts": javascript_rules,
+    "go": go_rules, "golang": go_rules,
+    "c": c_rules, "cpp": c_rules, "c++": c_rules, "java": c_rules,
+    "rust": rust_rules, "rs": rust_rules,
+    "bash": shell_rules, "sh": shell_rules, "shell": shell_rules, "console": shell_rules,
+    "json": json_rules,
+    "css": css_rules,
+    "html": html_rules, "xml": html_rules,
+}
+
+_lexers = {}
+_cache = None
+
+def code_language(info: str):
+    '''The language of a code block, the first word of its info string, None without one'''
+    parts = info.split()
+    return parts[0] if parts else None
+
+def lexer_for(language: str):
+    '''The compiled rules of language, None when it isn't known'''
+    rules = LANGUAGES.get(language.lower())
+    if rules is None:
+        return None
+    lexer = _lexers.get(rules)
+    if lexer is None:
+        kinds = []
+        patterns = []
+        for rule in rules():
+            if rule is not None:
+                kinds.append(rule[0])
+                patterns.append(f"({rule[1]})")
+        lexer = (re.compile("|".join(patterns), re.DOTALL), kinds)
+        _lexers[rules] = lexer
+    return lexer
+
+def tokenize(code: str, lexer):
+    '''Yields (kind, text) covering all of code, kind is None for plain text'''
+    pattern, kinds = lexer
+    pos = 0
+    for match in pattern.finditer(code):
+        if match.start() > pos:
+            yield None, code[pos:match.start()]
+        yield kinds[match.lastindex - 1], match.group()
+        pos = match.end()
+    if pos < len(code):
+        yield None, code[pos:]
+
+def highlight_html(code: str, lexer) -> str:
+    '''The escaped HTML of code with a <span> around every token of a kind, plain text merged'''
+    parts = []
+    plain = []
+    for kind, text in tokenize(code, lexer):
+        if kind is None:
+            plain.append(text)
+            continue
+        if plain:
+            parts.append(escape_text("".join(plain)))
+            plain = []
+        parts.append(f'<span class="{CLASS_PREFIX}{kind}">{escape_text(text)}</span>')
+    if plain:
+        parts.append(escape_text("".join(plain)))
+    return "".join(parts)
+
+def highlight_cache() -> BlockCache:
+    global _cache
+    if _cache is None:
+        _cache = BlockCache(HIGHLIGHT_CACHE_SIZE)
+    return _cache
+
+def highlight(code: str, language: str):
+    '''The highlighted HTML of a code block in language, None when the language isn't known
+
+    Results are cached by (language, hash of code), so a snippet repeated across pages,
+    or rendered again in watch mode, is only tokenized once per process.
+    '''
+    lexer = lexer_for(language)
+    if lexer is None:
+        return None
+    cache = highlight_cache()
+    key = (language.lower(), hashlib.blake2b(code.encode(), digest_size=16).digest())
+    html = cache.get(key)
+    if html is None:
+        html = highlight_html(code, lexer)
+        cache.put(key, html)
+    return html
@@ -1,6 +1,9 @@
 from typing import Dict, Self
 
 class HTMLNode():
+    # A long page builds tens of thousands of nodes, slots keep each one free of a __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag: str=None, value: str=None, children: list[Self]=None, props: Dict[str,str]=None):
         self.tag = tag
         self.value = value
@@ -11,42 +14,50 @@ class HTMLNode():
         raise NotImplementedError()
     
     def props_to_html(self):
-        props_str = ""
-        if self.props is not None:
-            for key, value in self.props.items():
-                props_str += f" {key}=\"{value}\""
-        return props_str
+        from serializer import attrs_to_html
+        return attrs_to_html(self.props)
     
     def __repr__(self):
         return f"HTMLNode({self.tag}, {self.value}, {self.children}, {self.props})"
     
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag, value, None, props)
 
     def to_html(self):
-        if self.value == None:
-            raise ValueError("invalid HTML: no value")
-        if self.tag == None:
-            return self.value
-        return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+        from serializer import render_html
+        return render_html(self)
     
     def __repr__(self):
         return f"LeafNode({self.tag}, {self.value}, {self.props})"
     
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, None, children, props)
 
     def to_html(self):
-        if self.tag == None:
-            raise ValueError("invalid HTML: no tag")
-        if self.children == None:
-            raise ValueError("invalid HTML: no children")
-        child_html = "".join(map(lambda child: child.to_html(), self.children))
-        return f"<{self.tag}>{child_html}</{self.tag}>"
+        # Iterative, so deeply nested trees don't hit the recursion limit
+        from serializer import render_html
+        return render_html(self)
     
     def __repr__(self):
-        return f"ParentNode({self.tag}, {self.children}, {self.props})"
\ No newline at end of file
+        return f"ParentNode({self.tag}, {self.children}, {self.props})"
+
+class RawHTMLNode(HTMLNode):
+    '''Already rendered HTML, written out as is'''
+    __slots__ = ()
+
+    def __init__(self, html):
+        super().__init__(None, html, None, None)
+
+    def to_html(self):
+        return self.value
+
+    def __repr__(self):
+        return f"RawHTMLNode({self.value})"
@@ -0,0 +1,331 @@
+import os
+import json
+import zlib
+import struct
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+
+from assets import iter_files, is_unchanged, place_file
+from manifest import hash_bytes, hash_file, remove_empty_dirs
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the bytes written for the same source and settings change
+IMAGE_PIPELINE_VERSION = 1
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Channels per pixel of the 8 bit color types: gray, RGB, palette, gray + alpha, RGBA
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Ancillary chunks that change how pixels look, kept in resized variants
+COLOR_CHUNKS = (b"PLTE", b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT")
+ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+
+
+class PNGImage():
+    '''The chunks of a PNG file with the image data joined and inflated'''
+    def __init__(self, data: bytes):
+        if not data.startswith(PNG_SIGNATURE):
+            raise ValueError("not a PNG file")
+        self.chunks = []
+        idat = []
+        pos = len(PNG_SIGNATURE)
+        while pos < len(data):
+            if pos + 8 > len(data):
+                raise ValueError("truncated PNG chunk")
+            length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+            chunk_data = data[pos + 8:pos + 8 + length]
+            if len(chunk_data) != length:
+                raise ValueError("truncated PNG chunk")
+            pos += 12 + length
+            if chunk_type == b"IDAT":
+                if not idat:
+                    # Placeholder for where the joined image data goes back
+                    self.chunks.append((b"IDAT", None))
+                idat.append(chunk_data)
+            else:
+                self.chunks.append((chunk_type, chunk_data))
+            if chunk_type == b"IEND":
+                break
+        if not self.chunks or self.chunks[0][0] != b"IHDR" or not idat:
+            raise ValueError("PNG has no IHDR or IDAT chunk")
+        (self.width, self.height, self.bit_depth, self.color_type,
+         _, _, self.interlace) = struct.unpack(">IIBBBBB", self.chunks[0][1])
+        self.raw = zlib.decompress(b"".join(idat))
+
+    def can_resize(self) -> bool:
+        return self.bit_depth == 8 and self.interlace == 0 and self.color_type in CHANNELS
+
+    def pixels(self) -> list[bytearray]:
+        '''Unfiltered rows of the image, for 8 bit non-interlaced images only'''
+        bpp = CHANNELS[self.color_type]
+        stride = self.width * bpp
+        rows = []
+        previous = bytearray(stride)
+        for y in range(self.height):
+            start = y * (stride + 1)
+            filter_type = self.raw[start]
+            row = bytearray(self.raw[start + 1:start + 1 + stride])
+            unfilter_row(row, previous, filter_type, bpp)
+            rows.append(row)
+            previous = row
+        return rows
+
+def unfilter_row(row, previous, filter_type, bpp):
+    if filter_type == 1:
+        for i in range(bpp, len(row)):
+            row[i] = (row[i] + row[i - bpp]) & 255
+    elif filter_type == 2:
+        for i in range(len(row)):
+            row[i] = (row[i] + previous[i]) & 255
+    elif filter_type == 3:
+        for i in range(len(row)):
+            left = row[i - bpp] if i >= bpp else 0
+            row[i] = (row[i] + ((left + previous[i]) >> 1)) & 255
+    elif filter_type == 4:
+        for i in range(len(row)):
+            a = row[i - bpp] if i >= bpp else 0
+            b = previous[i]
+            c = previous[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                predictor = a
+            elif pb <= pc:
+                predictor = b
+            else:
+                predictor = c
+            row[i] = (row[i] + predictor) & 255
+    elif filter_type != 0:
+        raise ValueError(f"invalid PNG filter type {filter_type}")
+
+def sub_filter_row(row, bpp) -> bytes:
+    filtered = bytearray(row)
+    for i in range(bpp, len(row)):
+        filtered[i] = (row[i] - row[i - bpp]) & 255
+    return b"\x01" + filtered
+
+def deflate(raw: bytes) -> bytes:
+    '''Smallest zlib stream of raw over the strategies tried'''
+    best = None
+    for strategy in ZLIB_STRATEGIES:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        compressed = compressor.compress(raw) + compressor.flush()
+        if best is None or len(compressed) < len(best):
+            best = compressed
+    return best
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def write_chunks(chunks, idat: bytes) -> bytes:
+    parts = [PNG_SIGNATURE]
+    for chunk_type, data in chunks:
+        parts.append(png_chunk(chunk_type, idat if chunk_type == b"IDAT" else data))
+    return b"".join(parts)
+
+def recompress_png(data: bytes) -> bytes:
+    '''Re-deflates the image data of a PNG at the highest level, returns the smaller file
+
+    Pixels, filters and every chunk stay as they are, only the IDAT stream changes.
+    '''
+    image = PNGImage(data)
+    optimized = write_chunks(image.chunks, deflate(image.raw))
+    return optimized if len(optimized) < len(data) else data
+
+def resize_png(data: bytes, width: int) -> bytes:
+    '''Scales a PNG down to width pixels wide, keeping the aspect ratio
+
+    Color images are box filtered, palette images are sampled since their indexes
+    can't be averaged. Only 8 bit, non-interlaced images are supported. Returns None
+    when the image is not wider than width.
+    '''
+    image = PNGImage(data)
+    if width >= image.width:
+        return None
+    if not image.can_resize():
+        raise ValueError(f"can't resize {image.bit_depth} bit, color type {image.color_type}, interlaced={image.interlace}")
+    height = max(1, round(image.height * width / image.width))
+    bpp = CHANNELS[image.color_type]
+    rows = image.pixels()
+    if image.color_type == 3:
+        scaled = sample_rows(rows, image.width, image.height, width, height)
+    else:
+        scaled = box_rows(rows, image.width, image.height, width, height, bpp)
+    if image.color_type == 3:
+        raw = b"".join(b"\x00" + bytes(row) for row in scaled)
+    else:
+        raw = b"".join(sub_filter_row(row, bpp) for row in scaled)
+    header = struct.pack(">IIBBBBB", width, height, 8, image.color_type, 0, 0, 0)
+    chunks = [(b"IHDR", header)]
+    chunks += [(chunk_type, chunk_data) for chunk_type, chunk_data in image.chunks if chunk_type in COLOR_CHUNKS]
+    chunks += [(b"IDAT", None), (b"IEND", b"")]
+    return write_chunks(chunks, deflate(raw))
+
+def _spans(source_size, target_size):
+    return [(i * source_size // target_size, max(i * source_size // target_size + 1, (i + 1) * source_size // target_size))
+            for i in range(target_size)]
+
+def box_rows(rows, width, height, new_width, new_height, bpp):
+    '''Averages each target pixel over the source pixels it covers, columns first then rows'''
+    columns = _spans(width, new_width)
+    narrow = []
+    for row in rows:
+        out = bytearray(new_width * bpp)
+        for x, (x0, x1) in enumerate(columns):
+            count = x1 - x0
+            for channel in range(bpp):
+                total = sum(row[x0 * bpp + channel:x1 * bpp:bpp])
+                out[x * bpp + channel] = (total + count // 2) // count
+        narrow.append(out)
+    scaled = []
+    for y0, y1 in _spans(height, new_height):
+        count = y1 - y0
+        out = bytearray(new_width * bpp)
+        for i in range(len(out)):
+            total = 0
+            for y in range(y0, y1):
+                total += narrow[y][i]
+            out[i] = (total + count // 2) // count
+        scaled.append(out)
+    return scaled
+
+def sample_rows(rows, width, height, new_width, new_height):
+    columns = [x0 for x0, _ in _spans(width, new_width)]
+    return [bytearray(rows[y0][x] for x in columns) for y0, _ in _spans(height, new_height)]
+
+def variant_path(rel_path: str, width: int) -> str:
+    '''images/map.png at 480 pixels wide is images/map-480w.png'''
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}-{width}w{ext}"
+
+def image_key(source_hash: str, width) -> str:
+    settings = {"version": IMAGE_PIPELINE_VERSION, "width": width, "level": 9}
+    return hash_bytes(f"{source_hash}:{json.dumps(settings, sort_keys=True)}".encode())
+
+def cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], f"{key}.png")
+
+def _process_image(task):
+    '''Writes the optimized image and its variants into the cache, returns warnings
+
+    A variant that can't be made is cached as an empty file, so it isn't retried
+    until the source changes.
+    '''
+    source, outputs = task
+    with open(source, 'rb') as f:
+        data = f.read()
+    warnings = []
+    for width, path in outputs:
+        try:
+            result = recompress_png(data) if width is None else resize_png(data, width)
+        except (ValueError, zlib.error, struct.error) as e:
+            if width is None:
+                warnings.append(f"Copying {source} as is: {e}")
+                result = data
+            else:
+                warnings.append(f"Not resizing {source} to {width}px: {e}")
+                result = b""
+        if result is None:
+            result = b""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(result)
+        os.replace(tmp_path, path)
+    return warnings
+
+def source_hash(rel_path, entry, manifest=None) -> str:
+    '''Hash of a source image, reused from the manifest while its size and mtime match'''
+    stat = entry.stat()
+    if manifest is not None:
+        known = manifest.images.get(rel_path)
+        if known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["hash"]
+    digest = hash_file(entry.path)
+    if manifest is not None:
+        manifest.images[rel_path] = {"hash": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "outputs": []}
+    return digest
+
+def optimize_images(from_dir, dest_dir, cache_dir, widths=(), jobs=1, manifest=None, link_mode="copy"):
+    '''Writes every PNG under from_dir to dest_dir recompressed, plus a copy per width in widths
+
+    Results are stored in cache_dir under a hash of the source and the settings, so an
+    image is only processed when it or the settings change; everything else is placed
+    from the cache like a static file. Variants wider than the source are skipped.
+    With a BuildManifest, outputs of images that have since been deleted are removed.
+    Returns a dict counting the files per outcome.
+    '''
+    logger.info(f"Optimizing images from {from_dir} to {dest_dir}...")
+    counts = {"processed": 0, "cached": 0, "unchanged": 0, "removed": 0, "bytes_saved": 0}
+    tasks = []
+    placements = []
+    seen_paths = set()
+    for rel_path, entry in iter_files(from_dir):
+        if not rel_path.lower().endswith(".png"):
+            continue
+        seen_paths.add(rel_path)
+        digest = source_hash(rel_path, entry, manifest)
+        missing = []
+        outputs = [(None, rel_path)] + [(width, variant_path(rel_path, width)) for width in widths]
+        for width, output_rel in outputs:
+            path = cache_path(cache_dir, image_key(digest, width))
+            placements.append((entry.path, path, output_rel))
+            if not os.path.isfile(path):
+                missing.append((width, path))
+        if missing:
+            tasks.append((entry.path, missing))
+        if manifest is not None:
+            manifest.images[rel_path]["outputs"] = [output_rel for _, output_rel in outputs]
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_process_image, tasks))
+    else:
+        results = list(map(_process_image, tasks))
+    for warnings in results:
+        for warning in warnings:
+            logger.warning(warning)
+    processed = {path for _, missing in tasks for _, path in missing}
+
+    outputs = set()
+    for source, path, output_rel in placements:
+        if os.path.getsize(path) == 0:
+            # Variant that can't be made from this image
+            continue
+        outputs.add(output_rel)
+        dest = os.path.join(dest_dir, output_rel)
+        if path in processed:
+            counts["processed"] += 1
+        if is_unchanged(os.stat(path), path, dest):
+            counts["unchanged"] += 1
+            continue
+        if path not in processed:
+            counts["cached"] += 1
+        place_file(path, dest, link_mode)
+        if output_rel in seen_paths:
+            counts["bytes_saved"] += os.path.getsize(source) - os.path.getsize(path)
+
+    if manifest is not None:
+        counts["removed"] = prune_images(manifest, dest_dir, seen_paths, outputs)
+
+    logger.info(f"Optimized {len(seen_paths)} images ({counts['processed']} processed, {counts['cached']} from cache, "
+                f"{counts['unchanged']} unchanged, {counts['bytes_saved']} bytes saved)...")
+    return counts
+
+def prune_images(manifest, dest_dir, keep_sources=(), keep_outputs=()) -> int:
+    '''Forgets every image in the manifest but keep_sources and deletes its outputs
+
+    Outputs in keep_outputs are still wanted by something else and stay. Returns the
+    number of files removed.
+    '''
+    removed = 0
+    for rel_path in sorted(manifest.images.keys() - set(keep_sources)):
+        for output_rel in manifest.images.pop(rel_path)["outputs"]:
+            dest = os.path.join(dest_dir, output_rel)
+            if output_rel not in keep_outputs and os.path.isfile(dest):
+                logger.debug(f"Removing stale image {dest}...")
+                os.remove(dest)
+                remove_empty_dirs(os.path.dirname(dest), dest_dir)
+                removed += 1
+    return removed
@@ -0,0 +1,58 @@
+import re
+
+from textnode import TextNode, TextType
+
+# Every inline construct as one alternation, so the regex engine does the scanning and
+# Python only runs once per token. At a given position images win over links, and
+# links over emphasis, so underscores inside URLs are never read as italics.
+INLINE_TOKEN = re.compile(
+    r"!\[(?P<alt>[^\[\]]*)\]\((?P<src>[^\(\)]*)\)"
+    r"|\[(?P<label>[^\[\]]*)\]\((?P<href>[^\(\)]*)\)"
+    r"|\*\*(?P<bold>.*?)\*\*"
+    r"|_(?P<italic>.*?)_"
+    r"|`(?P<code>.*?)`",
+    re.DOTALL,
+)
+
+UNCLOSED_DELIMITER = re.compile(r"\*\*|_|`")
+
+def tokenize_inline(text: str, strict: bool=True) -> list[TextNode]:
+    '''Splits inline markdown into TextNodes in a single left to right pass
+
+    Bold and italic spans and link text may contain further markup, which is kept as
+    the node's children. With strict set an unclosed ** _ or ` raises ValueError like
+    the delimiter splitter does, otherwise the delimiter is kept as literal text.
+    '''
+    nodes = []
+    text_start = 0
+    for match in INLINE_TOKEN.finditer(text):
+        _add_text(nodes, text[text_start:match.start()], strict)
+        text_start = match.end()
+        kind = match.lastgroup
+        if kind == "src":
+            nodes.append(TextNode(match["alt"], TextType.IMAGE, match["src"]))
+        elif kind == "href":
+            nodes.append(_nested_node(match["label"], TextType.LINK, match["href"]))
+        elif kind == "bold":
+            if match["bold"] != "":
+                nodes.append(_nested_node(match["bold"], TextType.BOLD))
+        elif kind == "italic":
+            if match["italic"] != "":
+                nodes.append(_nested_node(match["italic"], TextType.ITALIC))
+        elif match["code"] != "":
+            nodes.append(TextNode(match["code"], TextType.CODE))
+    _add_text(nodes, text[text_start:], strict)
+    return nodes
+
+def _add_text(nodes, text, strict):
+    if text == "":
+        return
+    if strict and UNCLOSED_DELIMITER.search(text):
+        raise ValueError("invalid markdown, formatted section not closed")
+    nodes.append(TextNode(text, TextType.TEXT))
+
+def _nested_node(inner, text_type, url=None):
+    children = tokenize_inline(inner, strict=False)
+    if not children or (len(children) == 1 and children[0].text_type == TextType.TEXT):
+        return TextNode(inner, text_type, url)
+    return TextNode(inner, text_type, url, children)
@@ -0,0 +1,135 @@
+import os
+
+from itertools import chain
+
+from blocktypes import iter_lines
+from manifest import hash_bytes
+from template import Template
+
+DEFAULT_LAYOUT = "template.html"
+LAYOUTS_DIR = "layouts"
+PARTIALS_DIR = "partials"
+
+def split_front_matter(lines):
+    '''Reads a leading block of "key: value" lines fenced by "---" from an iterator of lines
+
+    Returns (metadata, remaining lines). metadata is None when the document has no front
+    matter, the remaining lines then start with the first line of the document.
+    '''
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return None, iter(())
+    if first.rstrip() != "---":
+        return None, chain([first], lines)
+    read = [first]
+    metadata = {}
+    for line in lines:
+        read.append(line)
+        if line.rstrip() == "---":
+            return metadata, lines
+        key, sep, value = line.partition(":")
+        if not sep or not key.strip():
+            break
+        metadata[key.strip()] = value.strip()
+    # A horizontal rule or plain text, not front matter
+    return None, chain(read, lines)
+
+def parse_front_matter(md_text: str):
+    '''Returns (metadata, markdown without the front matter), metadata is {} without any'''
+    metadata, lines = split_front_matter(iter_lines(md_text))
+    if metadata is None:
+        return {}, md_text
+    return metadata, "\n".join(lines)
+
+def read_front_matter(path: str) -> dict:
+    '''Reads only the front matter lines of a markdown file, {} when it has none'''
+    with open(path) as f:
+        metadata, _ = split_front_matter(line.rstrip("\n") for line in f)
+    return metadata or {}
+
+
+class Layouts():
+    '''Finds the layout of each page and parses every layout once per build
+
+    A page uses layouts/<name>.html when its front matter sets "layout: name",
+    otherwise the layout named after its nearest directory (layouts/blog/tom.html,
+    then layouts/blog.html for blog/tom/index.md), otherwise template.html. Layouts
+    include partials/<name>.html with {{> name }}.
+
+    Every file is read at most once. select() also returns the files the choice
+    depends on with their hashes, None for candidates that don't exist, so adding,
+    editing or removing any of them can be traced back to the pages affected.
+    With minify every layout is parsed as a minifying Template.
+    '''
+    def __init__(self, root: str, basepath: str="/", minify: bool=False):
+        self.root = root
+        self.basepath = basepath
+        self.minify = minify
+        # template file relative to root -> (source, hash), (None, None) when missing
+        self.files = {}
+        self.templates = {}
+
+    def read(self, rel_path: str):
+        if rel_path not in self.files:
+            try:
+                with open(os.path.join(self.root, rel_path), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                self.files[rel_path] = (None, None)
+            else:
+                self.files[rel_path] = (data.decode(), hash_bytes(data))
+        return self.files[rel_path]
+
+    def file_hash(self, rel_path: str):
+        return self.read(rel_path)[1]
+
+    def load_partial(self, name: str) -> str:
+        source, _ = self.read(partial_path(name))
+        if source is None:
+            raise ValueError(f"partial not found: {partial_path(name)}")
+        return source
+
+    def template(self, rel_path: str) -> Template:
+        template = self.templates.get(rel_path)
+        if template is None:
+            source, _ = self.read(rel_path)
+            template = Template(source or "", self.basepath, self.load_partial, self.minify)
+            self.templates[rel_path] = template
+        return template
+
+    def candidates(self, page_rel_path: str, metadata: dict) -> list[str]:
+        if metadata.get("layout"):
+            name = metadata["layout"]
+            if ".." in name.split("/"):
+                raise ValueError(f"invalid layout name: {name}")
+            return [layout_path(name)]
+        candidates = []
+        parts = os.path.dirname(page_rel_path).split(os.sep)
+        while parts and parts[0]:
+            candidates.append(layout_path("/".join(parts)))
+            parts.pop()
+        candidates.append(DEFAULT_LAYOUT)
+        return candidates
+
+    def select(self, page_rel_path: str, metadata: dict=None):
+        '''Returns (Template, {template file: hash or None}) for a page'''
+        deps = {}
+        candidates = self.candidates(page_rel_path, metadata or {})
+        for rel_path in candidates:
+            deps[rel_path] = self.file_hash(rel_path)
+            if deps[rel_path] is not None:
+                break
+        else:
+            if rel_path != DEFAULT_LAYOUT:
+                raise ValueError(f"layout not found: {rel_path}")
+        template = self.template(rel_path)
+        for name in template.partials:
+            deps[partial_path(name)] = self.file_hash(partial_path(name))
+        return template, deps
+
+def layout_path(name: str) -> str:
+    return f"{LAYOUTS_DIR}/{name}.html"
+
+def partial_path(name: str) -> str:
+    return f"{PARTIALS_DIR}/{name}.html"
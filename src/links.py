@@ -0,0 +1,96 @@
+import os
+import logging
+import posixpath
+
+from urllib.parse import unquote, urljoin, urlsplit
+
+from assets import iter_files
+from blocktypes import BlockType, scan_blocks
+
+logger = logging.getLogger(__name__)
+
+def add_block_links(targets: dict, block: str, block_type):
+    '''Adds the link and image targets of one block as keys of targets, code blocks have none'''
+    if block_type == BlockType.CODE or "](" not in block:
+        return
+    from utils import extract_markdown_images, extract_markdown_links
+    for _, target in extract_markdown_links(block) + extract_markdown_images(block):
+        targets[target.strip()] = None
+
+def page_links(md_text: str) -> list[str]:
+    '''Every link and image target of a page in order, without duplicates, code blocks left out'''
+    targets = {}
+    for block, block_type in scan_blocks(md_text):
+        add_block_links(targets, block, block_type)
+    return list(targets)
+
+def resolve_link(page_rel_path: str, target: str):
+    '''The path a link points at relative to the site root ("" for the root), None when it
+    leaves the site or stays on the page (other schemes, //host, "#section")
+
+    Links are resolved against the URL of the page without the basepath, the way they
+    are written in content/.
+    '''
+    from utils import page_url
+    parts = urlsplit(target)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = urljoin(page_url(page_rel_path), unquote(parts.path))
+    directory = path.endswith("/")
+    path = posixpath.normpath(path).lstrip("/")
+    if path in ("", "."):
+        return ""
+    return path + "/" if directory else path
+
+def link_candidates(path: str) -> list[str]:
+    '''The output files a resolved link can be served from'''
+    if path == "" or path.endswith("/"):
+        return [path + "index.html"]
+    return [path, path + ".html", path + "/index.html"]
+
+
+class LinkGraph():
+    '''Which pages link where, checked against the files actually in the output
+
+    Pages are recorded with the targets page_links found in them, as they are rendered
+    or from the manifest for pages that were fresh. check() resolves every internal
+    target in one pass against a set of the output paths, incoming() answers which
+    pages link to a page, the ones to look at when it moves or goes away.
+    '''
+    def __init__(self):
+        # page rel_path -> link targets as written
+        self.links = {}
+
+    def record(self, rel_path: str, targets):
+        self.links[rel_path] = list(targets)
+
+    def targets(self, rel_path: str):
+        '''Yields (target as written, resolved path) for every internal link of a page'''
+        for target in self.links[rel_path]:
+            path = resolve_link(rel_path, target)
+            if path is not None:
+                yield target, path
+
+    def check(self, dest_dir: str) -> dict:
+        '''Returns {page rel_path: [broken targets]} for every page with a link to nothing'''
+        outputs = {rel_path.replace(os.sep, "/") for rel_path, _ in iter_files(dest_dir)}
+        broken = {}
+        checked = 0
+        for rel_path in sorted(self.links):
+            for target, path in self.targets(rel_path):
+                checked += 1
+                if not any(candidate in outputs for candidate in link_candidates(path)):
+                    broken.setdefault(rel_path, []).append(target)
+        for rel_path, targets in broken.items():
+            for target in targets:
+                logger.warning(f"Broken link in {rel_path}: {target}")
+        logger.info(f"Checked {checked} links in {len(self.links)} pages, "
+                    f"{sum(len(targets) for targets in broken.values())} broken...")
+        return broken
+
+    def incoming(self, url_path: str) -> list[str]:
+        '''The pages linking to url_path, a path like the ones in content/ links ("/blog/tom")'''
+        path = resolve_link("index.md", url_path)
+        wanted = set(link_candidates(path)) if path is not None else set()
+        return sorted(rel_path for rel_path in self.links
+                      if any(wanted.intersection(link_candidates(path)) for _, path in self.targets(rel_path)))
@@ -0,0 +1,28 @@
+import sys
+import logging
+
+# Records held back before they are written out in one go, errors are written at once
+LOG_BUFFER_RECORDS = 512
+
+LEVELS = {-1: logging.WARNING, 0: logging.INFO, 1: logging.DEBUG}
+
+def setup_logging(verbosity: int=0, buffered: bool=True, stream=None):
+    '''Sends log records to stdout (or stream) as plain messages
+
+    verbosity -1 only shows warnings and errors, 0 the build summary and 1 every file
+    touched. With buffered set records are written in batches instead of one write each.
+    '''
+    stream = logging.StreamHandler(stream or sys.stdout)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    handler = stream
+    if buffered:
+        # logging.handlers pulls in socket and pickle, only builds buffer their log
+        from logging.handlers import MemoryHandler
+        handler = MemoryHandler(LOG_BUFFER_RECORDS, flushLevel=logging.ERROR, target=stream)
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+        old_handler.close()
+    root.addHandler(handler)
+    root.setLevel(LEVELS[max(-1, min(1, verbosity))])
+    return handler
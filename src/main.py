@@ -1,26 +1,418 @@
-import unittest
+import os
 import sys
+import shutil
+import logging
+import argparse
 
-from textnode import TextNode, TextType
-from utils import copy_dir_to_dest, generate_page
+from logs import setup_logging
 
+# Each command imports what it needs when it runs, render starts without loading the build
 dir_path_static = "static"
 dir_path_public = "docs"
 dir_path_content = "content"
 template_path = "."
+manifest_path = ".cache/manifest.json"
+trace_path = ".cache/trace.json"
+image_cache_path = ".cache/images"
+search_state_path = ".cache/search.json"
+cache_dir = ".cache"
 
-def main():
+logger = logging.getLogger("main")
 
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
-    else:
-        basepath = '/'
-    text_node = TextNode('This is anchor text', TextType.TEXT, 'https://www.boot.dev')
+def add_logging_args(parser):
+    parser.add_argument("-v", "--verbose", action="store_const", const=1, default=0, dest="verbosity",
+                        help="log every file copied or removed")
+    parser.add_argument("-q", "--quiet", action="store_const", const=-1, dest="verbosity",
+                        help="only log warnings and errors")
+
+USAGE = """usage: main.py COMMAND [options]
+
+commands:
+  build [basepath]   generate the site in docs/ from content/ and static/ (the default)
+  merge N [basepath] combine N "build --shard I/N" runs and finish the site
+  render FILE        render one markdown file to stdout or --output
+  clean              remove docs/, and .cache/ with --cache
+  watch [basepath]   serve the site from memory and re-render pages as content/ changes
+
+Run main.py COMMAND -h for the options of a command."""
+
+def add_site_args(parser):
+    '''Options of the steps that work on the whole site, run by build and by merge'''
+    from assets import LINK_MODES
+    from compress import SIDECAR_FORMATS
+    from feed import FEED_SECTION
+    from search import SEARCH_SHARDS
+    parser.add_argument("--link", choices=LINK_MODES, default="copy",
+                        help="how static files are placed in the output, linking falls back to copying")
+    parser.add_argument("--hash-assets", action="store_true",
+                        help="compare static files by content when their mtime changed but their size did not")
+    parser.add_argument("--optimize-images", action="store_true",
+                        help=f"recompress PNG files from {dir_path_static} instead of copying them (cached in {image_cache_path})")
+    parser.add_argument("--image-widths", type=int, nargs="+", default=[], metavar="W",
+                        help="with --optimize-images, also write name-Ww.png scaled down to each width")
+    parser.add_argument("--precompress", nargs="+", choices=SIDECAR_FORMATS, default=[], metavar="FORMAT",
+                        help="write index.html.gz (gz) and index.html.zst (zst, needs zstandard) next to text output")
+    parser.add_argument("--search", action="store_true",
+                        help=f"write a sharded full-text search index to {dir_path_public}/search (state kept in {search_state_path})")
+    parser.add_argument("--search-shards", type=int, default=SEARCH_SHARDS, metavar="N",
+                        help="how many files the search index terms are spread over")
+    parser.add_argument("--site-url", metavar="URL",
+                        help="scheme and host the site is published at, needed by --sitemap and --feed")
+    parser.add_argument("--sitemap", action="store_true",
+                        help=f"write {dir_path_public}/sitemap.xml, split into sitemap-N.xml files past 50000 pages")
+    parser.add_argument("--feed", action="store_true",
+                        help="write an Atom feed of the newest pages of --feed-section to SECTION/feed.xml")
+    parser.add_argument("--feed-section", default=FEED_SECTION, metavar="SECTION",
+                        help=f"content directory the feed lists (default {FEED_SECTION})")
+    parser.add_argument("--feed-title", metavar="TITLE", help="title of the feed, the section name by default")
+    parser.add_argument("--check-links", action="store_true",
+                        help="check every link and image in content/ against the generated output")
+    parser.add_argument("--fail-on-broken-links", action="store_true",
+                        help="like --check-links, and fail the build when a link points at nothing")
+    parser.add_argument("--incoming", action="append", default=[], metavar="URL",
+                        help="like --check-links, and list the pages linking to URL (as written in content/), may be repeated")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="render pages on N worker processes (0 uses every CPU core)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every stage of every page, report the slowest pages and write a Chrome trace")
+    parser.add_argument("--profile-output", default=trace_path, metavar="FILE",
+                        help=f"where --profile writes the trace (default {trace_path}), open it in chrome://tracing or Perfetto")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="how many of the slowest and largest pages --profile reports")
+    add_logging_args(parser)
+
+def check_site_args(parser, args):
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.search_shards <= 0:
+        parser.error("--search-shards must be a positive number")
+    if (args.sitemap or args.feed) and not args.site_url:
+        parser.error("--sitemap and --feed require --site-url")
+    if any(width <= 0 for width in args.image_widths):
+        parser.error("--image-widths must be positive numbers")
+    if args.image_widths and not args.optimize_images:
+        parser.error("--image-widths requires --optimize-images")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    args.check_links = args.check_links or args.fail_on_broken_links or bool(args.incoming)
+
+def parse_build_args(argv):
+    from utils import WRITER_THREADS
+    from shards import parse_shard
+    parser = argparse.ArgumentParser(prog="main.py build",
+                                     description="Generate the site in docs/ from content/ and static/")
+    parser.add_argument("basepath", nargs="?", default="/", help="URL prefix the site is served from")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"only re-render pages whose inputs changed since the last build (state kept in {manifest_path})")
+    parser.add_argument("--shard", metavar="I/N",
+                        help=f"only render the pages of shard I of N into {dir_path_public}/, then run main.py merge N; "
+                             "with --search or --check-links their data is collected for the merge")
+    parser.add_argument("--var", action="append", default=[], metavar="NAME=VALUE",
+                        help="fill {{ NAME }} in the template with VALUE, may be repeated")
+    parser.add_argument("--block-cache", type=int, default=0, metavar="N",
+                        help="keep up to N rendered blocks per process and reuse them for identical blocks")
+    parser.add_argument("--minify", action="store_true",
+                        help="write minified pages: collapsed whitespace outside pre/code, fewer quotes and end tags")
+    parser.add_argument("--writer-threads", type=int, default=WRITER_THREADS, metavar="N",
+                        help="write pages on N background threads per rendering process while rendering continues (0 writes inline)")
+    add_site_args(parser)
+    args = parser.parse_args(argv)
+    if args.block_cache < 0:
+        parser.error("--block-cache must be 0 or a positive number")
+    if args.writer_threads < 0:
+        parser.error("--writer-threads must be 0 or a positive number")
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        site_wide = [flag for flag, value in (("--optimize-images", args.optimize_images),
+                                              ("--precompress", args.precompress), ("--sitemap", args.sitemap),
+                                              ("--feed", args.feed), ("--fail-on-broken-links", args.fail_on_broken_links),
+                                              ("--incoming", args.incoming)) if value]
+        if site_wide:
+            parser.error(f"{', '.join(site_wide)} run in main.py merge, not in a --shard build")
+    check_site_args(parser, args)
+    args.variables = parse_variables(parser, args.var)
+    return args
+
+def parse_merge_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py merge",
+                                     description="Combine N --shard builds and run the steps that need the whole site")
+    parser.add_argument("shards", type=int, metavar="N", help="how many shards the pages were split into")
+    parser.add_argument("basepath", nargs="?", default="/", help="URL prefix the site is served from")
+    add_site_args(parser)
+    args = parser.parse_args(argv)
+    if args.shards <= 0:
+        parser.error("N must be a positive number")
+    check_site_args(parser, args)
+    return args
+
+def parse_watch_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py watch",
+                                     description="Serve the site from memory and re-render pages as content/ changes")
+    parser.add_argument("basepath", nargs="?", default="/", help="URL prefix the site is served from")
+    parser.add_argument("--port", type=int, default=8888, help="port the dev server listens on")
+    parser.add_argument("--interval", type=float, default=0.05, metavar="SECONDS",
+                        help="how often content/ and the template are checked for changes")
+    parser.add_argument("--var", action="append", default=[], metavar="NAME=VALUE",
+                        help="fill {{ NAME }} in the template with VALUE, may be repeated")
+    parser.add_argument("--block-cache", type=int, default=1024, metavar="N",
+                        help="keep up to N rendered blocks between rebuilds")
+    add_logging_args(parser)
+    args = parser.parse_args(argv)
+    if args.interval <= 0:
+        parser.error("--interval must be a positive number")
+    if args.block_cache < 0:
+        parser.error("--block-cache must be 0 or a positive number")
+    args.variables = parse_variables(parser, args.var)
+    return args
+
+def parse_render_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py render",
+                                     description="Render one markdown file with the layout it gets in a build")
+    parser.add_argument("file", help=f"markdown file, its place under {dir_path_content}/ picks the layout")
+    parser.add_argument("-o", "--output", metavar="PATH", help="write the page to PATH instead of stdout")
+    parser.add_argument("--basepath", default="/", help="URL prefix the site is served from")
+    parser.add_argument("--var", action="append", default=[], metavar="NAME=VALUE",
+                        help="fill {{ NAME }} in the template with VALUE, may be repeated")
+    parser.add_argument("--minify", action="store_true", help="write the page minified, as build --minify does")
+    add_logging_args(parser)
+    args = parser.parse_args(argv)
+    args.variables = parse_variables(parser, args.var)
+    return args
+
+def parse_clean_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py clean", description=f"Remove the generated site in {dir_path_public}/")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"also remove {cache_dir}/ (manifest, image cache, search index state)")
+    add_logging_args(parser)
+    return parser.parse_args(argv)
+
+def parse_variables(parser, pairs):
+    variables = {}
+    for var in pairs:
+        name, sep, value = var.partition("=")
+        if not sep or not name:
+            parser.error(f"--var expects NAME=VALUE, got {var}")
+        variables[name] = value
+    return variables
+
+def run_watch(argv):
+    from watch import watch
+    args = parse_watch_args(argv)
+    setup_logging(args.verbosity, buffered=False)
+    watch(dir_path_content, dir_path_static, template_path, args.basepath, args.port, args.interval,
+          args.variables, args.block_cache)
+
+def run_render(argv):
+    args = parse_render_args(argv)
+    # stdout may be the page, the log goes to stderr
+    setup_logging(args.verbosity, buffered=False, stream=sys.stderr)
+    from utils import render_file
+    if args.output is None:
+        render_file(sys.stdout, args.file, template_path, args.basepath, args.variables, dir_path_content, args.minify)
+        return
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    tmp_output = f"{args.output}.tmp"
+    try:
+        with open(tmp_output, 'w') as f:
+            render_file(f, args.file, template_path, args.basepath, args.variables, dir_path_content, args.minify)
+        os.replace(tmp_output, args.output)
+    finally:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+
+def run_clean(argv):
+    args = parse_clean_args(argv)
+    setup_logging(args.verbosity, buffered=False)
+    for dir_path in [dir_path_public] + ([cache_dir] if args.cache else []):
+        if os.path.exists(dir_path):
+            logger.info(f"Removing {dir_path}...")
+            shutil.rmtree(dir_path)
 
-    copy_dir_to_dest(dir_path_static, dir_path_public)
+def sync_static(args, manifest, trace):
+    '''Puts static/ in the output, optimizing the images when asked to'''
+    from assets import sync_dir_to_dest
+    from tracing import span
+    with span(trace, "static"):
+        skip_suffixes = (".png",) if args.optimize_images else ()
+        sync_dir_to_dest(dir_path_static, dir_path_public, manifest, args.hash_assets, args.link, skip_suffixes)
+    if args.optimize_images:
+        from images import optimize_images
+        with span(trace, "images"):
+            optimize_images(dir_path_static, dir_path_public, image_cache_path, sorted(set(args.image_widths)),
+                            args.jobs, manifest, args.link)
+    elif manifest is not None and manifest.images:
+        from images import prune_images
+        # Optimized last time, the static sync has put the originals back, drop the variants
+        prune_images(manifest, dir_path_public, keep_outputs=manifest.assets)
 
-    generate_page(dir_path_content, template_path, dir_path_public, basepath)
+def site_listings(args, basepath):
+    listings = []
+    if args.sitemap:
+        from sitemap import SitemapWriter
+        listings.append(SitemapWriter(dir_path_public, args.site_url, basepath))
+    if args.feed:
+        from feed import FeedWriter
+        listings.append(FeedWriter(dir_path_public, args.site_url, basepath, args.feed_section, args.feed_title))
+    return listings
 
+def finish_site(args, basepath, search, links, trace):
+    '''The steps that need every page written: search index, link check, sidecars, trace'''
+    from tracing import span
+    if search is not None:
+        with span(trace, "search"):
+            search.write(dir_path_public, basepath)
+
+    if links is not None:
+        with span(trace, "links"):
+            broken = links.check(dir_path_public)
+        for url in args.incoming:
+            pages = links.incoming(url)
+            logger.info(f"{len(pages)} page(s) link to {url}{': ' if pages else ''}{', '.join(pages)}")
+        if broken and args.fail_on_broken_links:
+            raise Exception(f"{sum(len(targets) for targets in broken.values())} broken link(s) in "
+                            f"{len(broken)} page(s): {', '.join(broken)}")
+
+    with span(trace, "compress"):
+        if args.precompress:
+            from compress import write_sidecars
+            write_sidecars(dir_path_public, args.precompress, args.jobs)
+        else:
+            from compress import prune_sidecars
+            # Sidecars of an earlier --precompress build must not outlive their pages
+            prune_sidecars(dir_path_public)
+
+    if trace is not None:
+        trace.write(args.profile_output)
+        trace.report(args.profile_top)
+        logger.info(f"Wrote build trace to {args.profile_output}")
+
+def run_build(argv):
+    from utils import generate_page
+    from manifest import BuildManifest
+    from tracing import BuildTrace, span
+    args = parse_build_args(argv)
+    setup_logging(args.verbosity)
+    basepath = args.basepath
+    trace = BuildTrace() if args.profile else None
+    if args.shard is not None:
+        run_shard(args, trace)
+        return
+
+    manifest = None
+    if args.incremental:
+        manifest = BuildManifest.load(manifest_path)
+
+    if manifest is None and os.path.exists(dir_path_public):
+        logger.info(f"Removing files from {dir_path_public} folder...")
+        with span(trace, "clean"):
+            shutil.rmtree(dir_path_public)
+    sync_static(args, manifest, trace)
+
+    search = None
+    if args.search:
+        from search import SearchIndex
+        search = SearchIndex.load(search_state_path, args.search_shards)
+    links = None
+    if args.check_links:
+        from links import LinkGraph
+        links = LinkGraph()
+    with span(trace, "pages"):
+        generate_page(dir_path_content, template_path, dir_path_public, basepath, manifest, args.jobs, args.variables,
+                      args.block_cache, trace, args.writer_threads, search, site_listings(args, basepath), links,
+                      minify=args.minify)
+    finish_site(args, basepath, search, links, trace)
+
+def run_shard(args, trace):
+    '''Renders one shard of the pages into the shared output with state files of its own
+
+    Nothing is removed up front (run main.py clean first for a build from scratch) and
+    static/ is left to the merge, so shards never write the same file.
+    '''
+    from utils import generate_page
+    from manifest import BuildManifest
+    from shards import shard_path
+    from tracing import span
+    manifest_file = shard_path(cache_dir, "manifest", args.shard)
+    # Always recorded, the merge combines the shard manifests into the site's
+    manifest = BuildManifest.load(manifest_file) if args.incremental else BuildManifest(manifest_file)
+    search = None
+    if args.search:
+        from search import SearchIndex
+        search = SearchIndex.load(shard_path(cache_dir, "search", args.shard), args.search_shards)
+    links = None
+    if args.check_links:
+        from links import LinkGraph
+        # Only collected into the shard manifest, checked by the merge
+        links = LinkGraph()
+    with span(trace, "pages"):
+        generate_page(dir_path_content, template_path, dir_path_public, args.basepath, manifest, args.jobs,
+                      args.variables, args.block_cache, trace, args.writer_threads, search, (), links, args.shard,
+                      args.minify)
+    if trace is not None:
+        profile_output = args.profile_output
+        if profile_output == trace_path:
+            profile_output = shard_path(cache_dir, "trace", args.shard)
+        trace.write(profile_output)
+        trace.report(args.profile_top)
+        logger.info(f"Wrote build trace to {profile_output}")
+
+def run_merge(argv):
+    from manifest import BuildManifest
+    from shards import load_shard_manifests, merge_manifests, merge_search_states
+    from tracing import BuildTrace, span
+    from utils import iter_markdown_files
+    args = parse_merge_args(argv)
+    setup_logging(args.verbosity)
+    trace = BuildTrace() if args.profile else None
+
+    manifest = BuildManifest.load(manifest_path)
+    with span(trace, "merge"):
+        pages = merge_manifests(manifest, load_shard_manifests(cache_dir, args.shards), dir_path_public, args.basepath)
+    sync_static(args, manifest, trace)
+    manifest.save()
+
+    search = None
+    if args.search:
+        from search import SearchIndex
+        search = SearchIndex.load(search_state_path, args.search_shards)
+        merge_search_states(search, cache_dir, args.shards, pages)
+        search.save()
+    listings = site_listings(args, args.basepath)
+    if listings:
+        with span(trace, "listings"):
+            for rel_path in iter_markdown_files(dir_path_content):
+                if rel_path in pages:
+                    for listing in listings:
+                        listing.add(rel_path, os.path.join(dir_path_content, rel_path))
+            for listing in listings:
+                listing.close()
+    links = None
+    if args.check_links:
+        from links import LinkGraph
+        links = LinkGraph()
+        for rel_path in pages:
+            targets = manifest.page_links(rel_path)
+            if targets is None:
+                raise Exception(f"No links recorded for {rel_path}, build the shards with --check-links")
+            links.record(rel_path, targets)
+    finish_site(args, args.basepath, search, links, trace)
+
+COMMANDS = {"build": run_build, "merge": run_merge, "render": run_render, "clean": run_clean, "watch": run_watch}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] in (["-h"], ["--help"]):
+        print(USAGE)
+        return
+    if argv and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+    else:
+        # main.py [basepath] [options], the way builds were started before there were commands
+        run_build(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the generated HTML changes shape so old manifests force a full rebuild
+MANIFEST_VERSION = 2
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest():
+    '''Records the inputs of the last build so unchanged pages and static files can be skipped'''
+    def __init__(self, path: str, data: dict=None):
+        self.path = path
+        data = data or {}
+        self.inputs_hash = data.get("inputs_hash")
+        self.basepath = data.get("basepath")
+        self.pages = data.get("pages", {})
+        self.assets = set(data.get("assets", []))
+        # Source image -> its hash, size, mtime and the outputs made from it, see optimize_images
+        self.images = data.get("images", {})
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.isfile(path):
+            return cls(path)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable build manifest {path}...")
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data)
+
+    def save(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "inputs_hash": self.inputs_hash,
+            "basepath": self.basepath,
+            "pages": self.pages,
+            "assets": sorted(self.assets),
+            "images": self.images,
+        }
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def check_inputs(self, inputs_hash: str, basepath: str) -> bool:
+        '''Forgets every page when a site-wide input changed, returns True if it did'''
+        if self.inputs_hash == inputs_hash and self.basepath == basepath:
+            return False
+        self.inputs_hash = inputs_hash
+        self.basepath = basepath
+        self.pages = {}
+        return True
+
+    def is_fresh(self, rel_path: str, source_path: str, output_path: str, file_hash=None) -> bool:
+        '''True when neither the source nor any template file the page was rendered with changed
+
+        file_hash(path) returns the current hash of a template file, None when it is missing.
+        '''
+        entry = self.pages.get(rel_path)
+        if entry is None or not os.path.isfile(output_path):
+            return False
+        if file_hash is not None and any(file_hash(path) != digest for path, digest in entry["deps"].items()):
+            return False
+        stat = os.stat(source_path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        # Touched but possibly unchanged (checkout, copy), fall back to the content hash
+        if entry["size"] != stat.st_size or hash_file(source_path) != entry["hash"]:
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def record(self, rel_path: str, source_path: str, digest: str, output_rel_path: str, deps: dict=None,
+               links: list=None):
+        stat = os.stat(source_path)
+        self.pages[rel_path] = {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "output": output_rel_path,
+            # Template file -> hash it had when the page was rendered, None if it didn't exist
+            "deps": deps or {},
+        }
+        if links is not None:
+            self.pages[rel_path]["links"] = links
+
+    def page_links(self, rel_path: str):
+        '''The link targets recorded for a page, None when they weren't read when it was rendered'''
+        return self.pages.get(rel_path, {}).get("links")
+
+    def dependents(self, template_file: str) -> list[str]:
+        '''The pages rendered with template_file, or that would switch to it if it appeared'''
+        return sorted(rel_path for rel_path, entry in self.pages.items() if template_file in entry["deps"])
+
+    def prune(self, seen_paths, dest_path, remove_dirs: bool=True) -> list[str]:
+        '''Deletes the output of every page whose source is no longer present
+
+        With remove_dirs the directories this leaves empty go too. Builds sharing
+        dest_path with others running at the same time leave them, another build may
+        be about to write into them (see remove_empty_tree).
+        '''
+        removed = []
+        for rel_path in sorted(set(self.pages) - set(seen_paths)):
+            entry = self.pages.pop(rel_path)
+            output_file = os.path.join(dest_path, entry["output"])
+            if os.path.isfile(output_file):
+                logger.debug(f"Removing stale page {output_file}...")
+                os.remove(output_file)
+                if remove_dirs:
+                    remove_empty_dirs(os.path.dirname(output_file), dest_path)
+            removed.append(rel_path)
+        return removed
+
+def remove_empty_dirs(dir_path, stop_dir):
+    stop_dir = os.path.abspath(stop_dir)
+    dir_path = os.path.abspath(dir_path)
+    while dir_path != stop_dir and dir_path.startswith(stop_dir) and not os.listdir(dir_path):
+        os.rmdir(dir_path)
+        dir_path = os.path.dirname(dir_path)
+
+def remove_empty_tree(dest_path) -> int:
+    '''Removes every empty directory under dest_path, deepest first, returns how many'''
+    removed = 0
+    for dir_path, _, file_names in os.walk(dest_path, topdown=False):
+        # The listing of subdirectories is from before they were removed, ask again
+        if dir_path != dest_path and not file_names and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+            removed += 1
+    return removed
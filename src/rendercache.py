@@ -0,0 +1,75 @@
+import hashlib
+
+from collections import OrderedDict
+
+from htmlnode import RawHTMLNode
+from serializer import MINIFY_SAVINGS, render_html
+
+class BlockCache():
+    '''Bounded LRU of rendered block HTML, keyed by block type and a hash of the block text
+
+    Fragments are serialized with the cache's basepath and minify setting, so one cache
+    serves one site configuration. hits and misses count lookups since the cache was
+    created. Minified fragments remember what minifying saved on them, a hit counts it
+    again in MINIFY_SAVINGS as the page it lands on is that much smaller too.
+    '''
+    def __init__(self, maxsize: int=1024, basepath: str=None, minify: bool=False):
+        if maxsize <= 0:
+            raise ValueError("block cache size must be positive")
+        self.maxsize = maxsize
+        self.basepath = basepath
+        self.minify = minify
+        # key -> html, or (html, characters saved) when minifying
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(block: str, block_type) -> tuple:
+        return block_type, hashlib.blake2b(block.encode(), digest_size=16).digest()
+
+    def get(self, key):
+        html = self.entries.get(key)
+        if html is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return html
+
+    def put(self, key, html: str):
+        self.entries[key] = html
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def node_for(self, block: str, block_type, convert) -> RawHTMLNode:
+        '''Returns the rendered block, calling convert(block, block_type) only on a miss'''
+        key = self.key(block, block_type)
+        entry = self.get(key)
+        if not self.minify:
+            if entry is None:
+                entry = render_html(convert(block, block_type), self.basepath)
+                self.put(key, entry)
+            return RawHTMLNode(entry)
+        if entry is None:
+            saved = MINIFY_SAVINGS.saved
+            html = render_html(convert(block, block_type), self.basepath, True)
+            self.put(key, (html, MINIFY_SAVINGS.saved - saved))
+            return RawHTMLNode(html)
+        html, saved = entry
+        MINIFY_SAVINGS.saved += saved
+        return RawHTMLNode(html)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
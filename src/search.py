@@ -0,0 +1,211 @@
+import os
+import re
+import json
+import logging
+
+from blocktypes import BlockType, scan_blocks
+from compress import MIN_COMPRESS_BYTES, is_sidecar_fresh, write_sidecar
+from inline import tokenize_inline
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_DIR = "search"
+SEARCH_SHARDS = 16
+
+# Letters and digits, underscores are emphasis markers rather than part of a word
+WORD = re.compile(r"[^\W_]+")
+LIST_MARKER = re.compile(r"^(?:- |\d+\. |> ?)", re.MULTILINE)
+# Weight of a word by the heading level it appears in, body text counts 1
+HEADING_WEIGHTS = {1: 10, 2: 5, 3: 3, 4: 2, 5: 2, 6: 2}
+# Positions kept per term and page, enough for phrase hints without growing the shards
+MAX_POSITIONS = 8
+MIN_TERM_LENGTH = 2
+
+def block_text(block: str, block_type: BlockType) -> str:
+    '''The words of a block without its markdown, link targets and image URLs dropped'''
+    if block_type == BlockType.HEADING:
+        block = block.lstrip("#")
+    elif block_type in (BlockType.QUOTE, BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST):
+        block = LIST_MARKER.sub("", block)
+    return " ".join(node.text for node in tokenize_inline(block, strict=False))
+
+def page_doc(md_text: str, title: str=None) -> dict:
+    '''The search entry of a page, {"title": ..., "terms": {term: [weight, first positions]}}
+
+    Code blocks are left out. Without a title the first "# " heading is used, found in
+    the same pass over the blocks.
+    '''
+    doc = DocBuilder(title)
+    for block, block_type in scan_blocks(md_text):
+        doc.add(block, block_type)
+    return doc.doc()
+
+
+class DocBuilder():
+    '''Builds the entry page_doc returns one block at a time, for pages that are streamed'''
+    def __init__(self, title: str=None):
+        self.title = title
+        self.terms = {}
+        self.position = 0
+
+    def add(self, block: str, block_type: BlockType):
+        if block_type == BlockType.CODE:
+            return
+        weight = 1
+        if block_type == BlockType.HEADING:
+            # The same heading find_title picks for the page's <title>
+            if self.title is None and block.startswith("# "):
+                self.title = block[2:]
+            weight = HEADING_WEIGHTS[len(block) - len(block.lstrip("#"))]
+        terms = self.terms
+        for match in WORD.finditer(block_text(block, block_type)):
+            term = match.group(0).lower()
+            self.position += 1
+            if len(term) < MIN_TERM_LENGTH:
+                continue
+            entry = terms.get(term)
+            if entry is None:
+                terms[term] = [weight, [self.position]]
+                continue
+            entry[0] += weight
+            if len(entry[1]) < MAX_POSITIONS:
+                entry[1].append(self.position)
+
+    def doc(self) -> dict:
+        return {"title": self.title, "terms": self.terms}
+
+def fnv1a(text: str) -> int:
+    '''32 bit FNV-1a of the UTF-8 bytes, cheap to repeat in the browser to find a shard'''
+    value = 0x811c9dc5
+    for byte in text.encode():
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value
+
+def shard_of(term: str, shards: int) -> int:
+    return fnv1a(term) % shards
+
+
+class SearchIndex():
+    '''Inverted index of the site, kept between builds so only rebuilt pages are re-read
+
+    Pages keep the id they were first given, so adding or removing a page only
+    rewrites the shards holding its terms. The index is written to search/ in the
+    output: index.json lists the pages by id and how terms map to shards, and
+    shard-NN.json maps each term to [page id, weight, positions] postings, heaviest
+    first. Every file gets a .gz sidecar like --precompress writes, so the browser
+    only fetches the shards of the terms it looks up, compressed.
+    '''
+    def __init__(self, state_path: str, shards: int=SEARCH_SHARDS):
+        self.state_path = state_path
+        self.shards = shards
+        self.ids = {}
+        self.next_id = 0
+        self.docs = {}
+
+    @classmethod
+    def load(cls, state_path, shards=SEARCH_SHARDS):
+        index = cls(state_path, shards)
+        if not os.path.isfile(state_path):
+            return index
+        try:
+            with open(state_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable search index state {state_path}...")
+            return index
+        if data.get("version") != SEARCH_INDEX_VERSION:
+            return index
+        index.ids = data["ids"]
+        index.next_id = data["next_id"]
+        index.docs = data["docs"]
+        return index
+
+    def save(self):
+        data = {"version": SEARCH_INDEX_VERSION, "ids": self.ids, "next_id": self.next_id, "docs": self.docs}
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def __contains__(self, rel_path):
+        return rel_path in self.docs
+
+    def update(self, rel_path: str, doc: dict):
+        '''Replaces the entry of a page with doc, see page_doc'''
+        if rel_path not in self.ids:
+            self.ids[rel_path] = self.next_id
+            self.next_id += 1
+        self.docs[rel_path] = doc
+
+    def prune(self, seen_paths) -> list[str]:
+        removed = sorted(set(self.docs) - set(seen_paths))
+        for rel_path in removed:
+            del self.docs[rel_path]
+            del self.ids[rel_path]
+        return removed
+
+    def shard_data(self) -> list[dict]:
+        shards = [{} for _ in range(self.shards)]
+        for rel_path, doc in self.docs.items():
+            page_id = self.ids[rel_path]
+            for term, (weight, positions) in doc["terms"].items():
+                shards[shard_of(term, self.shards)].setdefault(term, []).append([page_id, weight, positions])
+        for shard in shards:
+            for postings in shard.values():
+                postings.sort(key=lambda posting: (-posting[1], posting[0]))
+        return shards
+
+    def write(self, dest_dir: str, basepath: str="/") -> dict:
+        '''Writes index.json and the shards under dest_dir/search, skipping unchanged files'''
+        from utils import page_url
+        counts = {"written": 0, "unchanged": 0}
+        pages = [None] * self.next_id
+        for rel_path, page_id in self.ids.items():
+            pages[page_id] = [page_url(rel_path, basepath), self.docs[rel_path]["title"]]
+        index = {
+            "version": SEARCH_INDEX_VERSION,
+            "shards": self.shards,
+            "hash": "fnv1a32",
+            "shard_path": "shard-{shard:02d}.json",
+            "pages": pages,
+        }
+        files = {"index.json": json_bytes(index)}
+        for number, shard in enumerate(self.shard_data()):
+            files[f"shard-{number:02d}.json"] = json_bytes(shard)
+
+        search_dir = os.path.join(dest_dir, SEARCH_DIR)
+        os.makedirs(search_dir, exist_ok=True)
+        for name, data in files.items():
+            path = os.path.join(search_dir, name)
+            counts["written" if write_if_changed(path, data) else "unchanged"] += 1
+            if len(data) < MIN_COMPRESS_BYTES:
+                if os.path.exists(f"{path}.gz"):
+                    os.remove(f"{path}.gz")
+            elif not is_sidecar_fresh(os.stat(path), f"{path}.gz"):
+                write_sidecar((path, "gz"))
+        for name in os.listdir(search_dir):
+            if name.startswith("shard-") and name.split(".")[0] + ".json" not in files:
+                os.remove(os.path.join(search_dir, name))
+        logger.info(f"Search index: {len(self.docs)} pages, {counts['written']} files written, "
+                    f"{counts['unchanged']} unchanged...")
+        return counts
+
+def json_bytes(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), sort_keys=True, ensure_ascii=False).encode()
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    '''Writes data to path unless it already holds exactly that, returns True if it wrote'''
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
@@ -0,0 +1,208 @@
+import re
+
+from htmlnode import LeafNode, ParentNode, RawHTMLNode
+
+TEXT_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+ATTR_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+_TEXT_SPECIAL = re.compile(r'[&<>]')
+_ATTR_SPECIAL = re.compile(r'[&<>"]')
+
+# Attributes holding site-absolute URLs that get the basepath prepended
+URL_ATTRS = ("href", "src")
+
+# Chunks are joined and handed to the sink in writes of roughly this many characters
+WRITE_BUFFER_SIZE = 1 << 16
+
+# Whitespace as HTML defines it, a non-breaking space is text
+HTML_SPACE = re.compile(r"[ \t\n\r\f]+")
+# Attribute values that are the same without quotes, braces stay quoted for template slots
+UNQUOTED_VALUE = re.compile(r"[^ \t\n\r\f\"'=<>`{}]+")
+# Elements whose text is written exactly as it is when minifying
+PRESERVE_SPACE_TAGS = frozenset({"pre", "code", "textarea", "script", "style"})
+# A </p> may be left out before one of these, or at the end of any parent but P_KEEP_END_PARENTS
+P_CLOSING_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset", "figcaption",
+    "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hgroup", "hr",
+    "main", "menu", "nav", "ol", "p", "pre", "section", "table", "ul",
+})
+P_KEEP_END_PARENTS = frozenset({"a", "audio", "del", "ins", "map", "noscript", "video"})
+# Elements that never have content or an end tag
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"})
+
+
+class MinifyCounter():
+    '''Characters minified serialization has left out in this process
+
+    Read before and after rendering a page for what minifying saved on it. Blocks
+    taken from a BlockCache add what they saved when they were first rendered.
+    '''
+    def __init__(self):
+        self.saved = 0
+
+MINIFY_SAVINGS = MinifyCounter()
+
+def escape_text(text: str) -> str:
+    if _TEXT_SPECIAL.search(text) is None:
+        return text
+    return text.translate(TEXT_ESCAPE)
+
+def escape_attr(value: str) -> str:
+    if _ATTR_SPECIAL.search(value) is None:
+        return value
+    return value.translate(ATTR_ESCAPE)
+
+def attrs_to_html(props, basepath=None, minify=False) -> str:
+    if not props:
+        return ""
+    parts = []
+    for key, value in props.items():
+        value = str(value)
+        if basepath is not None and key in URL_ATTRS and value.startswith("/"):
+            value = basepath + value[1:]
+        value = escape_attr(value)
+        if minify and UNQUOTED_VALUE.fullmatch(value):
+            parts.append(f" {key}={value}")
+            MINIFY_SAVINGS.saved += 2
+        else:
+            parts.append(f' {key}="{value}"')
+    return "".join(parts)
+
+def collapse_space(text: str) -> str:
+    collapsed = HTML_SPACE.sub(" ", text)
+    MINIFY_SAVINGS.saved += len(text) - len(collapsed)
+    return collapsed
+
+def may_omit_end_tag(node, parent_tag, next_sibling) -> bool:
+    '''True when the end tag of node can be left out, knowing its parent and what follows it
+
+    Only </li>, </p> and the end tag of empty void elements are left out. A node without a parent is taken to be one
+    block of a page, which always sits in a block container next to other blocks.
+    '''
+    if node.tag in VOID_TAGS:
+        return not node.value and not node.children
+    if node.tag == "li":
+        return parent_tag in (None, "ul", "ol")
+    if node.tag != "p" or parent_tag in P_KEEP_END_PARENTS:
+        return False
+    # Cached blocks come back as RawHTMLNode, every block starts with a block element
+    return next_sibling is None or isinstance(next_sibling, RawHTMLNode) or next_sibling.tag in P_CLOSING_TAGS
+
+# Stack marker for the end of an element whose whitespace is kept
+_END_PRESERVE = object()
+
+def iter_html(node, basepath=None, minify=False):
+    '''Yields the HTML of node in chunks, walking the tree with an explicit stack
+
+    Text and attribute values are escaped. With a basepath, href and src values that
+    start with "/" are rewritten to start with the basepath instead. With minify the
+    output is minified as it is written, see iter_minified_html.
+    '''
+    if minify:
+        yield from iter_minified_html(node, basepath)
+        return
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        if item.__class__ is str:
+            yield item
+        elif isinstance(item, ParentNode):
+            if item.tag is None:
+                raise ValueError("invalid HTML: no tag")
+            if item.children is None:
+                raise ValueError("invalid HTML: no children")
+            yield f"<{item.tag}{attrs_to_html(item.props, basepath)}>"
+            push(f"</{item.tag}>")
+            stack.extend(reversed(item.children))
+        elif isinstance(item, LeafNode):
+            if item.value is None:
+                raise ValueError("invalid HTML: no value")
+            if item.tag is None:
+                yield escape_text(item.value)
+            else:
+                yield f"<{item.tag}{attrs_to_html(item.props, basepath)}>{escape_text(item.value)}</{item.tag}>"
+        elif isinstance(item, RawHTMLNode):
+            yield item.value
+        else:
+            yield item.to_html()
+
+def iter_minified_html(node, basepath=None):
+    '''Like iter_html, minifying in the same pass
+
+    Whitespace in text collapses to one space outside pre, code, textarea, script and
+    style. Attribute values that don't need quotes lose them. </li>, </p> and </img>
+    are left out where HTML allows it (see may_omit_end_tag). What is left out is counted in
+    MINIFY_SAVINGS.
+    '''
+    counter = MINIFY_SAVINGS
+    preserve = 0
+    # Nodes whose end tag is left out, decided when their parent lists its children
+    omit_end = set()
+    if node.tag is not None and may_omit_end_tag(node, None, None):
+        omit_end.add(id(node))
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        if item.__class__ is str:
+            yield item
+        elif item is _END_PRESERVE:
+            preserve -= 1
+        elif isinstance(item, ParentNode):
+            if item.tag is None:
+                raise ValueError("invalid HTML: no tag")
+            if item.children is None:
+                raise ValueError("invalid HTML: no children")
+            yield f"<{item.tag}{attrs_to_html(item.props, basepath, True)}>"
+            if item.tag in PRESERVE_SPACE_TAGS:
+                preserve += 1
+                push(_END_PRESERVE)
+            if id(item) in omit_end:
+                counter.saved += len(item.tag) + 3
+            else:
+                push(f"</{item.tag}>")
+            children = item.children
+            for i, child in enumerate(children):
+                if child.tag in ("p", "li") or child.tag in VOID_TAGS:
+                    next_sibling = children[i + 1] if i + 1 < len(children) else None
+                    if may_omit_end_tag(child, item.tag, next_sibling):
+                        omit_end.add(id(child))
+            stack.extend(reversed(children))
+        elif isinstance(item, LeafNode):
+            if item.value is None:
+                raise ValueError("invalid HTML: no value")
+            text = item.value
+            if not preserve and item.tag not in PRESERVE_SPACE_TAGS:
+                text = collapse_space(text)
+            if item.tag is None:
+                yield escape_text(text)
+            elif id(item) in omit_end:
+                counter.saved += len(item.tag) + 3
+                yield f"<{item.tag}{attrs_to_html(item.props, basepath, True)}>{escape_text(text)}"
+            else:
+                yield f"<{item.tag}{attrs_to_html(item.props, basepath, True)}>{escape_text(text)}</{item.tag}>"
+        elif isinstance(item, RawHTMLNode):
+            yield item.value
+        else:
+            yield item.to_html()
+
+def write_html(node, sink, basepath=None, minify=False) -> int:
+    '''Streams the HTML of node to a file-like sink, returns the characters written'''
+    written = 0
+    buffer = []
+    size = 0
+    for chunk in iter_html(node, basepath, minify):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= WRITE_BUFFER_SIZE:
+            sink.write("".join(buffer))
+            written += size
+            buffer.clear()
+            size = 0
+    sink.write("".join(buffer))
+    return written + size
+
+def render_html(node, basepath=None, minify=False) -> str:
+    return "".join(iter_html(node, basepath, minify))
@@ -0,0 +1,84 @@
+import os
+import hashlib
+import logging
+
+from manifest import BuildManifest, remove_empty_tree
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIR = "shards"
+
+def parse_shard(text: str):
+    '''Reads "i/N" into (i, N), shards are numbered from 1 to N'''
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"invalid shard, expected i/N: {text}")
+    if not sep or count <= 0 or not 1 <= index <= count:
+        raise ValueError(f"invalid shard, expected i/N with 1 <= i <= N: {text}")
+    return index, count
+
+def shard_of(rel_path: str, count: int) -> int:
+    '''The shard (1 to count) a page belongs to, the same on every machine and Python run'''
+    digest = hashlib.sha1(rel_path.replace(os.sep, "/").encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+def in_shard(rel_path: str, shard) -> bool:
+    index, count = shard
+    return shard_of(rel_path, count) == index
+
+def shard_path(cache_dir: str, name: str, shard) -> str:
+    '''Where a shard keeps its own copy of a state file, .cache/shards/manifest-2-of-4.json'''
+    index, count = shard
+    return os.path.join(cache_dir, SHARDS_DIR, f"{name}-{index}-of-{count}.json")
+
+def load_shard_manifests(cache_dir: str, count: int) -> list[BuildManifest]:
+    manifests = []
+    for index in range(1, count + 1):
+        path = shard_path(cache_dir, "manifest", (index, count))
+        if not os.path.isfile(path):
+            raise Exception(f"Shard {index}/{count} has not been built, {path} is missing")
+        manifests.append(BuildManifest.load(path))
+    return manifests
+
+def merge_manifests(manifest: BuildManifest, shard_manifests, dest_path: str, basepath: str) -> dict:
+    '''Replaces the pages of manifest with those of every shard
+
+    Pages the manifest knew that no shard has any more (deleted, or left behind by a
+    different shard count) have their output removed. Shards leave the directories
+    they empty in place as other shards may still write there, with every shard done
+    they are removed here. Returns the merged pages.
+    '''
+    inputs = {(shard.inputs_hash, shard.basepath) for shard in shard_manifests}
+    if len(inputs) > 1:
+        raise Exception("Shards were built with different variables or basepaths, rebuild every shard")
+    inputs_hash, shard_basepath = inputs.pop()
+    if shard_basepath != basepath:
+        raise Exception(f"Shards were built for basepath {shard_basepath}, not {basepath}")
+    pages = {}
+    for shard in shard_manifests:
+        overlap = pages.keys() & shard.pages.keys()
+        if overlap:
+            raise Exception(f"Pages rendered by more than one shard: {', '.join(sorted(overlap))}")
+        pages.update(shard.pages)
+    manifest.inputs_hash, manifest.basepath = inputs_hash, basepath
+    removed = manifest.prune(pages, dest_path)
+    manifest.pages = pages
+    empty_dirs = remove_empty_tree(dest_path) if os.path.isdir(dest_path) else 0
+    logger.info(f"Merged {len(pages)} pages from {len(shard_manifests)} shards, removed {len(removed)} "
+                f"and {empty_dirs} empty directories...")
+    return pages
+
+def merge_search_states(search, cache_dir: str, count: int, pages):
+    '''Adds the search entries every shard collected to search, keeping only current pages'''
+    from search import SearchIndex
+    for index in range(1, count + 1):
+        shard = SearchIndex.load(shard_path(cache_dir, "search", (index, count)))
+        for rel_path, doc in shard.docs.items():
+            if rel_path in pages:
+                search.update(rel_path, doc)
+    search.prune(pages)
+    missing = len(pages) - len(search.docs)
+    if missing:
+        logger.warning(f"{missing} page(s) are missing from the search index, build the shards with --search")
@@ -0,0 +1,143 @@
+import os
+import logging
+
+from datetime import datetime, timezone
+from html import escape
+
+from layouts import read_front_matter
+from manifest import hash_file
+from utils import page_url
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NAME = "sitemap.xml"
+# Limit of the sitemap protocol, past it the URLs are split over sitemap-N.xml files
+MAX_SITEMAP_URLS = 50000
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+def absolute_url(site_url: str, path: str) -> str:
+    return site_url.rstrip("/") + path
+
+def parse_time(text: str, source_file: str) -> datetime:
+    '''A front matter date, an ISO date or date and time, taken as UTC without a zone'''
+    try:
+        time = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"invalid date in {source_file}: {text}")
+    return time if time.tzinfo is not None else time.replace(tzinfo=timezone.utc)
+
+def front_matter_time(metadata: dict, source_file: str):
+    '''The "updated" or else the "date" of the front matter, None without either
+
+    Never the file's mtime, a checkout or copy would make every page look changed.
+    Raises ValueError for a date that doesn't parse.
+    '''
+    text = metadata.get("updated") or metadata.get("date")
+    return parse_time(text, source_file) if text else None
+
+def page_lastmod(source_file: str):
+    '''The front matter time of a page as YYYY-MM-DD, see front_matter_time'''
+    try:
+        time = front_matter_time(read_front_matter(source_file), source_file)
+    except ValueError as e:
+        logger.warning(f"{e}, leaving out its <lastmod>")
+        return None
+    return time.astimezone(timezone.utc).date().isoformat() if time is not None else None
+
+def commit_if_changed(tmp_file: str, path: str) -> bool:
+    '''Moves tmp_file over path unless path holds the same bytes, returns True if it moved
+
+    Unchanged files keep their mtime, so their sidecars and any cache in front of the
+    site stay valid.
+    '''
+    if os.path.isfile(path) and os.path.getsize(path) == os.path.getsize(tmp_file) \
+            and hash_file(path) == hash_file(tmp_file):
+        os.remove(tmp_file)
+        return False
+    os.replace(tmp_file, path)
+    return True
+
+
+class SitemapWriter():
+    '''Streams sitemap.xml while pages are discovered, one URL at a time
+
+    Only the file being written and the last modification of each finished file are
+    kept in memory. Past MAX_SITEMAP_URLS the URLs continue in the next file; a site
+    with more than one file gets sitemap-1.xml, sitemap-2.xml... and a sitemap.xml
+    index listing them. <lastmod> comes from the front matter (see page_lastmod) and
+    is left out for pages without a date, so an unchanged site writes the same bytes
+    however its files were checked out and the files on disk are left alone.
+    '''
+    def __init__(self, dest_dir: str, site_url: str, basepath: str="/", max_urls: int=MAX_SITEMAP_URLS):
+        self.dest_dir = dest_dir
+        self.site_url = site_url
+        self.basepath = basepath
+        self.max_urls = max_urls
+        # lastmod of every finished part, in order
+        self.parts = []
+        self.file = None
+        self.count = 0
+        self.lastmod = None
+        self.urls = 0
+
+    def part_path(self, number: int) -> str:
+        return os.path.join(self.dest_dir, f"sitemap-{number}.xml")
+
+    def open_part(self):
+        os.makedirs(self.dest_dir, exist_ok=True)
+        self.file = open(f"{self.part_path(len(self.parts) + 1)}.tmp", 'w')
+        self.file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n')
+        self.count = 0
+        self.lastmod = None
+
+    def close_part(self):
+        self.file.write("</urlset>\n")
+        self.file.close()
+        self.file = None
+        self.parts.append(self.lastmod)
+
+    def add(self, rel_path: str, source_file: str):
+        if self.file is None:
+            self.open_part()
+        elif self.count >= self.max_urls:
+            self.close_part()
+            self.open_part()
+        lastmod = page_lastmod(source_file)
+        url = absolute_url(self.site_url, page_url(rel_path, self.basepath))
+        if lastmod is None:
+            self.file.write(f"<url><loc>{escape(url)}</loc></url>\n")
+        else:
+            self.file.write(f"<url><loc>{escape(url)}</loc><lastmod>{lastmod}</lastmod></url>\n")
+            self.lastmod = max(self.lastmod or lastmod, lastmod)
+        self.count += 1
+        self.urls += 1
+
+    def close(self):
+        '''Finishes the last file and moves every changed file into place'''
+        if self.file is None and not self.parts:
+            self.open_part()
+        if self.file is not None:
+            self.close_part()
+        sitemap = os.path.join(self.dest_dir, SITEMAP_NAME)
+        changed = 0
+        if len(self.parts) == 1:
+            changed += commit_if_changed(f"{self.part_path(1)}.tmp", sitemap)
+            kept = 0
+        else:
+            for number in range(1, len(self.parts) + 1):
+                changed += commit_if_changed(f"{self.part_path(number)}.tmp", self.part_path(number))
+            with open(f"{sitemap}.tmp", 'w') as f:
+                f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n')
+                for number, lastmod in enumerate(self.parts, 1):
+                    url = absolute_url(self.site_url, f"{self.basepath}sitemap-{number}.xml")
+                    lastmod = f"<lastmod>{lastmod}</lastmod>" if lastmod is not None else ""
+                    f.write(f"<sitemap><loc>{escape(url)}</loc>{lastmod}</sitemap>\n")
+                f.write("</sitemapindex>\n")
+            changed += commit_if_changed(f"{sitemap}.tmp", sitemap)
+            kept = len(self.parts)
+        # Parts left over from a larger site
+        number = kept + 1
+        while os.path.exists(self.part_path(number)):
+            os.remove(self.part_path(number))
+            number += 1
+        logger.info(f"Sitemap: {self.urls} URLs in {max(1, len(self.parts))} file(s), {changed} rewritten...")
@@ -0,0 +1,149 @@
+import re
+
+from htmlnode import HTMLNode
+from serializer import HTML_SPACE, MINIFY_SAVINGS, UNQUOTED_VALUE, VOID_TAGS, escape_text, write_html
+
+# {{ Name }} with optional spaces inside the braces
+SLOT = re.compile(r"{{\s*(\w+)\s*}}")
+# {{> name }} includes partials/name.html, name may contain / for subdirectories
+PARTIAL = re.compile(r"{{>\s*([\w/-]+)\s*}}")
+ROOT_URL_ATTR = re.compile(r'\b(href|src)="/')
+
+# Comments, elements kept exactly as written, tags, and the text between them
+MARKUP_TOKEN = re.compile(r"<!--.*?-->|<(pre|textarea|script|style)\b.*?</\1\s*>|<[^>]*>", re.DOTALL | re.IGNORECASE)
+START_TAG = re.compile(r"<([A-Za-z][\w-]*)((?:\s+[^\s\"'=<>/]+(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'=<>`]+))?)*)\s*(/?)>")
+ATTRIBUTE = re.compile(r"\s+([^\s\"'=<>/]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`]+)))?")
+# End tags HTML always lets a page leave out at the end of a template
+OPTIONAL_END_TAGS = re.compile(r"</(?:html|head|body)\s*>", re.IGNORECASE)
+
+def minify_tag(tag: str) -> str:
+    match = START_TAG.fullmatch(tag)
+    if match is None:
+        return tag
+    name, attributes, self_closing = match.groups()
+    parts = [f"<{name}"]
+    for attribute in ATTRIBUTE.finditer(attributes):
+        key, double_quoted, single_quoted, unquoted = attribute.groups()
+        value = next((value for value in (double_quoted, single_quoted, unquoted) if value is not None), None)
+        if value is None:
+            parts.append(f" {key}")
+        elif UNQUOTED_VALUE.fullmatch(value):
+            parts.append(f" {key}={value}")
+        else:
+            parts.append(f' {key}="{value}"' if '"' not in value else f" {key}='{value}'")
+    if self_closing and name.lower() not in VOID_TAGS:
+        parts.append("/")
+    parts.append(">")
+    return "".join(parts)
+
+def minify_markup(source: str) -> str:
+    '''Minifies the literal HTML of a template, {{ slots }} pass through untouched
+
+    Comments go, whitespace between tags that spans lines goes, other whitespace runs
+    collapse to a space. Start tags lose unneeded quotes and the slash of void
+    elements, </html>, </head> and </body> are left out. pre, textarea, script and
+    style elements are kept as they are.
+    '''
+    parts = []
+    pos = 0
+    for match in MARKUP_TOKEN.finditer(source):
+        parts.append(minify_text(source[pos:match.start()]))
+        token = match.group(0)
+        if token.startswith("<!--"):
+            # Conditional comments are markup for old browsers, not notes
+            if token.startswith("<!--[if"):
+                parts.append(token)
+        elif match.group(1) is not None:
+            end = token.index(">") + 1
+            parts.append(minify_tag(token[:end]) + token[end:])
+        elif OPTIONAL_END_TAGS.fullmatch(token):
+            pass
+        elif token.startswith("</"):
+            parts.append(token)
+        else:
+            parts.append(minify_tag(token))
+        pos = match.end()
+    parts.append(minify_text(source[pos:]))
+    return "".join(parts).strip()
+
+def minify_text(text: str) -> str:
+    if not text.strip() and "\n" in text:
+        return ""
+    return HTML_SPACE.sub(" ", text)
+
+def expand_partials(source: str, load_partial, used: list, including: tuple=()) -> str:
+    '''Replaces every {{> name }} in source with load_partial(name), recursively
+
+    The names are appended to used in the order they are first included.
+    '''
+    def include(match):
+        name = match.group(1)
+        if name in including:
+            raise ValueError(f"partial {name} includes itself: {' -> '.join(including + (name,))}")
+        if name not in used:
+            used.append(name)
+        return expand_partials(load_partial(name), load_partial, used, including + (name,))
+    return PARTIAL.sub(include, source)
+
+class Template():
+    '''A page template parsed once into literal and {{ Name }} slot segments
+
+    Root-relative href and src attributes in the literal parts get the basepath
+    when the template is parsed, pages then only write the segments out. With
+    load_partial, {{> name }} is replaced by the source it returns for name before
+    parsing; the names included end up in partials. With minify the literal parts are
+    minified once here (see minify_markup) and HTMLNode values as they are written.
+    '''
+    def __init__(self, source: str, basepath: str="/", load_partial=None, minify: bool=False):
+        self.basepath = basepath
+        self.minify = minify
+        self.partials = []
+        if load_partial is not None:
+            source = expand_partials(source, load_partial, self.partials)
+        self.source = source
+        markup = self.rewrite_urls(source)
+        # Characters minifying takes off every page rendered with this template
+        self.saved = 0
+        if minify:
+            minified = minify_markup(markup)
+            self.saved = len(markup) - len(minified)
+            markup = minified
+        # (literal, slot name, placeholder) triples, the last one has no slot
+        self.segments = []
+        pos = 0
+        for match in SLOT.finditer(markup):
+            self.segments.append((markup[pos:match.start()], match.group(1), match.group(0)))
+            pos = match.end()
+        self.segments.append((markup[pos:], None, ""))
+
+    def rewrite_urls(self, literal: str) -> str:
+        if self.basepath == "/":
+            return literal
+        return ROOT_URL_ATTR.sub(lambda match: f'{match.group(1)}="{self.basepath}', literal)
+
+    @property
+    def slots(self) -> set[str]:
+        return {name for _, name, _ in self.segments if name is not None}
+
+    def render_to(self, sink, values: dict):
+        '''Writes the template to sink with every slot filled from values
+
+        HTMLNode values are streamed through the serializer with the basepath applied,
+        strings are escaped, callables are handed the sink. Slots without a value are
+        left as written in the template.
+        '''
+        MINIFY_SAVINGS.saved += self.saved
+        for literal, name, placeholder in self.segments:
+            sink.write(literal)
+            if name is None:
+                continue
+            if name not in values:
+                sink.write(placeholder)
+                continue
+            value = values[name]
+            if isinstance(value, HTMLNode):
+                write_html(value, sink, self.basepath, self.minify)
+            elif callable(value):
+                value(sink)
+            else:
+                sink.write(escape_text(str(value)))
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from assets import sync_dir_to_dest
+from manifest import BuildManifest
+
+class TestSyncDirToDest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        self.write("index.css", "body {}")
+        self.write("images/logo.png", "png bytes")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.static, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def sync(self, **kwargs):
+        return sync_dir_to_dest(self.static, self.public, self.manifest, **kwargs)
+
+    def test_second_sync_copies_nothing(self):
+        self.assertEqual(self.sync()["copy"], 2)
+        counts = self.sync()
+        self.assertEqual(counts["copy"], 0)
+        self.assertEqual(counts["unchanged"], 2)
+
+    def test_changed_file_is_copied(self):
+        self.sync()
+        self.write("index.css", "body { color: red; }")
+        self.assertEqual(self.sync()["copy"], 1)
+        with open(os.path.join(self.public, "index.css")) as f:
+            self.assertEqual(f.read(), "body { color: red; }")
+
+    def test_hash_skips_touched_file(self):
+        self.sync()
+        os.utime(os.path.join(self.static, "index.css"), ns=(1, 1))
+        self.assertEqual(self.sync(use_hash=True)["copy"], 0)
+        self.assertEqual(self.sync()["copy"], 0)
+
+    def test_stale_files_are_removed(self):
+        self.sync()
+        with open(os.path.join(self.public, "index.html"), 'w') as f:
+            f.write("generated page")
+        os.remove(os.path.join(self.static, "images", "logo.png"))
+        self.assertEqual(self.sync()["removed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "images")))
+        # Files the sync did not create are left alone
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def test_hardlink_shares_the_source_inode(self):
+        self.assertEqual(self.sync(link_mode="hardlink")["hardlink"], 2)
+        self.assertTrue(os.path.samefile(os.path.join(self.static, "index.css"), os.path.join(self.public, "index.css")))
+        self.assertEqual(self.sync(link_mode="hardlink")["unchanged"], 2)
+
+    def test_copy_over_hardlink_leaves_source_alone(self):
+        self.sync(link_mode="hardlink")
+        os.remove(os.path.join(self.static, "index.css"))
+        self.write("index.css", "new")
+        self.sync()
+        with open(os.path.join(self.public, "index.css")) as f:
+            self.assertEqual(f.read(), "new")
+
+    def test_reflink_falls_back_to_copy(self):
+        counts = self.sync(link_mode="reflink")
+        self.assertEqual(counts["copy"] + counts["reflink"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import gzip
+import tempfile
+import unittest
+
+from compress import prune_sidecars, write_sidecars
+
+PAGE = "<p>" + "The road goes ever on and on. " * 40 + "</p>"
+
+class TestSidecars(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write("index.html", PAGE)
+        self.write("blog/post.html", PAGE.upper())
+        self.write("index.css", "body {}")
+        self.write("images/map.png", PAGE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, rel_path):
+        return os.path.join(self.root, rel_path)
+
+    def write(self, rel_path, text):
+        os.makedirs(os.path.dirname(self.path(rel_path)), exist_ok=True)
+        with open(self.path(rel_path), 'w') as f:
+            f.write(text)
+
+    def sidecars(self):
+        return sorted(os.path.relpath(os.path.join(dirpath, name), self.root)
+                      for dirpath, _, names in os.walk(self.root) for name in names if name.endswith(".gz"))
+
+    def write_sidecars(self, jobs=1):
+        with self.assertLogs("compress", "INFO"):
+            return write_sidecars(self.root, ["gz"], jobs)
+
+    def test_text_output_gets_sidecars(self):
+        counts = self.write_sidecars(jobs=2)
+        self.assertEqual(counts["written"], 2)
+        # Too small and not text are left alone
+        self.assertEqual(self.sidecars(), [os.path.join("blog", "post.html.gz"), "index.html.gz"])
+        with gzip.open(self.path("index.html.gz"), 'rt') as f:
+            self.assertEqual(f.read(), PAGE)
+
+    def test_deterministic_and_skips_fresh(self):
+        self.write_sidecars()
+        with open(self.path("index.html.gz"), 'rb') as f:
+            first = f.read()
+        self.assertEqual(self.write_sidecars()["fresh"], 2)
+        os.remove(self.path("index.html.gz"))
+        self.write_sidecars()
+        with open(self.path("index.html.gz"), 'rb') as f:
+            self.assertEqual(f.read(), first)
+
+    def test_changed_and_removed_files(self):
+        self.write_sidecars()
+        self.write("index.html", PAGE * 2)
+        os.utime(self.path("index.html"), ns=(1, 1))
+        os.remove(self.path("blog/post.html"))
+        counts = self.write_sidecars()
+        self.assertEqual((counts["written"], counts["removed"]), (1, 1))
+        self.assertEqual(self.sidecars(), ["index.html.gz"])
+        with gzip.open(self.path("index.html.gz"), 'rt') as f:
+            self.assertEqual(f.read(), PAGE * 2)
+
+    def test_builds_without_precompress_prune_stale_sidecars(self):
+        self.write_sidecars()
+        self.write("index.html", PAGE * 2)
+        os.utime(self.path("index.html"), ns=(1, 1))
+        os.remove(self.path("blog/post.html"))
+        with self.assertLogs("compress", "INFO"):
+            self.assertEqual(prune_sidecars(self.root), 2)
+        # Neither the old page nor the deleted one can be served any more
+        self.assertEqual(self.sidecars(), [])
+        self.assertFalse(os.path.exists(self.path("blog")))
+        self.assertTrue(os.path.isfile(self.path("index.html")))
+
+    def test_compressed_assets_are_kept(self):
+        self.write("data/archive.tar.gz", "not a sidecar")
+        self.write("dump.zst", "not a sidecar either")
+        counts = self.write_sidecars()
+        self.assertEqual(counts["removed"], 0)
+        self.assertTrue(os.path.isfile(self.path("data/archive.tar.gz")))
+        self.assertTrue(os.path.isfile(self.path("dump.zst")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import io
+import os
+import json
+import tempfile
+import tracemalloc
+import unittest
+
+from manifest import BuildManifest
+from template import Template
+from utils import generate_page, render_file, write_large_page, write_page
+from tracing import BuildTrace
+
+TEMPLATE = "<title>{{ Title }}</title><main>{{ Content }}</main>"
+
+class TestGeneratePage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.write("template.html", TEMPLATE)
+        for i in range(12):
+            self.write(f"content/section{i % 3}/page{i}.md", f"# Page {i}\n\nSome **bold** text and a [link](/page{i + 1})")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read_tree(self, dir_path):
+        tree = {}
+        for dirpath, _, filenames in os.walk(dir_path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path) as f:
+                    tree[os.path.relpath(path, dir_path)] = f.read()
+        return tree
+
+    def test_render_file_matches_build(self):
+        self.write("layouts/section1.html", "<section>{{ Path }} {{ Content }}</section>")
+        dest = os.path.join(self.root, "out")
+        generate_page(self.content, self.root, dest, "/site/")
+        page = io.StringIO()
+        render_file(page, os.path.join(self.content, "section1", "page4.md"), self.root, "/site/", None, self.content)
+        with open(os.path.join(dest, "section1", "page4.html")) as f:
+            self.assertEqual(page.getvalue(), f.read())
+        # Outside the content tree a file gets the default layout
+        self.write("draft.md", "# Draft")
+        page = io.StringIO()
+        render_file(page, os.path.join(self.root, "draft.md"), self.root, "/", None, self.content)
+        self.assertEqual(page.getvalue(), "<title>Draft</title><main><div><h1>Draft</h1></div></main>")
+
+    def test_minified_build(self):
+        dest = os.path.join(self.root, "out")
+        manifest = BuildManifest(os.path.join(self.root, "manifest.json"))
+        generate_page(self.content, self.root, dest, "/", manifest)
+        plain = self.read_tree(dest)
+        with self.assertLogs("utils", "INFO") as logs:
+            written = generate_page(self.content, self.root, dest, "/", manifest, jobs=2, block_cache_size=8,
+                                    minify=True)
+        # Turning minify on is a change of inputs, every page is rendered again
+        self.assertEqual(len(written), 12)
+        minified = self.read_tree(dest)
+        self.assertEqual(minified["section0/page0.html"],
+                         "<title>Page 0</title><main><div><h1>Page 0</h1><p>Some <b>bold</b> text and a "
+                         "<a href=/page1>link</a></div></main>")
+        saved = sum(len(plain[path]) - len(minified[path]) for path in plain)
+        self.assertIn(f"Minify: {saved} bytes saved over 12 pages...", logs.output[-1])
+
+    def test_write_errors_in_worker_processes_are_reported(self):
+        dest = os.path.join(self.root, "public")
+        # Nothing can be moved over a directory, the page fails on a writer thread of a worker
+        os.makedirs(os.path.join(dest, "section0", "page0.html"))
+        with self.assertRaises(Exception) as ctx, self.assertLogs("utils", "ERROR") as logs:
+            generate_page(self.content, self.root, dest, "/", jobs=2, writer_threads=2)
+        self.assertIn("1 page(s) failed to generate: section0/page0.md", str(ctx.exception))
+        self.assertIn("Error generating section0/page0.md", logs.output[0])
+        self.assertTrue(os.path.isfile(os.path.join(dest, "section0", "page3.html")))
+
+    def test_parallel_output_matches_serial(self):
+        serial_dir = os.path.join(self.root, "serial")
+        parallel_dir = os.path.join(self.root, "parallel")
+        serial = generate_page(self.content, self.root, serial_dir, "/")
+        parallel = generate_page(self.content, self.root, parallel_dir, "/", jobs=4)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(parallel), 12)
+        self.assertEqual(self.read_tree(serial_dir), self.read_tree(parallel_dir))
+
+    def test_failed_pages_are_reported(self):
+        self.write("content/section1/broken.md", "no title here")
+        self.write("content/section2/unclosed.md", "# Title\n\nthis **never closes")
+        dest = os.path.join(self.root, "public")
+        with self.assertRaises(Exception) as ctx, self.assertLogs("utils", "ERROR") as logs:
+            generate_page(self.content, self.root, dest, "/", jobs=2)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("2 page(s) failed", str(ctx.exception))
+        self.assertIn("section1/broken.md", str(ctx.exception))
+        self.assertIn("section2/unclosed.md", str(ctx.exception))
+        # The healthy pages are still written
+        self.assertEqual(len(self.read_tree(dest)), 12)
+
+    def test_write_errors_are_reported(self):
+        dest = os.path.join(self.root, "public")
+        os.makedirs(dest)
+        # A file where section1/ should be makes every page in it fail to write
+        with open(os.path.join(dest, "section1"), 'w') as f:
+            f.write("in the way")
+        for writer_threads in (0, 2):
+            with self.assertRaises(Exception) as ctx, self.assertLogs("utils", "ERROR"):
+                generate_page(self.content, self.root, dest, "/", writer_threads=writer_threads)
+            self.assertIn("4 page(s) failed", str(ctx.exception))
+
+    def test_profiled_write_errors_leave_no_temporary_files(self):
+        dest = os.path.join(self.root, "public")
+        # A directory where page1.html should be makes the final rename fail
+        os.makedirs(os.path.join(dest, "section1", "page1.html"))
+        with self.assertRaises(Exception) as ctx, self.assertLogs("utils", "ERROR"):
+            generate_page(self.content, self.root, dest, "/", trace=BuildTrace())
+        self.assertIn("1 page(s) failed", str(ctx.exception))
+        self.assertFalse(os.path.exists(os.path.join(dest, "section1", "page1.html.tmp")))
+
+    def test_profiled_build(self):
+        trace = BuildTrace()
+        serial_dir = os.path.join(self.root, "serial")
+        profiled_dir = os.path.join(self.root, "profiled")
+        generate_page(self.content, self.root, serial_dir, "/")
+        generate_page(self.content, self.root, profiled_dir, "/", jobs=2, trace=trace)
+        self.assertEqual(self.read_tree(serial_dir), self.read_tree(profiled_dir))
+        self.assertEqual(len(trace.pages), 12)
+        for page in trace.pages:
+            self.assertEqual([stage for stage, _, _ in page.stages], ["read", "parse", "render", "write"])
+            self.assertGreater(page.nodes, 5)
+        trace_file = os.path.join(self.root, "trace.json")
+        trace.write(trace_file)
+        with open(trace_file) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(sum(1 for event in events if event.get("cat") == "page"), 12)
+        self.assertEqual(sum(1 for event in events if event.get("cat") == "stage"), 48)
+
+    def peak_memory_for_corpus(self, page_count):
+        content = os.path.join(self.root, f"corpus{page_count}")
+        paragraph = "A paragraph with **bold**, _italic_ and a [link](/somewhere) in it. " * 8
+        body = "\n\n".join([paragraph] * 10)
+        for i in range(page_count):
+            self.write(f"corpus{page_count}/dir{i % 10}/page{i}.md", f"# Page {i}\n\n{body}")
+        tracemalloc.start()
+        try:
+            generate_page(content, self.root, os.path.join(self.root, f"out{page_count}"), "/")
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory_is_flat_as_corpus_grows(self):
+        # Each page is ~6KB, loading the whole corpus up front would grow the peak by ~0.5MB
+        small = self.peak_memory_for_corpus(10)
+        large = self.peak_memory_for_corpus(100)
+        self.assertLess(large, small * 1.25)
+
+
+class TestLargePage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.template = Template(TEMPLATE, "/docs/")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_source(self, text):
+        path = os.path.join(self.root, "big.md")
+        with open(path, 'w', newline="") as f:
+            f.write(text)
+        return path
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_matches_regular_page(self):
+        text = ("Intro [home](/) with **bold**\r\n\r\n# The Title\n\n```\ncode\n\n  more\n```\n\n"
+                "- one\n- two\n\n> quoted\r> text\n\n1. first\n2. second\n")
+        source = self.write_source(text)
+        large = os.path.join(self.root, "large", "page.html")
+        regular = os.path.join(self.root, "regular", "page.html")
+        digest = write_large_page(large, source, self.template, {"Path": "/docs/big"})
+        with open(source, 'rb') as f:
+            md_text = f.read().decode().replace("\r\n", "\n").replace("\r", "\n")
+        write_page(regular, md_text, self.template, {"Path": "/docs/big"})
+        self.assertEqual(self.read(large), self.read(regular))
+        self.assertIn("<title>The Title</title>", self.read(large))
+        self.assertEqual(len(digest), 64)
+
+    def test_indexes_are_built_while_streaming(self):
+        import utils
+        from layouts import Layouts
+        from links import page_links
+        from search import page_doc
+        text = "# Big\n\nSee [home](/) and ![map](/images/map.png)\n\n```\n[not](/a-link)\n```\n\n[home](/) [about](about)\n"
+        source = self.write_source(text)
+        with open(os.path.join(self.root, "template.html"), 'w') as f:
+            f.write(TEMPLATE)
+        settings = utils.PageSettings(Layouts(self.root, "/docs/"), search=True, links=True)
+        large_page_bytes = utils.LARGE_PAGE_BYTES
+        utils.LARGE_PAGE_BYTES = 0
+        try:
+            _, _, extracted = utils.build_page("big.md", source, os.path.join(self.root, "big.html"), settings)
+        finally:
+            utils.LARGE_PAGE_BYTES = large_page_bytes
+        self.assertEqual(extracted["links"], ["/", "/images/map.png", "about"])
+        self.assertEqual(extracted["links"], page_links(text))
+        self.assertEqual(extracted["search"]["title"], "Big")
+        self.assertIn("home", extracted["search"]["terms"])
+        self.assertNotIn("not", extracted["search"]["terms"])
+        self.assertEqual(extracted["search"], page_doc(text))
+
+    def test_peak_memory_is_a_fraction_of_the_file(self):
+        paragraph = "A paragraph with **bold**, _italic_ and a [link](/somewhere) in it. " * 8
+        source = self.write_source("# Big\n\n" + "\n\n".join([paragraph] * 2000))
+        tracemalloc.start()
+        try:
+            write_large_page(os.path.join(self.root, "big.html"), source, self.template)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, os.path.getsize(source) / 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+import highlight
+
+from highlight import code_language, highlight_cache, lexer_for, tokenize
+from utils import convert_code_block_to_html
+
+class TestHighlight(unittest.TestCase):
+    def test_info_string(self):
+        self.assertEqual(code_language(" python  title=x"), "python")
+        self.assertIsNone(code_language("   "))
+        # The info string is not part of the code, the one line form keeps every character
+        self.assertEqual(convert_code_block_to_html("```\nx = 1\n```").to_html(), "<pre><code>x = 1\n</code></pre>")
+        self.assertEqual(convert_code_block_to_html("```x = 1```").to_html(), "<pre><code>x = 1</code></pre>")
+        self.assertEqual(convert_code_block_to_html("```lolcode\nHAI <3\n```").to_html(),
+                         '<pre><code class="language-lolcode">HAI &lt;3\n</code></pre>')
+
+    def test_tokens(self):
+        code = 'def f(x):  # note\n    return "a<b" if x is None else 0x1F\n'
+        tokens = [(kind, text) for kind, text in tokenize(code, lexer_for("Python")) if kind is not None]
+        self.assertEqual(tokens, [("keyword", "def"), ("comment", "# note"), ("keyword", "return"),
+                                  ("string", '"a<b"'), ("keyword", "if"), ("keyword", "is"),
+                                  ("constant", "None"), ("keyword", "else"), ("number", "0x1F")])
+        # Every character is kept, in order
+        self.assertEqual("".join(text for _, text in tokenize(code, lexer_for("py"))), code)
+        self.assertEqual(convert_code_block_to_html(f"```py\n{code}```").to_html(),
+                         '<pre><code class="language-py"><span class="hl-keyword">def</span> f(x):  '
+                         '<span class="hl-comment"># note</span>\n    <span class="hl-keyword">return</span> '
+                         '<span class="hl-string">"a&lt;b"</span> <span class="hl-keyword">if</span> x '
+                         '<span class="hl-keyword">is</span> <span class="hl-constant">None</span> '
+                         '<span class="hl-keyword">else</span> <span class="hl-number">0x1F</span>\n</code></pre>')
+
+    def test_lexers_load_lazily_and_snippets_are_cached(self):
+        highlight._lexers.clear()
+        cache = highlight_cache()
+        snippet = "```go\nfunc main() { fmt.Println(`hi`) }\n```"
+        hits, misses = cache.hits, cache.misses
+        first = convert_code_block_to_html(snippet).to_html()
+        self.assertEqual(list(highlight._lexers), [highlight.go_rules])
+        self.assertEqual(convert_code_block_to_html(snippet).to_html(), first)
+        self.assertEqual((cache.hits - hits, cache.misses - misses), (1, 1))
+        self.assertIn('<span class="hl-string">`hi`</span>', first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,12 @@
+import io
+import sys
 import unittest
 
-from blocktypes import BlockType, block_to_block_type
+from blocktypes import BlockType, block_to_block_type, scan_blocks
 from utils import markdown_to_blocks, markdown_to_html_node, extract_title
 from textnode import TextNode, TextType, text_node_to_html_node
 from htmlnode import HTMLNode, LeafNode, ParentNode
+from serializer import MINIFY_SAVINGS, iter_html, render_html, write_html
 
 class TestHTMLNode(unittest.TestCase):
     ''' HTMLNode'''
@@ -113,6 +116,68 @@ class TestHTMLNode(unittest.TestCase):
         )
         self.assertEqual(node.to_html(), '<p><b>Bold text</b>Normal text<i>italic text</i>Normal text</p>')
 
+    def test_to_html_with_props_on_parent(self):
+        node = ParentNode("a", [LeafNode("b", "bold")], {"href": "/blog"})
+        self.assertEqual(node.to_html(), '<a href="/blog"><b>bold</b></a>')
+
+    def test_to_html_escapes_text_and_attributes(self):
+        node = ParentNode("p", [
+            LeafNode(None, "1 < 2 & 3 > 2"),
+            LeafNode("a", "<back>", {"href": '/search?q="x"&page=2'}),
+        ])
+        self.assertEqual(
+            node.to_html(),
+            '<p>1 &lt; 2 &amp; 3 &gt; 2<a href="/search?q=&quot;x&quot;&amp;page=2">&lt;back&gt;</a></p>',
+        )
+
+    def test_to_html_deep_tree(self):
+        node = LeafNode(None, "deep")
+        for _ in range(sys.getrecursionlimit() * 2):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span><span>"))
+        self.assertIn("deep", html)
+
+    def test_write_html_streams_to_sink(self):
+        node = ParentNode("ul", [ParentNode("li", [LeafNode(None, f"item {i}")]) for i in range(20000)])
+        sink = io.StringIO()
+        written = write_html(node, sink)
+        self.assertEqual(sink.getvalue(), node.to_html())
+        self.assertEqual(written, len(sink.getvalue()))
+
+    def test_iter_html_rewrites_basepath(self):
+        node = ParentNode("p", [
+            LeafNode("a", "home", {"href": "/"}),
+            LeafNode("img", "", {"src": "/images/tom.png", "alt": "/not-a-url"}),
+            LeafNode("a", "boot.dev", {"href": "https://www.boot.dev"}),
+        ])
+        self.assertEqual(
+            "".join(iter_html(node, "/site-generator/")),
+            '<p><a href="/site-generator/">home</a><img src="/site-generator/images/tom.png" alt="/not-a-url"></img><a href="https://www.boot.dev">boot.dev</a></p>',
+        )
+
+    def test_minified_html(self):
+        md = "# Title\n\nSome   text\nwrapped [here](/about)\n\n```\nkeep   this\n  indented\n```\n\n- one\n- two\n\nlast"
+        node = markdown_to_html_node(md)
+        saved = MINIFY_SAVINGS.saved
+        html = render_html(node, "/site/", minify=True)
+        self.assertEqual(
+            html,
+            "<div><h1>Title</h1><p>Some text wrapped <a href=/site/about>here</a>"
+            "<pre><code>keep   this\n  indented\n</code></pre><ul><li>one<li>two</ul><p>last</div>",
+        )
+        self.assertEqual(MINIFY_SAVINGS.saved - saved, len(render_html(node, "/site/")) - len(html))
+        # </p> stays where the parent could not tell it apart from its own content
+        node = ParentNode("a", [LeafNode("p", "x")], {"href": "/a b"})
+        self.assertEqual(render_html(node, minify=True), '<a href="/a b"><p>x</p></a>')
+
+    def test_nodes_are_slotted(self):
+        for node in (HTMLNode(), LeafNode("p", "text"), ParentNode("p", []), TextNode("text", TextType.TEXT)):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_heading_level_ignores_inner_hashes(self):
+        self.assertEqual(markdown_to_html_node("## C# tips").to_html(), "<div><h2>C# tips</h2></div>")
+
     def test_markdown_to_blocks(self):
         md = """
 This is **bolded** paragraph
@@ -331,6 +396,39 @@ the **same** even with inline stuff
             "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>",
         )
 
+    def test_codeblock_with_empty_lines(self):
+        md = """
+```
+first = 1
+
+second = 2
+```
+
+After the code
+"""
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>first = 1\n\nsecond = 2\n</code></pre><p>After the code</p></div>",
+        )
+
+    def test_unclosed_fence_splits_on_empty_lines(self):
+        md = "```\nnot code\n\n# Heading"
+        self.assertEqual(
+            [(block, block_type) for block, block_type in scan_blocks(md)],
+            [("```\nnot code", BlockType.PARAGRAPH), ("# Heading", BlockType.HEADING)],
+        )
+
+    def test_scan_blocks_matches_block_types(self):
+        md = "# Title\n\n- a\n- b\n\n1. one\n2. two\n\n> quote\n\n   text  \n  \n\n\n```x```"
+        self.assertEqual(
+            list(scan_blocks(md)),
+            [(block, block_to_block_type(block)) for block in markdown_to_blocks(md)],
+        )
+        self.assertEqual(
+            [block_type for _, block_type in scan_blocks(md)],
+            [BlockType.HEADING, BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST, BlockType.QUOTE, BlockType.PARAGRAPH, BlockType.CODE],
+        )
+
     def test_extract_title(self):
         md = """
 # Title Header is Valid!
@@ -0,0 +1,104 @@
+import os
+import zlib
+import struct
+import tempfile
+import unittest
+
+from images import PNGImage, optimize_images, png_chunk, recompress_png, resize_png, variant_path, PNG_SIGNATURE
+from manifest import BuildManifest
+
+def make_png(width, height, pixel, color_type=2, level=1):
+    '''An unfiltered 8 bit PNG, pixel(x, y) returns the channel values'''
+    rows = []
+    for y in range(height):
+        rows.append(b"\x00" + bytes(value for x in range(width) for value in pixel(x, y)))
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    data = zlib.compress(b"".join(rows), level)
+    # Split the image data over two chunks like many encoders do
+    return (PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"tEXt", b"Comment\x00test")
+            + png_chunk(b"IDAT", data[:10]) + png_chunk(b"IDAT", data[10:]) + png_chunk(b"IEND", b""))
+
+def gradient(x, y):
+    return (x * 8 % 256, y * 8 % 256, 128)
+
+class TestPNG(unittest.TestCase):
+    def test_recompress_is_lossless(self):
+        data = make_png(64, 32, gradient)
+        optimized = recompress_png(data)
+        self.assertLess(len(optimized), len(data))
+        before, after = PNGImage(data), PNGImage(optimized)
+        self.assertEqual(before.raw, after.raw)
+        self.assertEqual([chunk for chunk, _ in after.chunks], [b"IHDR", b"tEXt", b"IDAT", b"IEND"])
+
+    def test_unfilter(self):
+        rows = [b"\x01\x01\x02\x03\x01\x01\x01", b"\x02\x01\x01\x01\x01\x01\x01",
+                b"\x03\x00\x00\x00\x02\x02\x02", b"\x04\x00\x00\x00\x00\x00\x00"]
+        header = struct.pack(">IIBBBBB", 2, 4, 8, 2, 0, 0, 0)
+        data = PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", zlib.compress(b"".join(rows))) + png_chunk(b"IEND", b"")
+        self.assertEqual(PNGImage(data).pixels(), [
+            bytearray(b"\x01\x02\x03\x02\x03\x04"),
+            bytearray(b"\x02\x03\x04\x03\x04\x05"),
+            bytearray(b"\x01\x01\x02\x04\x04\x05"),
+            bytearray(b"\x01\x01\x02\x04\x04\x05"),
+        ])
+
+    def test_resize_averages(self):
+        data = make_png(4, 2, lambda x, y: (0, 0, 0) if x % 2 else (200, 100, 50))
+        image = PNGImage(resize_png(data, 2))
+        self.assertEqual((image.width, image.height), (2, 1))
+        self.assertEqual(image.pixels(), [bytearray([100, 50, 25, 100, 50, 25])])
+        self.assertIsNone(resize_png(data, 4))
+
+    def test_resize_palette_samples(self):
+        data = make_png(4, 4, lambda x, y: (x,), color_type=3)
+        data = data.replace(png_chunk(b"tEXt", b"Comment\x00test"), png_chunk(b"PLTE", bytes(range(12))))
+        image = PNGImage(resize_png(data, 2))
+        self.assertEqual(image.pixels(), [bytearray([0, 2]), bytearray([0, 2])])
+        self.assertEqual([chunk for chunk, _ in image.chunks], [b"IHDR", b"PLTE", b"IDAT", b"IEND"])
+
+
+class TestOptimizeImages(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.cache = os.path.join(self.tmp.name, "cache")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write("images/map.png", make_png(40, 20, gradient))
+        self.write("images/broken.png", b"not a png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, data):
+        with open(os.path.join(self.static, rel_path), 'wb') as f:
+            f.write(data)
+
+    def optimize(self, manifest=None, jobs=1):
+        with self.assertLogs("images", "INFO"):
+            return optimize_images(self.static, self.public, self.cache, [10, 80], jobs, manifest)
+
+    def test_outputs_and_cache(self):
+        counts = self.optimize(jobs=2)
+        self.assertEqual(counts["processed"], 3)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.public, "images"))),
+                         ["broken.png", "map-10w.png", "map.png"])
+        with open(os.path.join(self.public, "images", "map-10w.png"), 'rb') as f:
+            self.assertEqual(PNGImage(f.read()).width, 10)
+        self.assertEqual(self.optimize()["unchanged"], 3)
+        # A new output directory is filled from the cache without processing anything
+        self.public = os.path.join(self.tmp.name, "public2")
+        counts = self.optimize()
+        self.assertEqual((counts["processed"], counts["cached"]), (0, 3))
+
+    def test_deleted_image_outputs_are_removed(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        self.optimize(manifest)
+        os.remove(os.path.join(self.static, "images", "map.png"))
+        self.assertEqual(self.optimize(manifest)["removed"], 2)
+        self.assertEqual(os.listdir(os.path.join(self.public, "images")), ["broken.png"])
+        self.assertEqual(variant_path("images/map.png", 480), "images/map-480w.png")
+
+
+if __name__ == "__main__":
+    unittest.main()
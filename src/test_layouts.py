@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from layouts import Layouts, parse_front_matter, read_front_matter
+
+class TestFrontMatter(unittest.TestCase):
+    def test_front_matter(self):
+        metadata, body = parse_front_matter("---\nlayout: post\ntitle: A: B\n---\n# Post\n\nText")
+        self.assertEqual(metadata, {"layout": "post", "title": "A: B"})
+        self.assertEqual(body, "# Post\n\nText")
+
+    def test_no_front_matter(self):
+        for md in ("# Post\n\n---\nlayout: post\n---", "---\nnot front matter\n---\n# Post", ""):
+            self.assertEqual(parse_front_matter(md), ({}, md))
+
+    def test_read_front_matter_from_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "page.md")
+            with open(path, 'w', newline="") as f:
+                f.write("---\r\nlayout: wide\r\n---\r\n# Page")
+            self.assertEqual(read_front_matter(path), {"layout": "wide"})
+
+
+class TestLayouts(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write("template.html", "{{> header }}<main>{{ Content }}</main>")
+        self.write("layouts/blog.html", "{{> header }}<article>{{ Content }}</article>{{> footer }}")
+        self.write("layouts/wide.html", "<div>{{ Content }}</div>")
+        self.write("partials/header.html", '<a href="/">{{ Title }}</a>')
+        self.write("partials/footer.html", "<footer>{{> nav/links }}</footer>")
+        self.write("partials/nav/links.html", "links")
+        self.layouts = Layouts(self.root, "/site/")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_default_layout(self):
+        template, deps = self.layouts.select("index.md")
+        self.assertEqual(template.source, '<a href="/">{{ Title }}</a><main>{{ Content }}</main>')
+        self.assertEqual(template.segments[0][0], '<a href="/site/">')
+        self.assertEqual(list(deps), ["template.html", "partials/header.html"])
+
+    def test_directory_layout(self):
+        template, deps = self.layouts.select(os.path.join("blog", "tom", "index.md"))
+        self.assertIn("<footer>links</footer>", template.source)
+        self.assertEqual(deps["layouts/blog/tom.html"], None)
+        self.assertIsNotNone(deps["layouts/blog.html"])
+        self.assertNotIn("template.html", deps)
+        self.assertEqual(set(deps), {"layouts/blog/tom.html", "layouts/blog.html", "partials/header.html",
+                                     "partials/footer.html", "partials/nav/links.html"})
+
+    def test_front_matter_layout(self):
+        template, deps = self.layouts.select(os.path.join("blog", "tom.md"), {"layout": "wide"})
+        self.assertEqual(template.source, "<div>{{ Content }}</div>")
+        self.assertEqual(list(deps), ["layouts/wide.html"])
+        with self.assertRaises(ValueError):
+            self.layouts.select("index.md", {"layout": "missing"})
+        with self.assertRaises(ValueError):
+            self.layouts.select("index.md", {"layout": "../template"})
+
+    def test_templates_are_parsed_once(self):
+        first, _ = self.layouts.select(os.path.join("blog", "a.md"))
+        second, _ = self.layouts.select(os.path.join("blog", "b.md"))
+        self.assertIs(first, second)
+
+    def test_partial_errors(self):
+        self.write("layouts/broken.html", "{{> nothing }}")
+        self.write("layouts/loop.html", "{{> loop }}")
+        self.write("partials/loop.html", "again {{> loop }}")
+        with self.assertRaises(ValueError):
+            self.layouts.select("index.md", {"layout": "broken"})
+        with self.assertRaises(ValueError):
+            self.layouts.select("index.md", {"layout": "loop"})
+
+
+if __name__ == "__main__":
+    unittest.main()
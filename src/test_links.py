@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from links import LinkGraph, page_links, resolve_link
+from manifest import BuildManifest
+from utils import generate_page
+
+class TestLinks(unittest.TestCase):
+    def test_page_links(self):
+        md = "# Home\n\n[a](/blog/tom) and ![b](/images/tom.png) [a](/blog/tom)\n\n```\n[code](/not-a-link)\n```"
+        self.assertEqual(page_links(md), ["/blog/tom", "/images/tom.png"])
+
+    def test_resolve_link(self):
+        self.assertEqual(resolve_link("blog/tom/index.md", "/"), "")
+        self.assertEqual(resolve_link("blog/tom/index.md", "../majesty#top"), "blog/majesty")
+        self.assertEqual(resolve_link("blog/tom/index.md", "cover.png"), "blog/tom/cover.png")
+        self.assertEqual(resolve_link("blog/post.md", "other/"), "blog/other/")
+        self.assertEqual(resolve_link("index.md", "/a%20b.html?x=1"), "a b.html")
+        for target in ("https://example.com/", "//cdn.example.com/x.js", "mailto:tom@example.com", "#intro"):
+            self.assertIsNone(resolve_link("index.md", target))
+
+class TestLinkGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.public = os.path.join(root, "public")
+        self.write("template.html", "{{ Content }}")
+        self.write("content/index.md", "# Home\n\n[Tom](/blog/tom) [About](/about) ![logo](/logo.png)")
+        self.write("content/blog/tom/index.md", "# Tom\n\n[Home](/) [Majesty](../majesty/)")
+        self.write("public/logo.png", "")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.tmp.name, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def build(self):
+        links = LinkGraph()
+        manifest = BuildManifest.load(os.path.join(self.tmp.name, "manifest.json"))
+        written = generate_page(self.content, self.tmp.name, self.public, "/site/", manifest, jobs=2, links=links)
+        with self.assertLogs("links") as logs:
+            broken = links.check(self.public)
+        return links, broken, written, logs.output
+
+    def test_broken_links(self):
+        links, broken, _, logs = self.build()
+        self.assertEqual(broken, {"blog/tom/index.md": ["../majesty/"], "index.md": ["/about"]})
+        self.assertIn("WARNING:links:Broken link in index.md: /about", logs)
+        self.assertEqual(links.incoming("/blog/tom/"), ["index.md"])
+        self.assertEqual(links.incoming("/"), ["blog/tom/index.md"])
+
+    def test_fresh_pages_keep_their_links(self):
+        self.build()
+        self.write("content/about.md", "# About")
+        links, broken, written, _ = self.build()
+        self.assertEqual(written, ["about.md"])
+        self.assertEqual(broken, {"blog/tom/index.md": ["../majesty/"]})
+        self.assertEqual(links.incoming("/about.html"), ["index.md"])
+
+if __name__ == "__main__":
+    unittest.main()
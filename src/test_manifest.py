@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from manifest import BuildManifest
+from utils import generate_page
+
+TEMPLATE = "<title>{{ Title }}</title><main>{{ Content }}</main>"
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.public = os.path.join(root, "public")
+        self.manifest_path = os.path.join(root, "cache", "manifest.json")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(os.path.join(root, "template.html"), TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n[post](/blog/post)")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nFirst draft")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def build(self, basepath="/"):
+        manifest = BuildManifest.load(self.manifest_path)
+        return generate_page(self.content, self.tmp.name, self.public, basepath, manifest)
+
+    def test_second_build_renders_nothing(self):
+        self.assertEqual(self.build(), ["blog/post.md", "index.md"])
+        self.assertEqual(self.build(), [])
+
+    def test_only_changed_page_is_rendered(self):
+        self.build()
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nFixed the typo")
+        self.assertEqual(self.build(), ["blog/post.md"])
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertIn("Fixed the typo", f.read())
+
+    def test_touched_but_unchanged_page_is_skipped(self):
+        self.build()
+        os.utime(os.path.join(self.content, "index.md"), ns=(1, 1))
+        self.assertEqual(self.build(), [])
+
+    def test_basepath_change_rebuilds_everything(self):
+        self.build()
+        self.assertEqual(len(self.build("/site/")), 2)
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertIn('href="/site/blog/post"', f.read())
+
+    def test_partial_edit_rebuilds_only_its_pages(self):
+        root = self.tmp.name
+        os.makedirs(os.path.join(root, "layouts"))
+        os.makedirs(os.path.join(root, "partials"))
+        self.write(os.path.join(root, "layouts", "blog.html"), "{{> byline }}{{ Content }}")
+        self.write(os.path.join(root, "partials", "byline.html"), "<p>by Tolkien</p>")
+        self.assertEqual(self.build(), ["blog/post.md", "index.md"])
+        self.write(os.path.join(root, "partials", "byline.html"), "<p>by J. R. R. Tolkien</p>")
+        self.assertEqual(self.build(), ["blog/post.md"])
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertIn("J. R. R.", f.read())
+        self.write(os.path.join(root, "template.html"), "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(self.build(), ["index.md"])
+
+    def test_new_layout_rebuilds_its_section(self):
+        self.build()
+        os.makedirs(os.path.join(self.tmp.name, "layouts"))
+        self.write(os.path.join(self.tmp.name, "layouts", "blog.html"), "<article>{{ Content }}</article>")
+        self.assertEqual(self.build(), ["blog/post.md"])
+        self.write(os.path.join(self.content, "index.md"), "---\nlayout: blog\n---\n# Home")
+        self.assertEqual(self.build(), ["index.md"])
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertEqual(f.read(), "<article><div><h1>Home</h1></div></article>")
+
+    def test_deleted_output_is_regenerated(self):
+        self.build()
+        os.remove(os.path.join(self.public, "index.html"))
+        self.assertEqual(self.build(), ["index.md"])
+
+    def test_deleted_source_is_pruned(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        self.assertEqual(self.build(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
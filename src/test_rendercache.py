@@ -0,0 +1,55 @@
+import unittest
+
+from blocktypes import BlockType
+from rendercache import BlockCache
+from serializer import MINIFY_SAVINGS, render_html
+from utils import markdown_to_html_node
+
+class TestBlockCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = BlockCache(16)
+        md = "# Title\n\nA [shared](/disclaimer) disclaimer\n\nA [shared](/disclaimer) disclaimer"
+        html = markdown_to_html_node(md, cache).to_html()
+        self.assertEqual(html, markdown_to_html_node(md).to_html())
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        markdown_to_html_node(md, cache)
+        self.assertEqual((cache.hits, cache.misses), (4, 2))
+        self.assertEqual(cache.stats()["hit_rate"], 4 / 6)
+
+    def test_same_text_different_type(self):
+        cache = BlockCache(16)
+        self.assertNotEqual(cache.key("- item", BlockType.UNORDERED_LIST), cache.key("- item", BlockType.PARAGRAPH))
+
+    def test_lru_eviction(self):
+        cache = BlockCache(2)
+        cache.put("a", "<p>a</p>")
+        cache.put("b", "<p>b</p>")
+        cache.get("a")
+        cache.put("c", "<p>c</p>")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "<p>a</p>")
+
+    def test_fragments_use_basepath(self):
+        cache = BlockCache(4, "/site/")
+        html = markdown_to_html_node("[home](/)", cache).to_html()
+        self.assertEqual(html, '<div><p><a href="/site/">home</a></p></div>')
+
+    def test_minified_fragments(self):
+        cache = BlockCache(4, "/site/", minify=True)
+        md = "Some   [text](/)\n\nSome   [text](/)\n\n- a\n- b"
+        expected = render_html(markdown_to_html_node(md), "/site/", True)
+        saved = MINIFY_SAVINGS.saved
+        self.assertEqual(render_html(markdown_to_html_node(md, cache), "/site/", True), expected)
+        self.assertEqual(render_html(markdown_to_html_node(md, cache), "/site/", True), expected)
+        # Hits count what their block saved when it was rendered
+        self.assertEqual(MINIFY_SAVINGS.saved - saved, 2 * (len(render_html(markdown_to_html_node(md), "/site/"))
+                                                            - len(expected)))
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            BlockCache(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import gzip
+import json
+import tempfile
+import unittest
+
+from manifest import BuildManifest
+from search import SearchIndex, fnv1a, page_doc, shard_of
+from utils import generate_page
+
+# Enough terms to fill every shard past the size worth compressing
+FIELDS = " ".join(f"field{i}" for i in range(200))
+
+class TestPageDoc(unittest.TestCase):
+    def test_terms_weights_and_positions(self):
+        doc = page_doc("# Hobbit Holes\n\nA **hobbit** hole means [comfort](/comfort).\n\n## Holes\n\n- dry\n- sandy")
+        self.assertEqual(doc["title"], "Hobbit Holes")
+        terms = doc["terms"]
+        self.assertEqual(terms["hobbit"], [11, [1, 4]])
+        self.assertEqual(terms["holes"], [15, [2, 8]])
+        self.assertEqual(terms["comfort"], [1, [7]])
+        self.assertEqual(terms["sandy"], [1, [10]])
+        # Link targets, markup and one letter words are not terms
+        self.assertNotIn("a", terms)
+        self.assertNotIn("/comfort", terms)
+
+    def test_code_blocks_are_skipped(self):
+        doc = page_doc("# Code\n\n```\nimport ring\n```\n\nPrecious", title="Set in front matter")
+        self.assertEqual(doc["title"], "Set in front matter")
+        self.assertEqual(sorted(doc["terms"]), ["code", "precious"])
+
+    def test_fnv1a(self):
+        # Reference values of 32 bit FNV-1a, the browser must find the same shard
+        self.assertEqual(fnv1a(""), 0x811c9dc5)
+        self.assertEqual(fnv1a("a"), 0xe40c292c)
+        self.assertEqual(fnv1a("foobar"), 0xbf9cf968)
+        self.assertEqual(shard_of("foobar", 16), 0xbf9cf968 % 16)
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.public = os.path.join(root, "public")
+        self.state_path = os.path.join(root, "cache", "search.json")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(os.path.join(root, "template.html"), "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the Shire\n\n" + FIELDS)
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Mordor\n\nOne does not simply walk")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def build(self):
+        manifest = BuildManifest.load(os.path.join(self.tmp.name, "cache", "manifest.json"))
+        search = SearchIndex.load(self.state_path, shards=4)
+        with self.assertLogs("search", "INFO") as logs:
+            written = generate_page(self.content, self.tmp.name, self.public, "/site/", manifest, search=search)
+            search.write(self.public, "/site/")
+        return written, logs.output[-1]
+
+    def lookup(self, term):
+        with open(os.path.join(self.public, "search", "index.json")) as f:
+            index = json.load(f)
+        shard = os.path.join(self.public, "search", index["shard_path"].format(shard=shard_of(term, index["shards"])))
+        with open(shard) as f:
+            postings = json.load(f).get(term, [])
+        return [index["pages"][page_id] for page_id, _, _ in postings]
+
+    def shard_mtimes(self):
+        search_dir = os.path.join(self.public, "search")
+        return {name: os.stat(os.path.join(search_dir, name)).st_mtime_ns for name in os.listdir(search_dir)}
+
+    def test_index_is_written(self):
+        self.build()
+        self.assertEqual(self.lookup("shire"), [["/site/", "Home"]])
+        self.assertEqual(self.lookup("mordor"), [["/site/blog/post.html", "Mordor"]])
+        self.assertEqual(self.lookup("ring"), [])
+        self.assertEqual(len([name for name in os.listdir(os.path.join(self.public, "search"))
+                              if name.endswith(".json")]), 5)
+        shard_file = os.path.join(self.public, "search", "shard-00.json")
+        with open(shard_file, 'rb') as f, gzip.open(f"{shard_file}.gz") as compressed:
+            self.assertEqual(compressed.read(), f.read())
+        # Too small to be worth compressing
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search", "index.json.gz")))
+
+    def test_incremental_build_reindexes_changed_pages(self):
+        self.build()
+        mtimes = self.shard_mtimes()
+        written, log = self.build()
+        self.assertEqual(written, [])
+        self.assertIn("0 files written", log)
+        self.assertEqual(self.shard_mtimes(), mtimes)
+
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Mordor\n\nOne ring to rule them all")
+        self.assertEqual(self.build()[0], ["blog/post.md"])
+        self.assertEqual(self.lookup("ring"), [["/site/blog/post.html", "Mordor"]])
+        self.assertEqual(self.lookup("walk"), [])
+        self.assertEqual(self.lookup("shire"), [["/site/", "Home"]])
+
+    def test_removed_page_keeps_other_ids(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        self.write(os.path.join(self.content, "about.md"), "# About\n\nThe Shire again")
+        self.build()
+        self.assertEqual(self.lookup("mordor"), [])
+        self.assertEqual(self.lookup("shire"), [["/site/", "Home"], ["/site/about.html", "About"]])
+        with open(os.path.join(self.public, "search", "index.json")) as f:
+            pages = json.load(f)["pages"]
+        # Ids are never reused, the removed page leaves a hole
+        self.assertEqual(pages[0], None)
+
+    def test_missing_state_reindexes_fresh_pages(self):
+        self.build()
+        os.remove(self.state_path)
+        self.assertEqual(self.build()[0], ["blog/post.md", "index.md"])
+        self.assertEqual(self.lookup("shire"), [["/site/", "Home"]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import unittest
+
+from manifest import BuildManifest
+from shards import in_shard, load_shard_manifests, merge_manifests, parse_shard, shard_of
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+class TestShardAssignment(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for text in ("0/4", "5/4", "2", "a/b", "1/0"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+    def test_every_page_in_exactly_one_shard(self):
+        paths = [f"section{i % 7}/page{i}.md" for i in range(200)]
+        for count in (1, 3, 8):
+            owners = [[index for index in range(1, count + 1) if in_shard(path, (index, count))] for path in paths]
+            self.assertTrue(all(len(owner) == 1 for owner in owners))
+        # Stable across runs and machines, unlike hash()
+        self.assertEqual(shard_of(os.path.join("blog", "tom", "index.md"), 4), 2)
+        self.assertEqual(shard_of("index.md", 4), 4)
+
+class TestShardedBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write("static/index.css", "body {}")
+        for i in range(24):
+            self.write(f"content/section{i % 4}/page{i}.md", f"# Page {i}\n\n[next](/section{(i + 1) % 4}/page{i + 1})")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def run_main(self, *args):
+        return subprocess.Popen([sys.executable, MAIN, *args, "-q"], cwd=self.root,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def read_tree(self, dir_path):
+        tree = {}
+        for dirpath, _, filenames in os.walk(dir_path):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename)) as f:
+                    tree[os.path.relpath(os.path.join(dirpath, filename), dir_path)] = f.read()
+        return tree
+
+    def test_parallel_shards_match_full_build(self):
+        self.assertEqual(self.run_main("build", "/site/").wait(), 0)
+        full = self.read_tree(os.path.join(self.root, "docs"))
+        self.assertEqual(self.run_main("clean", "--cache").wait(), 0)
+
+        workers = [self.run_main("build", "--shard", f"{index}/3", "/site/", "--check-links") for index in (1, 2, 3)]
+        self.assertEqual([worker.wait() for worker in workers], [0, 0, 0])
+        self.assertEqual(self.run_main("merge", "3", "/site/", "--fail-on-broken-links").wait(), 1)
+        self.write("content/section0/page24.md", "# Page 24")
+        workers = [self.run_main("build", "--shard", f"{index}/3", "/site/", "--incremental", "--check-links")
+                   for index in (1, 2, 3)]
+        self.assertEqual([worker.wait() for worker in workers], [0, 0, 0])
+        self.assertEqual(self.run_main("merge", "3", "/site/", "--fail-on-broken-links").wait(), 0)
+
+        sharded = self.read_tree(os.path.join(self.root, "docs"))
+        self.assertEqual(sharded.pop(os.path.join("section0", "page24.html")), "<title>Page 24</title><div><h1>Page 24</h1></div>")
+        self.assertEqual(sharded, full)
+        with open(os.path.join(self.root, ".cache", "manifest.json")) as f:
+            self.assertEqual(len(json.load(f)["pages"]), 25)
+
+    def test_shards_leave_empty_directories_to_the_merge(self):
+        for index in (1, 2):
+            self.assertEqual(self.run_main("build", "--shard", f"{index}/2").wait(), 0)
+        section = os.path.join(self.root, "content", "section3")
+        for name in os.listdir(section):
+            os.remove(os.path.join(section, name))
+        os.rmdir(section)
+        for index in (1, 2):
+            self.assertEqual(self.run_main("build", "--shard", f"{index}/2", "--incremental").wait(), 0)
+        # Another shard could still be writing into it
+        self.assertEqual(os.listdir(os.path.join(self.root, "docs", "section3")), [])
+        self.assertEqual(self.run_main("merge", "2").wait(), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "docs", "section3")))
+        self.assertTrue(os.path.isdir(os.path.join(self.root, "docs", "section2")))
+
+    def test_merge_needs_every_shard(self):
+        self.assertEqual(self.run_main("build", "--shard", "1/2").wait(), 0)
+        with self.assertRaises(Exception):
+            load_shard_manifests(os.path.join(self.root, ".cache"), 2)
+
+    def test_merge_removes_pages_no_shard_has(self):
+        manifest = BuildManifest(os.path.join(self.root, "manifest.json"))
+        shard = BuildManifest(os.path.join(self.root, "shard.json"))
+        shard.basepath = manifest.basepath = "/"
+        output = os.path.join(self.root, "docs", "gone.html")
+        self.write("docs/gone.html", "")
+        manifest.pages["gone.md"] = {"output": "gone.html"}
+        shard.pages["kept.md"] = {"output": "kept.html"}
+        self.assertEqual(list(merge_manifests(manifest, [shard], os.path.join(self.root, "docs"), "/")), ["kept.md"])
+        self.assertFalse(os.path.exists(output))
+        with self.assertRaises(Exception):
+            merge_manifests(manifest, [shard], os.path.join(self.root, "docs"), "/other/")
+
+if __name__ == "__main__":
+    unittest.main()
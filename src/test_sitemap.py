@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+from feed import FeedWriter
+from utils import generate_page
+from sitemap import SitemapWriter
+
+SITE = "https://example.com"
+DAY = 24 * 60 * 60
+
+class TestListings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.public = os.path.join(root, "public")
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write("content/index.md", "# Home")
+        self.write("content/blog/index.md", "# Blog")
+        for day, name in enumerate(["first", "second", "third"], 2):
+            self.write(f"content/blog/{name}.md", f"---\ndate: 1970-01-0{day}\n---\n# The {name} post")
+        self.write("content/blog/undated.md", "# No date")
+        self.write("content/blog/dated.md", "---\ndate: 1970-01-02T12:00:00\n---\n# Dated & <escaped>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.tmp.name, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read(self, rel_path):
+        with open(os.path.join(self.public, rel_path)) as f:
+            return f.read()
+
+    def build(self, max_urls=50000, limit=20):
+        listings = [SitemapWriter(self.public, SITE, "/site/", max_urls), FeedWriter(self.public, SITE, "/site/", limit=limit)]
+        with self.assertLogs("sitemap", "INFO"):
+            generate_page(self.content, self.tmp.name, self.public, "/site/", listings=listings)
+
+    def test_sitemap(self):
+        self.build()
+        sitemap = self.read("sitemap.xml")
+        self.assertIn("<urlset", sitemap)
+        self.assertIn("<url><loc>https://example.com/site/blog/first.html</loc><lastmod>1970-01-02</lastmod></url>",
+                      sitemap)
+        # No date in the front matter, no <lastmod>: the mtime only says when the file was checked out
+        self.assertIn("<url><loc>https://example.com/site/blog/undated.html</loc></url>", sitemap)
+        self.assertEqual(sitemap.count("<url>"), 7)
+
+    def test_sitemap_is_split_past_max_urls(self):
+        self.build(max_urls=4)
+        index = self.read("sitemap.xml")
+        self.assertIn("<sitemapindex", index)
+        self.assertIn("<loc>https://example.com/site/sitemap-2.xml</loc>", index)
+        self.assertEqual(self.read("sitemap-1.xml").count("<url>"), 4)
+        self.assertEqual(self.read("sitemap-2.xml").count("<url>"), 3)
+        # Back under the limit, the parts go away
+        self.build()
+        self.assertIn("<urlset", self.read("sitemap.xml"))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "sitemap-1.xml")))
+
+    def test_unchanged_site_is_not_rewritten(self):
+        self.build()
+        paths = [os.path.join(self.public, "sitemap.xml"), os.path.join(self.public, "blog", "feed.xml")]
+        for path in paths:
+            os.utime(path, (0, 0))
+        self.build()
+        self.assertEqual([os.stat(path).st_mtime for path in paths], [0, 0])
+        # A fresh checkout gives every source a new mtime, neither file changes
+        for name in ["index.md", "blog/index.md", "blog/first.md", "blog/undated.md"]:
+            os.utime(os.path.join(self.content, name), (100 * DAY, 100 * DAY))
+        self.build()
+        self.assertEqual([os.stat(path).st_mtime for path in paths], [0, 0])
+        self.write("content/about.md", "# About")
+        self.build()
+        self.assertNotEqual(os.stat(paths[0]).st_mtime, 0)
+
+    def test_feed_lists_newest_posts(self):
+        self.build(limit=3)
+        feed = self.read("blog/feed.xml")
+        titles = [part.split("</title>")[0] for part in feed.split("<entry><title>")[1:]]
+        self.assertEqual(titles, ["The third post", "The second post", "Dated &amp; &lt;escaped&gt;"])
+        self.assertIn('<link href="https://example.com/site/blog/third.html"/><updated>1970-01-04T00:00:00Z</updated>', feed)
+        self.assertIn("<updated>1970-01-04T00:00:00Z</updated>\n<entry>", feed)
+        self.assertIn("<id>https://example.com/site/blog/</id>", feed)
+        # Without a date a post has no time to be listed by
+        self.assertNotIn("No date", self.read("blog/feed.xml"))
+
+    def test_bad_date_does_not_stop_the_build(self):
+        self.write("content/blog/typo.md", "---\ndate: 1970-13-45\n---\n# Typo")
+        with self.assertLogs("feed", "WARNING") as logs:
+            self.build()
+        self.assertIn("invalid date", logs.output[0])
+        self.assertTrue(os.path.isfile(os.path.join(self.public, "blog", "typo.html")))
+        # Logged and left out of the feed, the sitemap leaves its <lastmod> out
+        self.assertNotIn("Typo", self.read("blog/feed.xml"))
+        self.assertIn("<url><loc>https://example.com/site/blog/typo.html</loc></url>", self.read("sitemap.xml"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import unittest
+
+from htmlnode import LeafNode, ParentNode
+from template import Template
+from utils import render_page, page_url
+
+class TestTemplate(unittest.TestCase):
+    def render(self, template, values):
+        sink = io.StringIO()
+        template.render_to(sink, values)
+        return sink.getvalue()
+
+    def test_segments(self):
+        template = Template("<title>{{ Title }}</title><main>{{Content}}</main>")
+        self.assertEqual(template.slots, {"Title", "Content"})
+        self.assertEqual(len(template.segments), 3)
+
+    def test_render_values(self):
+        template = Template("<title>{{ Title }}</title>{{ Content }}{{ Missing }}")
+        html = self.render(template, {"Title": "Fish & Chips", "Content": LeafNode("p", "body")})
+        self.assertEqual(html, "<title>Fish &amp; Chips</title><p>body</p>{{ Missing }}")
+
+    def test_basepath_in_template_and_content(self):
+        template = Template('<link href="/index.css" /><a href="https://boot.dev">x</a>{{ Content }}', "/site/")
+        content = ParentNode("p", [
+            LeafNode("a", "home", {"href": "/"}),
+            LeafNode("code", 'href="/not-a-link"'),
+        ])
+        self.assertEqual(
+            self.render(template, {"Content": content}),
+            '<link href="/site/index.css" /><a href="https://boot.dev">x</a><p><a href="/site/">home</a><code>href="/not-a-link"</code></p>',
+        )
+
+    def test_minify(self):
+        source = ('<!doctype html>\n<html>\n  <head>\n    <!-- note -->\n    <link rel="stylesheet" href="/index.css" />\n'
+                  '  </head>\n  <body>\n    <h1 class="a b">{{ Title }}</h1>\n    <pre>\n  as is\n</pre>\n'
+                  '    <a href="{{ Path }}">here</a>\n  </body>\n</html>\n')
+        template = Template(source, "/site/", minify=True)
+        html = self.render(template, {"Title": "Title", "Path": "/site/x"})
+        self.assertEqual(html, '<!doctype html><html><head><link rel=stylesheet href=/site/index.css>'
+                               '<body><h1 class="a b">Title</h1><pre>\n  as is\n</pre><a href="/site/x">here</a>')
+        values = {"Title": "Title", "Path": "/site/x"}
+        self.assertEqual(template.saved, len(self.render(Template(source, "/site/"), values)) - len(html))
+
+    def test_render_page_variables(self):
+        template = Template("{{ Title }} by {{ Author }} at {{ Path }}")
+        values = {"Author": "Tolkien", "Path": page_url("blog/tom/index.md", "/site/")}
+        self.assertEqual(render_page("# Tom", template, values), "Tom by Tolkien at /site/blog/tom/")
+
+    def test_page_url(self):
+        self.assertEqual(page_url("index.md"), "/")
+        self.assertEqual(page_url("blog/post.md"), "/blog/post.html")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 
 from utils import split_nodes_delimiter, extract_markdown_images, extract_markdown_links, split_nodes_image, split_nodes_link, text_to_textnodes
-from textnode import TextNode, TextType
+from textnode import TextNode, TextType, text_node_to_html_node
 
 
 class TestTextNode(unittest.TestCase):
@@ -136,6 +136,58 @@ class TestTextNode(unittest.TestCase):
             ],
             nodes,
         )
+    def test_text_to_textnodes_link_first(self):
+        nodes = text_to_textnodes("[link](https://boot.dev) then ![image](/img_1.png)")
+        self.assertListEqual(
+            [
+                TextNode("link", TextType.LINK, "https://boot.dev"),
+                TextNode(" then ", TextType.TEXT),
+                TextNode("image", TextType.IMAGE, "/img_1.png"),
+            ],
+            nodes,
+        )
+
+    def test_text_to_textnodes_bold_inside_link(self):
+        nodes = text_to_textnodes("See [the **best** post](/blog/best) now")
+        self.assertListEqual(
+            [
+                TextNode("See ", TextType.TEXT),
+                TextNode("the **best** post", TextType.LINK, "/blog/best", [
+                    TextNode("the ", TextType.TEXT),
+                    TextNode("best", TextType.BOLD),
+                    TextNode(" post", TextType.TEXT),
+                ]),
+                TextNode(" now", TextType.TEXT),
+            ],
+            nodes,
+        )
+        html = text_node_to_html_node(nodes[1]).to_html()
+        self.assertEqual(html, '<a href="/blog/best">the <b>best</b> post</a>')
+
+    def test_text_to_textnodes_code_is_literal(self):
+        nodes = text_to_textnodes("Call `snake_case(**kwargs)` here")
+        self.assertListEqual(
+            [
+                TextNode("Call ", TextType.TEXT),
+                TextNode("snake_case(**kwargs)", TextType.CODE),
+                TextNode(" here", TextType.TEXT),
+            ],
+            nodes,
+        )
+
+    def test_text_to_textnodes_not_a_link(self):
+        nodes = text_to_textnodes("[not a link] and 2 * 3 (ok)")
+        self.assertListEqual([TextNode("[not a link] and 2 * 3 (ok)", TextType.TEXT)], nodes)
+
+    def test_text_to_textnodes_unclosed(self):
+        with self.assertRaises(ValueError):
+            text_to_textnodes("This is **never closed")
+
+    def test_text_to_textnodes_many_unmatched_openers(self):
+        # Stays linear: a "[" that never closes must not make INLINE_TOKEN rescan the rest of the
+        # text from every opener, which would be quadratic in the length
+        text = "[" * 200000
+        self.assertListEqual([TextNode(text, TextType.TEXT)], text_to_textnodes(text))
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
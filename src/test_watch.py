@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import urllib.request
+
+from watch import DevSite, start_server
+
+TEMPLATE = "<title>{{ Title }}</title><main>{{ Content }}</main>"
+
+class TestDevSite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write("template.html", TEMPLATE)
+        self.write("static/index.css", "body {}")
+        self.write("content/index.md", "# Home\n\nWelcome")
+        self.write("content/blog/post/index.md", "# Post\n\nA [link](/)")
+        self.site = DevSite(os.path.join(self.root, "content"), os.path.join(self.root, "static"), self.root)
+        self.site.rebuild()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        # Step the mtime so a rewrite within the same clock tick is still seen as a change
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    def test_initial_render(self):
+        status, content_type, body = self.site.lookup("/")
+        self.assertEqual((status, content_type), (200, "text/html; charset=utf-8"))
+        self.assertEqual(body, b"<title>Home</title><main><div><h1>Home</h1><p>Welcome</p></div></main>")
+        self.assertEqual(self.site.lookup("/blog/post")[0], 200)
+        self.assertEqual(self.site.lookup("/blog/post/")[0], 200)
+
+    def test_rebuilds_only_changed_page(self):
+        self.assertEqual(self.site.rebuild(), [])
+        self.write("content/index.md", "# Home\n\nChanged")
+        self.assertEqual(self.site.rebuild(), ["index.md"])
+        self.assertIn(b"Changed", self.site.lookup("/index.html")[2])
+
+    def test_added_and_deleted_pages(self):
+        self.write("content/about.md", "# About")
+        self.assertEqual(self.site.rebuild(), ["about.md"])
+        self.assertEqual(self.site.lookup("/about")[0], 200)
+        os.remove(os.path.join(self.root, "content/about.md"))
+        self.assertEqual(self.site.rebuild(), ["about.md"])
+        self.assertEqual(self.site.lookup("/about")[0], 404)
+
+    def test_template_change_rerenders_everything(self):
+        self.write("template.html", "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(sorted(self.site.rebuild()), [os.path.join("blog", "post", "index.md"), "index.md"])
+        self.assertTrue(self.site.lookup("/")[2].startswith(b"<h1>Home</h1>"))
+
+    def test_partial_change_rerenders_its_pages(self):
+        self.write("layouts/blog.html", "{{> nav }}{{ Content }}")
+        self.write("partials/nav.html", "<nav>old</nav>")
+        self.assertEqual(self.site.rebuild(), [os.path.join("blog", "post", "index.md")])
+        self.write("partials/nav.html", "<nav>new</nav>")
+        self.assertEqual(self.site.rebuild(), [os.path.join("blog", "post", "index.md")])
+        self.assertTrue(self.site.lookup("/blog/post/")[2].startswith(b"<nav>new</nav>"))
+        self.assertIn(b"<title>Home</title>", self.site.lookup("/")[2])
+
+    def test_render_error_is_served(self):
+        self.write("content/index.md", "# Home\n\nUnclosed **bold")
+        self.site.rebuild()
+        status, _, body = self.site.lookup("/")
+        self.assertEqual(status, 500)
+        self.assertIn(b"not closed", body)
+
+    def test_static_files_and_traversal(self):
+        self.assertEqual(self.site.lookup("/index.css")[:2], (200, "text/css"))
+        self.assertEqual(self.site.lookup("/../template.html")[0], 404)
+        self.assertEqual(self.site.lookup("/%2e%2e/template.html")[0], 404)
+
+    def test_basepath(self):
+        site = DevSite(os.path.join(self.root, "content"), os.path.join(self.root, "static"), self.root, "/site/")
+        site.rebuild()
+        status, _, body = site.lookup("/site/blog/post/")
+        self.assertEqual(status, 200)
+        self.assertIn(b'href="/site/"', body)
+
+    def test_http_server(self):
+        server = start_server(self.site, port=0)
+        try:
+            with urllib.request.urlopen(f"http://localhost:{server.server_address[1]}/") as response:
+                self.assertEqual(response.headers["Cache-Control"], "no-store")
+                self.assertIn(b"Welcome", response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
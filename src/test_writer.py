@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+from writer import PageWriter
+
+class TestPageWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_pages(self):
+        writer = PageWriter(threads=3, queue_size=2)
+        for i in range(20):
+            writer.submit(os.path.join(self.root, f"dir{i % 4}", f"page{i}.html"), f"<p>{i}</p>")
+        self.assertEqual(writer.close(), {})
+        self.assertEqual(len(writer.created_dirs), 4)
+        with open(os.path.join(self.root, "dir3", "page7.html")) as f:
+            self.assertEqual(f.read(), "<p>7</p>")
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(os.path.join(self.root, "dir0"))))
+
+    def test_errors_are_collected(self):
+        blocker = os.path.join(self.root, "blog")
+        with open(blocker, 'w') as f:
+            f.write("a file where a directory should be")
+        writer = PageWriter(threads=2)
+        writer.submit(os.path.join(blocker, "post.html"), "<p>post</p>")
+        writer.submit(os.path.join(self.root, "index.html"), "<p>home</p>")
+        errors = writer.drain()
+        self.assertEqual(list(errors), [os.path.join(blocker, "post.html")])
+        self.assertEqual(writer.close(), {})
+        self.assertTrue(os.path.isfile(os.path.join(self.root, "index.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
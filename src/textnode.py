@@ -1,6 +1,6 @@
 from enum import Enum
 
-from htmlnode import LeafNode
+from htmlnode import HTMLNode, LeafNode, ParentNode
 
 class TextType(Enum):
     TEXT = "text" #"normal"
@@ -11,21 +11,30 @@ class TextType(Enum):
     IMAGE = "image" #'![alt text](url)'
 
 class TextNode():
-    def __init__(self, text: str, text_type: TextType, url=None):
+    __slots__ = ("text", "text_type", "url", "children")
+
+    def __init__(self, text: str, text_type: TextType, url=None, children=None):
         self.text = text
         self.text_type = text_type
         self.url = url
+        # Nested inline markup, e.g. bold text inside a link
+        self.children = children
 
     def __eq__(self, other):
         return (
             self.text == other.text and
             self.text_type == other.text_type and
-            self.url == other.url)
+            self.url == other.url and
+            self.children == other.children)
 
     def __repr__(self):
+        if self.children:
+            return f"TextNode({self.text}, {self.text_type.value}, {self.url}, {self.children})"
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
 
-def text_node_to_html_node(text_node) -> LeafNode:
+def text_node_to_html_node(text_node) -> HTMLNode:
+    if text_node.children:
+        return text_node_to_parent_node(text_node)
     match(text_node.text_type):
         case (TextType.TEXT):
             return LeafNode(None, text_node.text)
@@ -40,4 +49,16 @@ def text_node_to_html_node(text_node) -> LeafNode:
         case (TextType.IMAGE):
             return LeafNode("img", "", {'src': text_node.url, 'alt': text_node.text})
         case _:
-            raise Exception(f"invalid text type: {text_node.text_type}")
\ No newline at end of file
+            raise Exception(f"invalid text type: {text_node.text_type}")
+
+def text_node_to_parent_node(text_node) -> ParentNode:
+    children = [text_node_to_html_node(child) for child in text_node.children]
+    match(text_node.text_type):
+        case (TextType.BOLD):
+            return ParentNode("b", children)
+        case (TextType.ITALIC):
+            return ParentNode("i", children)
+        case (TextType.LINK):
+            return ParentNode("a", children, {'href': text_node.url})
+        case _:
+            raise Exception(f"invalid nested text type: {text_node.text_type}")
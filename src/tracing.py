@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import logging
+
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+def count_nodes(node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        count += 1
+        if item.children:
+            stack.extend(item.children)
+    return count
+
+
+class PageProfile():
+    '''Time spent on each stage of one page and the size of its node tree
+
+    Filled in by whichever process renders the page and sent back to the parent.
+    '''
+    def __init__(self, rel_path: str):
+        self.rel_path = rel_path
+        self.pid = os.getpid()
+        # (stage, start ns, end ns) on the perf_counter clock, shared by every process
+        self.stages = []
+        self.nodes = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.stages.append((name, start, time.perf_counter_ns()))
+
+    @property
+    def duration_ns(self) -> int:
+        if not self.stages:
+            return 0
+        return self.stages[-1][2] - self.stages[0][1]
+
+
+class BuildTrace():
+    '''Collects build stages and page profiles into a Chrome trace (chrome://tracing, Perfetto)'''
+    def __init__(self):
+        self.spans = []
+        self.pages = []
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.append((name, os.getpid(), start, time.perf_counter_ns()))
+
+    def add_page(self, profile: PageProfile):
+        self.pages.append(profile)
+
+    def events(self) -> list[dict]:
+        starts = [start for _, _, start, _ in self.spans]
+        starts += [page.stages[0][1] for page in self.pages if page.stages]
+        origin = min(starts, default=0)
+        def event(name, category, pid, start, end, args=None):
+            data = {"name": name, "cat": category, "ph": "X", "pid": pid, "tid": 0,
+                    "ts": (start - origin) / 1000, "dur": (end - start) / 1000}
+            if args:
+                data["args"] = args
+            return data
+
+        main_pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": main_pid, "tid": 0, "args": {"name": "build"}}]
+        for pid in sorted({page.pid for page in self.pages} - {main_pid}):
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": f"worker {pid}"}})
+        for name, pid, start, end in self.spans:
+            events.append(event(name, "build", pid, start, end))
+        for page in self.pages:
+            if not page.stages:
+                continue
+            events.append(event(page.rel_path, "page", page.pid, page.stages[0][1], page.stages[-1][2],
+                                {"nodes": page.nodes}))
+            for stage, start, end in page.stages:
+                events.append(event(stage, "stage", page.pid, start, end))
+        return events
+
+    def write(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+
+    def stage_totals(self) -> dict:
+        totals = {}
+        for page in self.pages:
+            for stage, start, end in page.stages:
+                totals[stage] = totals.get(stage, 0) + end - start
+        return totals
+
+    def report(self, top: int=10):
+        '''Logs the time per stage, the slowest pages and the pages with the most nodes'''
+        for name, _, start, end in self.spans:
+            logger.info(f"{name}: {(end - start) / 1e6:.1f} ms")
+        totals = self.stage_totals()
+        if totals:
+            logger.info("Page stages: " + ", ".join(f"{stage} {ns / 1e6:.1f} ms" for stage, ns in totals.items()))
+        if not self.pages or top <= 0:
+            return
+        logger.info(f"Slowest {min(top, len(self.pages))} pages:")
+        for page in sorted(self.pages, key=lambda page: page.duration_ns, reverse=True)[:top]:
+            stages = ", ".join(f"{stage} {(end - start) / 1e6:.2f}" for stage, start, end in page.stages)
+            logger.info(f"  {page.duration_ns / 1e6:8.2f} ms  {page.rel_path} ({stages})")
+        logger.info(f"Largest {min(top, len(self.pages))} node trees:")
+        for page in sorted(self.pages, key=lambda page: page.nodes, reverse=True)[:top]:
+            logger.info(f"  {page.nodes:8} nodes  {page.rel_path}")
+
+def span(trace, name: str):
+    '''trace.span(name), or a no-op when there is no trace'''
+    if trace is None:
+        return nullcontext()
+    return trace.span(name)
@@ -1,11 +1,23 @@
+import io
 import re
 import os
 import shutil
+import logging
+
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 
 from typing import List, Tuple
 from textnode import TextType, TextNode, text_node_to_html_node
-from htmlnode import ParentNode, HTMLNode, LeafNode
-from blocktypes import BlockType, block_to_block_type
+from htmlnode import ParentNode, HTMLNode, LeafNode, RawHTMLNode
+from blocktypes import BlockType, scan_blocks, iter_blocks, iter_byte_lines
+from manifest import hash_bytes
+from serializer import MINIFY_SAVINGS, write_html
+from inline import tokenize_inline
+from layouts import Layouts, parse_front_matter, read_front_matter, split_front_matter
+
+logger = logging.getLogger(__name__)
 
 def split_nodes_delimiter(old_nodes: List, delimiter: str, text_type: TextType) -> List:
     new_nodes = []
@@ -78,48 +90,42 @@ def split_nodes_link(old_nodes):
     return link_nodes
 
 def text_to_textnodes(text):
-    nodes = [TextNode(text, TextType.TEXT)]
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
-    return nodes
+    return tokenize_inline(text)
 
 def markdown_to_blocks(markdown: str) -> List[str]:
-    blocks = []
-    split_md = markdown.split("\n\n")
-    for block in split_md:
-        if block == "":
-            continue
-        blocks.append(block.strip())
-    return blocks
+    return [block for block, _ in scan_blocks(markdown)]
 
-def markdown_to_html_node(markdown: str) -> ParentNode:
-    '''Converts full Markdown Document to a Single HTMLNode parent'''
-    blocks = markdown_to_blocks(markdown)
-    children = []
-    for block in blocks:
-        block_type = block_to_block_type(block)
-        match(block_type):
-            case (BlockType.HEADING):
-                children.append(convert_header_block_to_html(block))
-            case (BlockType.CODE):
-                children.append(convert_code_block_to_html(block))
-            case (BlockType.QUOTE):
-                children.append(convert_quote_block_to_html(block))
-            case (BlockType.PARAGRAPH):
-                children.append(convert_paragraph_block_to_html(block))
-            case (BlockType.UNORDERED_LIST):
-                children.append(convert_unord_block_to_html(block))
-            case (BlockType.ORDERED_LIST):
-                children.append(convert_ord_block_to_html(block))
-
-            case _:
-                raise Exception(f"invalid block: {block_type}")
+def markdown_to_html_node(markdown: str, block_cache=None) -> ParentNode:
+    '''Converts full Markdown Document to a Single HTMLNode parent
 
+    With a BlockCache, blocks seen before are taken from the cache already rendered.
+    '''
+    children = []
+    for block, block_type in scan_blocks(markdown):
+        if block_cache is not None:
+            children.append(block_cache.node_for(block, block_type, block_to_html_node))
+        else:
+            children.append(block_to_html_node(block, block_type))
     return ParentNode("div", children, None) 
 
+def block_to_html_node(block: str, block_type: BlockType) -> HTMLNode:
+    match(block_type):
+        case (BlockType.HEADING):
+            return convert_header_block_to_html(block)
+        case (BlockType.CODE):
+            return convert_code_block_to_html(block)
+        case (BlockType.QUOTE):
+            return convert_quote_block_to_html(block)
+        case (BlockType.PARAGRAPH):
+            return convert_paragraph_block_to_html(block)
+        case (BlockType.UNORDERED_LIST):
+            return convert_unord_block_to_html(block)
+        case (BlockType.ORDERED_LIST):
+            return convert_ord_block_to_html(block)
+
+        case _:
+            raise Exception(f"invalid block: {block_type}")
+
 def convert_text_to_children(text):
     text_nodes = text_to_textnodes(text)
     children = []
@@ -128,23 +134,36 @@ def convert_text_to_children(text):
         children.append(html_node)
     return children
 
+# Shared tag strings, so every heading doesn't allocate its own "h2"
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
 def convert_header_block_to_html(block):
-    # <h1-6>
-    count = 0
-    for i in block:
-        if i == "#":
-            count += 1
-    node = LeafNode(f"h{count}", block[count+1:])
+    # <h1-6>, only the leading run of # sets the level so "# C# tips" stays an h1
+    count = len(block) - len(block.lstrip("#"))
+    node = LeafNode(HEADING_TAGS[count - 1], block[count+1:])
     return node 
 
 def convert_code_block_to_html(block: str):
-    if not block.startswith("```") or not block.endswith("```"):
+    '''<pre><code> of a fenced block, highlighted when its info string names a known language
+
+    The info string is the rest of the opening ``` line, its first word is the
+    language and becomes class="language-<name>" on the <code>.
+    '''
+    if not block.startswith("```") or not block.endswith("```") or len(block) < 6:
         raise ValueError("invalid code block")
-    text = block[4:-3]
-    raw_text_node = TextNode(text, TextType.TEXT)
-    child = text_node_to_html_node(raw_text_node)
-    code = ParentNode("code", [child])
-    return ParentNode("pre", [code])
+    first_line_end = block.find("\n")
+    if first_line_end == -1:
+        # ```code``` on one line has no info string
+        return ParentNode("pre", [ParentNode("code", [LeafNode(None, block[3:-3])])])
+    info = block[3:first_line_end]
+    text = block[first_line_end + 1:-3]
+    if not info.strip():
+        return ParentNode("pre", [ParentNode("code", [LeafNode(None, text)])])
+    from highlight import code_language, highlight
+    language = code_language(info)
+    html = highlight(text, language)
+    child = RawHTMLNode(html) if html is not None else LeafNode(None, text)
+    return ParentNode("pre", [ParentNode("code", [child], {"class": f"language-{language}"})])
 
 def convert_quote_block_to_html(block):
     lines = block.split("\n")
@@ -181,20 +200,20 @@ def convert_ord_block_to_html(block):
         html_nodes.append(ParentNode("li", children))
     return ParentNode("ol", html_nodes)
 
-def copy_dir_to_dest(from_dir, dest_dir):
+def copy_dir_to_dest(from_dir, dest_dir, clean=True):
     if not os.path.exists(from_dir):
         raise ValueError(f"Source directory does not exist: {from_dir}")
 
-    if os.path.exists(dest_dir):
-        print(f"Removing files from {dest_dir} folder...")
+    if clean and os.path.exists(dest_dir):
+        logger.info(f"Removing files from {dest_dir} folder...")
         shutil.rmtree(dest_dir)
 
-    print(f"The destination directory {dest_dir} does not exist...")
-    print(f"Creating {dest_dir} via mkdir")
-    os.makedirs(dest_dir)
+    if not os.path.exists(dest_dir):
+        logger.debug(f"The destination directory {dest_dir} does not exist...")
+        logger.debug(f"Creating {dest_dir} via mkdir")
+        os.makedirs(dest_dir)
     
-    print(f"Attempting to move files from {from_dir} to {dest_dir}...")
-    print(f"Copying Files from {from_dir}...")
+    logger.info(f"Copying files from {from_dir} to {dest_dir}...")
     copy_files = os.listdir(from_dir)
     for file in copy_files:
         file_path = os.path.join(from_dir, file)
@@ -202,13 +221,13 @@ def copy_dir_to_dest(from_dir, dest_dir):
 
 def copy_files_recursive(source, dest):
     if os.path.isfile(source):
-        print(f"Copying file {source} to {dest}...")
+        logger.debug(f"Copying file {source} to {dest}...")
         shutil.copy(source, dest)
         return
     
     dest_dir = os.path.join(dest, os.path.basename(source))
     if not os.path.exists(dest_dir):
-        print(f"Creating directory: {dest_dir}...")
+        logger.debug(f"Creating directory: {dest_dir}...")
         os.makedirs(dest_dir)
 
     for item in os.listdir(source):
@@ -216,22 +235,16 @@ def copy_files_recursive(source, dest):
         copy_files_recursive(source_item, dest_dir)
 
 def extract_title(markdown):
-    blocks = markdown_to_blocks(markdown)
-    for block in blocks:
+    return find_title(scan_blocks(markdown))
+
+def find_title(blocks):
+    '''Returns the text of the first "# " heading in (block, BlockType) pairs'''
+    for block, _ in blocks:
         if block.startswith("# "):
             return block[2:]
     raise Exception("No title header found in markdown file")
 
-def generate_page(from_path, template_path, dest_path, basepath):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}/template.html...")
-    
-    # Read Markdown
-    if os.path.exists(from_path) and os.path.isdir(from_path):
-        path_to_text = extract_text_from_file(from_path)
-    else:
-        raise Exception(f"Directory {from_path} to copy doesn't exist")
-
-    # Read template file
+def read_template(template_path):
     template_file = ""
     if os.path.exists(template_path) and os.path.isdir(template_path):
         file_path = os.path.join(template_path, "template.html")
@@ -240,34 +253,496 @@ def generate_page(from_path, template_path, dest_path, basepath):
                 template_file = f.read()
     else:
         raise Exception(f"Template directory {template_path} doesn't exist")
+    return template_file
+
+def output_rel_path(rel_path):
+    if rel_path.endswith('.md'):
+        rel_path = rel_path[:-3] + '.html'
+    return rel_path
+
+def page_url(rel_path, basepath="/"):
+    '''URL a page is served at, index.html pages are addressed by their directory'''
+    url = output_rel_path(rel_path).replace(os.sep, "/")
+    if url == "index.html" or url.endswith("/index.html"):
+        url = url[:-len("index.html")]
+    return basepath + url
+
+def render_page_to(sink, md_text, template, values=None, block_cache=None, title=None):
+    '''Writes the page for md_text to sink through a Template, streaming the content from the node tree
+
+    values fills template slots other than Title and Content. Without a title the
+    first "# " heading is used.
+    '''
+    page_values = dict(values or {})
+    page_values["Title"] = title if title is not None else extract_title(md_text)
+    page_values["Content"] = markdown_to_html_node(md_text, block_cache)
+    template.render_to(sink, page_values)
+
+def render_page(md_text, template, values=None, block_cache=None, title=None):
+    page = io.StringIO()
+    render_page_to(page, md_text, template, values, block_cache, title)
+    return page.getvalue()
+
+def decode_markdown(data: bytes) -> str:
+    # Same newline handling as reading the file in text mode
+    return data.decode().replace("\r\n", "\n").replace("\r", "\n")
+
+@contextmanager
+def replacing(output_file):
+    '''Yields a file open for writing next to output_file, moved over it once the block exits
+
+    A page failing halfway never leaves a truncated file behind, nor the .tmp file.
+    '''
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    tmp_file = f"{output_file}.tmp"
+    try:
+        with open(tmp_file, 'w') as f:
+            yield f
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def write_page(output_file, md_text, template, values=None, block_cache=None, title=None):
+    with replacing(output_file) as f:
+        render_page_to(f, md_text, template, values, block_cache, title)
+
+# Pages at least this big are memory-mapped and rendered one block at a time
+LARGE_PAGE_BYTES = 32 << 20
+
+def write_blocks_to(sink, blocks, basepath=None, block_cache=None, minify=False):
+    '''Streams (block, BlockType) pairs to sink as the <div> markdown_to_html_node would build'''
+    sink.write("<div>")
+    for block, block_type in blocks:
+        if block_cache is not None:
+            node = block_cache.node_for(block, block_type, block_to_html_node)
+        else:
+            node = block_to_html_node(block, block_type)
+        write_html(node, sink, basepath, minify)
+    sink.write("</div>")
+
+def write_large_page(output_file, source_file, template, values=None, block_cache=None, title=None,
+                     on_block=None) -> str:
+    '''Renders a page without reading its source into memory, returns the hash of the source
+
+    The source is memory-mapped and walked line by line, so only the block being
+    rendered is held as text and no node tree is built for the whole document.
+    Front matter is skipped. Without a title it is found with a first pass that stops
+    at the "# " heading. on_block(block, BlockType) is called for every block as it is
+    rendered.
+    '''
+    def body_blocks():
+        _, lines = split_front_matter(iter_byte_lines(source))
+        return iter_blocks(lines)
+
+    def observed(blocks):
+        for block, block_type in blocks:
+            on_block(block, block_type)
+            yield block, block_type
+
+    import mmap
+    with open(source_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        page_values = dict(values or {})
+        page_values["Title"] = title if title is not None else find_title(body_blocks())
+        blocks = body_blocks() if on_block is None else observed(body_blocks())
+        page_values["Content"] = lambda sink: write_blocks_to(sink, blocks, template.basepath, block_cache,
+                                                                   template.minify)
+        with replacing(output_file) as f:
+            template.render_to(f, page_values)
+        return hash_bytes(source)
+
+def render_file(sink, source_file, template_path, basepath="/", variables=None, content_dir=None, minify=False):
+    '''Renders one markdown file to sink the way a build would, without walking any tree
+
+    Files under content_dir get the layout and Path of their place in it, other files
+    are rendered as if they sat at its top. Only the file and its layout are read.
+    '''
+    rel_path = os.path.basename(source_file)
+    if content_dir is not None:
+        relative = os.path.relpath(os.path.abspath(source_file), os.path.abspath(content_dir))
+        if relative.split(os.sep)[0] != os.pardir:
+            rel_path = relative
+    with open(source_file, 'rb') as f:
+        metadata, md_text = parse_front_matter(decode_markdown(f.read()))
+    settings = PageSettings(Layouts(template_path, basepath, minify), variables)
+    template, _ = settings.layouts.select(rel_path, metadata)
+    render_page_to(sink, md_text, template, settings.page_values(rel_path), None, metadata.get("title"))
+
+class PageSettings():
+    '''What every page of a build is rendered with, set up once per process'''
+    def __init__(self, layouts, variables=None, block_cache=None, profile=False, writer=None, search=False,
+                 links=False):
+        self.layouts = layouts
+        self.variables = variables or {}
+        self.block_cache = block_cache
+        self.profile = profile
+        self.writer = writer
+        self.search = search
+        self.links = links
+
+    def page_values(self, rel_path):
+        values = dict(self.variables)
+        values["Basepath"] = self.layouts.basepath
+        values["Path"] = page_url(rel_path, self.layouts.basepath)
+        return values
+
+    def block_extractor(self, title=None):
+        '''extract() one block at a time, for pages that are streamed
+
+        Returns on_block(block, BlockType), to be called with every block of the page in
+        order, and finish() giving the dict extract() would. on_block is None when no
+        index is enabled.
+        '''
+        if not (self.search or self.links):
+            return None, dict
+        doc = targets = None
+        if self.search:
+            from search import DocBuilder
+            doc = DocBuilder(title)
+        if self.links:
+            from links import add_block_links
+            targets = {}
+
+        def on_block(block, block_type):
+            if doc is not None:
+                doc.add(block, block_type)
+            if targets is not None:
+                add_block_links(targets, block, block_type)
+
+        def finish():
+            extracted = {}
+            if doc is not None:
+                extracted["search"] = doc.doc()
+            if targets is not None:
+                extracted["links"] = list(targets)
+            return extracted
+        return on_block, finish
+
+    def extract(self, md_text, title=None):
+        '''What the build-wide indexes need from a page, see build_page'''
+        on_block, finish = self.block_extractor(title)
+        if on_block is not None:
+            for block, block_type in scan_blocks(md_text):
+                on_block(block, block_type)
+        return finish()
+
+def build_page(rel_path, source_file, output_file, settings, profile=None):
+    '''Reads, renders and writes a single page
+
+    Returns the hash of its source, the template files it was rendered with (see
+    Layouts.select) and a dict of what the indexes enabled in settings extracted: the
+    search entry under "search" (see page_doc) and the link targets under "links" (see
+    page_links). With a PageWriter in settings the page is rendered to memory and
+    handed to it, write errors then come out of the writer. Sources of LARGE_PAGE_BYTES
+    or more go through write_large_page, what the indexes need is collected block by
+    block as they stream past (see PageSettings.block_extractor). With a PageProfile
+    each stage is timed on it and the page is written before returning, so
+    serializing and writing show up separately (large pages are timed as a single
+    stream stage).
+    '''
+    if os.path.getsize(source_file) >= LARGE_PAGE_BYTES:
+        metadata = read_front_matter(source_file)
+        template, deps = settings.layouts.select(rel_path, metadata)
+        on_block, finish = settings.block_extractor(metadata.get("title"))
+        args = (output_file, source_file, template, settings.page_values(rel_path), settings.block_cache,
+                metadata.get("title"), on_block)
+        if profile is None:
+            digest = write_large_page(*args)
+        else:
+            with profile.stage("stream"):
+                digest = write_large_page(*args)
+        return digest, deps, finish()
+    if profile is not None:
+        return _build_page_profiled(rel_path, source_file, output_file, settings, profile)
+    with open(source_file, 'rb') as f:
+        data = f.read()
+    metadata, md_text = parse_front_matter(decode_markdown(data))
+    template, deps = settings.layouts.select(rel_path, metadata)
+    values = settings.page_values(rel_path)
+    if settings.writer is not None:
+        html = render_page(md_text, template, values, settings.block_cache, metadata.get("title"))
+        settings.writer.submit(output_file, html)
+    else:
+        write_page(output_file, md_text, template, values, settings.block_cache, metadata.get("title"))
+    return hash_bytes(data), deps, settings.extract(md_text, metadata.get("title"))
+
+def _build_page_profiled(rel_path, source_file, output_file, settings, profile):
+    from tracing import count_nodes
+    with profile.stage("read"):
+        with open(source_file, 'rb') as f:
+            data = f.read()
+        metadata, md_text = parse_front_matter(decode_markdown(data))
+    with profile.stage("parse"):
+        template, deps = settings.layouts.select(rel_path, metadata)
+        values = settings.page_values(rel_path)
+        values["Title"] = metadata.get("title") or extract_title(md_text)
+        values["Content"] = markdown_to_html_node(md_text, settings.block_cache)
+        extracted = settings.extract(md_text, metadata.get("title"))
+    profile.nodes = count_nodes(values["Content"])
+    with profile.stage("render"):
+        page = io.StringIO()
+        template.render_to(page, values)
+    with profile.stage("write"):
+        with replacing(output_file) as f:
+            f.write(page.getvalue())
+    return hash_bytes(data), deps, extracted
+
+# Pages handed to a worker per round trip, small enough to keep every core busy on small sites
+PAGE_BATCH_SIZE = 4
+
+# Background writer threads per rendering process, 0 writes on the render thread
+WRITER_THREADS = 4
+# Pages rendered ahead of the writer in a serial build before waiting for it to catch up
+SERIAL_BATCH_SIZE = 8
+
+# Settings shared by every page, set once per worker process instead of pickled per task
+_page_settings = None
+# Kept across builds in the same process (watch mode), blocks are keyed by content
+_block_cache = None
+
+def _init_page_worker(template_path, basepath, variables, block_cache_size=0, profile=False, writer_threads=0,
+                      search=False, links=False, minify=False):
+    global _page_settings, _block_cache
+    block_cache = None
+    if block_cache_size > 0:
+        if (_block_cache is None or _block_cache.maxsize != block_cache_size or _block_cache.basepath != basepath
+                or _block_cache.minify != minify):
+            from rendercache import BlockCache
+            _block_cache = BlockCache(block_cache_size, basepath, minify)
+        block_cache = _block_cache
+    writer = None
+    if writer_threads > 0:
+        from writer import PageWriter
+        writer = PageWriter(writer_threads)
+    # Each process parses every layout once and reuses it for every page it renders
+    _page_settings = PageSettings(Layouts(template_path, basepath, minify), variables, block_cache, profile, writer,
+                                  search, links)
+
+def _build_page_task(task):
+    '''Returns (rel_path, digest, deps, error, stats) for one page, never raises
+
+    stats counts block cache hits and misses, the bytes minifying saved under
+    "minify_saved" when the build is minified, holds the PageProfile under "profile"
+    when the build is profiled, plus whatever build_page extracted for the indexes.
+    '''
+    rel_path, source_file, output_file = task
+    cache = _page_settings.block_cache
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    saved = MINIFY_SAVINGS.saved
+    profile = None
+    if _page_settings.profile:
+        from tracing import PageProfile
+        profile = PageProfile(rel_path)
+    try:
+        (digest, deps, extracted), error = build_page(rel_path, source_file, output_file, _page_settings, profile), None
+    except Exception as e:
+        digest, deps, extracted, error = None, None, {}, f"{type(e).__name__}: {e}"
+    stats = {}
+    if cache is not None:
+        stats["cache_hits"] = cache.hits - hits
+        stats["cache_misses"] = cache.misses - misses
+    if _page_settings.layouts.minify:
+        stats["minify_saved"] = MINIFY_SAVINGS.saved - saved
+    if profile is not None:
+        stats["profile"] = profile
+    stats.update(extracted)
+    return rel_path, digest, deps, error, stats
+
+def _build_page_batch(batch):
+    '''Builds every task of batch, returning once their pages are on disk
+
+    The writer is drained at the end of every batch, whatever happened while
+    rendering, so a write error is always reported with the page it belongs to and
+    nothing is left queued when the process goes away.
+    '''
+    writer = _page_settings.writer
+    if writer is None:
+        return [_build_page_task(task) for task in batch]
+    try:
+        results = [_build_page_task(task) for task in batch]
+    finally:
+        errors = writer.drain()
+    for i, ((_, _, output_file), (rel_path, _, _, error, stats)) in enumerate(zip(batch, results)):
+        if error is None and output_file in errors:
+            results[i] = (rel_path, None, None, errors.pop(output_file), stats)
+    for output_file, error in errors.items():
+        logger.error(f"Error writing {output_file}: {error}")
+    return results
+
+def _init_pool_worker(*args):
+    '''_init_page_worker for a pool process, its writer threads are stopped when it exits'''
+    from multiprocessing import util
+    _init_page_worker(*args)
+    if _page_settings.writer is not None:
+        util.Finalize(_page_settings.writer, _page_settings.writer.close, exitpriority=10)
+
+def build_pages(tasks, template_path, basepath, jobs=1, variables=None, block_cache_size=0, profile=False,
+                writer_threads=WRITER_THREADS, search=False, links=False, minify=False):
+    '''Yields (rel_path, digest, deps, error, stats) for each task, in task order
+
+    tasks may be a lazy iterator, at most a few batches per worker are in flight at a time.
+    With writer_threads every rendering process writes its pages on that many threads
+    while it renders the next ones; a batch is only reported once its pages are written.
+    '''
+    tasks = iter(tasks)
+    if jobs <= 1:
+        _init_page_worker(template_path, basepath, variables, block_cache_size, profile, writer_threads, search, links,
+                          minify)
+        try:
+            while batch := list(islice(tasks, SERIAL_BATCH_SIZE)):
+                yield from _build_page_batch(batch)
+        finally:
+            if _page_settings.writer is not None:
+                _page_settings.writer.close()
+        return
+    # Only builds that use it pay for importing multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    pending = deque()
+    initargs = (template_path, basepath, variables, block_cache_size, profile, writer_threads, search, links, minify)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_pool_worker, initargs=initargs) as executor:
+        while True:
+            batch = list(islice(tasks, PAGE_BATCH_SIZE))
+            if batch:
+                pending.append(executor.submit(_build_page_batch, batch))
+            if not pending:
+                break
+            if not batch or len(pending) >= jobs * 2:
+                yield from pending.popleft().result()
+
+def generate_page(from_path, template_path, dest_path, basepath, manifest=None, jobs=1, variables=None,
+                  block_cache_size=0, trace=None, writer_threads=WRITER_THREADS, search=None, listings=(),
+                  links=None, shard=None, minify=False):
+    '''Renders every markdown file under from_path, returns the relative paths written
+
+    Each page is rendered with its layout from template_path (see Layouts), which fills
+    {{ Title }}, {{ Content }}, {{ Basepath }} and {{ Path }} (the URL of the page) plus any
+    slot named in variables.
+
+    With a BuildManifest only pages whose source, layout or partials changed since the
+    last build are rendered, every page when the variables or basepath changed, and
+    pages whose source was deleted are removed.
+    With jobs > 1 pages are parsed, rendered and written on a pool of processes.
+    block_cache_size > 0 gives every process an LRU cache of that many rendered blocks.
+    With a BuildTrace every page is profiled stage by stage and added to it.
+    writer_threads > 0 writes pages on background threads while rendering continues.
+    With a SearchIndex the terms of every rendered page are indexed as it is rendered,
+    fresh pages keep their entries from the last build; the caller writes it out.
+    listings (SitemapWriter, FeedWriter) are given every page in discovery order,
+    rendered or not, through add(rel_path, source_file) and closed after the build.
+    With a LinkGraph the link targets of every page are recorded in it, read while
+    rendering or taken from the manifest for fresh pages; the caller checks them once
+    the rest of the output is in place.
+    With shard set to (i, N) only the pages of shard i are handled (see shards.in_shard),
+    the others are left alone, so N builds can share one dest_path.
+    With minify pages are written minified (see iter_minified_html and minify_markup),
+    turning it on or off rebuilds every page.
+    '''
+    logger.info(f"Generating page from {from_path} to {dest_path} using the layouts in {template_path}...")
     
-    for rel_path, md_text in path_to_text.items():
-        title = extract_title(md_text)
-        html_nodes = markdown_to_html_node(md_text)
-        page_content = template_file.replace("{{ Title }}", title). \
-            replace("{{ Content }}", html_nodes.to_html()). \
-            replace('href="/', f'href="{basepath}'). \
-            replace('src="/', f'src="{basepath}')
-        if rel_path.endswith('.md'):
-            rel_path = rel_path.replace('.md', '.html')
-        output_file = os.path.join(dest_path, rel_path)
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        with open(output_file, 'w') as f:
-            f.write(page_content)
-    
-def extract_text_from_file(dir_path, root_dir=None):
-    if root_dir is None:
-        root_dir = dir_path
-    relpath_to_content = {}
-    for item in os.listdir(dir_path):
-        file_path = os.path.join(dir_path, item)
-        if os.path.isfile(file_path) and file_path.endswith('.md'):
-            with open(file_path, 'r') as f:
-                text = f.read()
-            rel_path = os.path.relpath(file_path, root_dir)
-            relpath_to_content[rel_path] = text
-        
-        if os.path.isdir(file_path):
-            relpath_to_content.update(extract_text_from_file(file_path, root_dir))
-    
-    return relpath_to_content
+    if not (os.path.exists(from_path) and os.path.isdir(from_path)):
+        raise Exception(f"Directory {from_path} to copy doesn't exist")
+    if not os.path.isdir(template_path):
+        raise Exception(f"Template directory {template_path} doesn't exist")
+
+    import json
+    from shards import in_shard
+    variables = variables or {}
+    inputs_hash = hash_bytes(json.dumps(variables, sort_keys=True).encode() + (b"\0minify" if minify else b""))
+    if manifest is not None and manifest.check_inputs(inputs_hash, basepath):
+        logger.info("Variables, basepath or minify changed, rebuilding every page...")
+    # Only hashes the template files pages depended on last time, the workers parse them
+    layouts = Layouts(template_path, basepath, minify)
+
+    # Pages flow discovery -> read -> render -> write one at a time, only paths are kept around
+    seen_paths = set()
+    def iter_tasks():
+        for rel_path in iter_markdown_files(from_path):
+            if shard is not None and not in_shard(rel_path, shard):
+                continue
+            seen_paths.add(rel_path)
+            source_file = os.path.join(from_path, rel_path)
+            for listing in listings:
+                listing.add(rel_path, source_file)
+            output_file = os.path.join(dest_path, output_rel_path(rel_path))
+            if (manifest is not None and manifest.is_fresh(rel_path, source_file, output_file, layouts.file_hash)
+                    and (search is None or rel_path in search)
+                    and (links is None or manifest.page_links(rel_path) is not None)):
+                if links is not None:
+                    links.record(rel_path, manifest.page_links(rel_path))
+                continue
+            yield rel_path, source_file, output_file
+
+    written = []
+    failed = []
+    totals = {}
+    results = build_pages(iter_tasks(), template_path, basepath, jobs, variables, block_cache_size, trace is not None,
+                          writer_threads, search is not None, links is not None, minify)
+    for rel_path, digest, deps, error, stats in results:
+        profile = stats.pop("profile", None)
+        if profile is not None:
+            trace.add_page(profile)
+        doc = stats.pop("search", None)
+        if doc is not None and error is None:
+            search.update(rel_path, doc)
+        targets = stats.pop("links", None)
+        if targets is not None and error is None:
+            links.record(rel_path, targets)
+        if minify and error is None:
+            logger.debug(f"Minified {rel_path}, {stats.get('minify_saved', 0)} bytes saved")
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+        if error is not None:
+            logger.error(f"Error generating {rel_path}: {error}")
+            failed.append(rel_path)
+            continue
+        if manifest is not None:
+            manifest.record(rel_path, os.path.join(from_path, rel_path), digest, output_rel_path(rel_path), deps,
+                            targets)
+        written.append(rel_path)
+
+    if manifest is not None:
+        # Shards share dest_path while they run, the merge clears the directories they empty
+        manifest.prune(seen_paths, dest_path, remove_dirs=shard is None)
+        manifest.save()
+        logger.info(f"Rendered {len(written)} of {len(seen_paths)} pages...")
+    if search is not None:
+        search.prune(seen_paths)
+        search.save()
+    for listing in listings:
+        listing.close()
+    if block_cache_size > 0:
+        lookups = totals.get("cache_hits", 0) + totals.get("cache_misses", 0)
+        hit_rate = totals.get("cache_hits", 0) / lookups if lookups else 0.0
+        logger.info(f"Block cache: {totals.get('cache_hits', 0)} hits, {totals.get('cache_misses', 0)} misses ({hit_rate:.0%} hit rate)...")
+    if minify:
+        logger.info(f"Minify: {totals.get('minify_saved', 0)} bytes saved over {len(written)} pages...")
+    if failed:
+        raise Exception(f"{len(failed)} page(s) failed to generate: {', '.join(failed)}")
+    return written
+
+def _sorted_entries(dir_path):
+    with os.scandir(dir_path) as entries:
+        return sorted(entries, key=lambda entry: entry.name)
+
+def iter_markdown_files(dir_path):
+    '''Yields the path of every markdown file under dir_path relative to it, in sorted order'''
+    stack = [iter(_sorted_entries(dir_path))]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+        if entry.is_dir():
+            stack.append(iter(_sorted_entries(entry.path)))
+        elif entry.is_file() and entry.name.endswith('.md'):
+            yield os.path.relpath(entry.path, dir_path)
+
+def iter_markdown_texts(dir_path):
+    '''Yields (rel_path, text) for every markdown file under dir_path, reading each lazily'''
+    for rel_path in iter_markdown_files(dir_path):
+        with open(os.path.join(dir_path, rel_path), 'r') as f:
+            yield rel_path, f.read()
+
+def extract_text_from_file(dir_path):
+    '''Loads every markdown file at once, prefer iter_markdown_texts for whole sites'''
+    return dict(iter_markdown_texts(dir_path))
@@ -0,0 +1,208 @@
+import os
+import time
+import logging
+import threading
+import mimetypes
+
+from urllib.parse import unquote, urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from assets import iter_files
+from layouts import DEFAULT_LAYOUT, LAYOUTS_DIR, PARTIALS_DIR, Layouts, parse_front_matter
+from rendercache import BlockCache
+from utils import PageSettings, decode_markdown, render_page, output_rel_path
+
+logger = logging.getLogger(__name__)
+
+def snapshot(dir_path, suffix=""):
+    '''Maps every file under dir_path ending in suffix to its (mtime_ns, size)'''
+    files = {}
+    if not os.path.isdir(dir_path):
+        return files
+    for rel_path, entry in iter_files(dir_path):
+        if rel_path.endswith(suffix):
+            stat = entry.stat()
+            files[rel_path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+def template_snapshot(template_path):
+    '''snapshot() of template.html and every layout and partial, keyed like Layouts keys them'''
+    files = {}
+    try:
+        stat = os.stat(os.path.join(template_path, DEFAULT_LAYOUT))
+        files[DEFAULT_LAYOUT] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    for dir_name in (LAYOUTS_DIR, PARTIALS_DIR):
+        for rel_path, stamp in snapshot(os.path.join(template_path, dir_name), ".html").items():
+            files[f"{dir_name}/{rel_path.replace(os.sep, '/')}"] = stamp
+    return files
+
+
+class DevSite():
+    '''The rendered site held in memory, re-rendered page by page as its sources change
+
+    Pages are keyed by their output path ("blog/tom/index.html"), static files are
+    served straight from static_dir so they never need copying.
+    '''
+    def __init__(self, content_dir, static_dir, template_path, basepath="/", variables=None, block_cache_size=1024):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.basepath = basepath
+        self.variables = variables or {}
+        self.block_cache = BlockCache(block_cache_size, basepath) if block_cache_size > 0 else None
+        self.settings = None
+        self.templates = None
+        self.sources = {}
+        # source path -> template files it was rendered with, see Layouts.select
+        self.deps = {}
+        # output path -> rendered bytes, or the error that stopped the page from rendering
+        self.pages = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def render(self, rel_path):
+        output_path = output_rel_path(rel_path).replace(os.sep, "/")
+        try:
+            with open(os.path.join(self.content_dir, rel_path), 'rb') as f:
+                metadata, md_text = parse_front_matter(decode_markdown(f.read()))
+            template, self.deps[rel_path] = self.settings.layouts.select(rel_path, metadata)
+            html = render_page(md_text, template, self.settings.page_values(rel_path), self.block_cache,
+                               metadata.get("title"))
+        except Exception as e:
+            self.deps.pop(rel_path, None)
+            with self.lock:
+                self.pages.pop(output_path, None)
+                self.errors[output_path] = f"{rel_path}: {type(e).__name__}: {e}"
+            return
+        with self.lock:
+            self.pages[output_path] = html.encode()
+            self.errors.pop(output_path, None)
+
+    def forget(self, rel_path):
+        self.deps.pop(rel_path, None)
+        output_path = output_rel_path(rel_path).replace(os.sep, "/")
+        with self.lock:
+            self.pages.pop(output_path, None)
+            self.errors.pop(output_path, None)
+
+    def rebuild(self):
+        '''Re-renders the pages whose source, layout or partials changed, returns their paths
+
+        A changed template file only re-renders the pages that were rendered with it
+        (or would pick it up if it is new), plus pages that failed last time.
+        '''
+        templates = template_snapshot(self.template_path)
+        changed_templates = set()
+        if self.templates is not None:
+            changed_templates = {path for path in templates.keys() | self.templates.keys()
+                                 if templates.get(path) != self.templates.get(path)}
+        if self.templates is None or changed_templates:
+            # Layouts reads and parses every file at most once, so a new one picks up the edits
+            self.settings = PageSettings(Layouts(self.template_path, self.basepath), self.variables, self.block_cache)
+        self.templates = templates
+
+        sources = snapshot(self.content_dir, ".md")
+        changed = []
+        for rel_path, stamp in sources.items():
+            deps = self.deps.get(rel_path)
+            stale = changed_templates and (deps is None or not changed_templates.isdisjoint(deps))
+            if stale or self.sources.get(rel_path) != stamp:
+                self.render(rel_path)
+                changed.append(rel_path)
+        for rel_path in self.sources.keys() - sources.keys():
+            self.forget(rel_path)
+            changed.append(rel_path)
+        self.sources = sources
+        return changed
+
+    def lookup(self, url_path):
+        '''Returns (status, content type, body) for a request path'''
+        path = unquote(urlsplit(url_path).path)
+        if self.basepath != "/" and path.startswith(self.basepath):
+            path = "/" + path[len(self.basepath):]
+        rel_path = path.lstrip("/")
+        if rel_path == "" or rel_path.endswith("/"):
+            candidates = [rel_path + "index.html"]
+        else:
+            candidates = [rel_path, rel_path + ".html", rel_path + "/index.html"]
+        with self.lock:
+            for candidate in candidates:
+                if candidate in self.pages:
+                    return 200, "text/html; charset=utf-8", self.pages[candidate]
+                if candidate in self.errors:
+                    return 500, "text/plain; charset=utf-8", self.errors[candidate].encode()
+        static_root = os.path.abspath(self.static_dir)
+        file_path = os.path.abspath(os.path.join(static_root, rel_path))
+        if file_path.startswith(static_root + os.sep) and os.path.isfile(file_path):
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            return 200, content_type, body
+        return 404, "text/plain; charset=utf-8", f"Not found: {path}".encode()
+
+
+def make_handler(site):
+    class DevSiteHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.respond(send_body=True)
+
+        def do_HEAD(self):
+            self.respond(send_body=False)
+
+        def respond(self, send_body):
+            status, content_type, body = site.lookup(self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if len(args) < 2 or not str(args[1]).startswith("2"):
+                logger.warning(f"{self.address_string()} - {format % args}")
+
+    return DevSiteHandler
+
+def start_server(site, port=8888, host="localhost"):
+    server = ThreadingHTTPServer((host, port), make_handler(site))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def watch(content_dir, static_dir, template_path, basepath="/", port=8888, interval=0.05,
+          variables=None, block_cache_size=1024):
+    '''Serves the site from memory and re-renders changed pages until interrupted
+
+    content/, template.html, layouts/ and partials/ are polled every interval seconds;
+    a change re-renders only the pages it affects. Static files are read from static_dir
+    on each request.
+    '''
+    site = DevSite(content_dir, static_dir, template_path, basepath, variables, block_cache_size)
+    start = time.perf_counter()
+    pages = site.rebuild()
+    logger.info(f"Rendered {len(pages)} pages in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for error in site.errors.values():
+        logger.error(f"Error generating {error}")
+    server = start_server(site, port)
+    logger.info(f"Serving on http://localhost:{server.server_address[1]}{basepath} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            changed = site.rebuild()
+            if changed:
+                elapsed = (time.perf_counter() - start) * 1000
+                logger.info(f"Rebuilt {len(changed)} page(s) in {elapsed:.1f} ms: {', '.join(changed[:5])}")
+                for rel_path in changed:
+                    error = site.errors.get(output_rel_path(rel_path).replace(os.sep, "/"))
+                    if error is not None:
+                        logger.error(f"Error generating {error}")
+    except KeyboardInterrupt:
+        logger.info("Stopping...")
+    finally:
+        server.shutdown()
+        server.server_close()
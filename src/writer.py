@@ -0,0 +1,81 @@
+import os
+import queue
+import threading
+
+# Rendered pages waiting for a writer thread before render calls start to block
+WRITE_QUEUE_SIZE = 64
+
+class PageWriter():
+    '''Writes rendered pages on background threads so disk latency overlaps rendering
+
+    submit() hands a page over and returns at once, blocking only while the bounded
+    queue is full. Each output directory is created once per writer. Errors are kept
+    per path until drain() collects them.
+    '''
+    def __init__(self, threads: int=4, queue_size: int=WRITE_QUEUE_SIZE):
+        if threads <= 0:
+            raise ValueError("writer needs at least one thread")
+        self.queue = queue.Queue(queue_size)
+        self.created_dirs = set()
+        self.errors = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def ensure_dir(self, dir_path: str):
+        if dir_path in self.created_dirs:
+            return
+        os.makedirs(dir_path, exist_ok=True)
+        with self.lock:
+            self.created_dirs.add(dir_path)
+
+    def write(self, output_file: str, text: str):
+        self.ensure_dir(os.path.dirname(output_file))
+        # Written next to the target and moved over it, readers never see half a page
+        tmp_file = f"{output_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                f.write(text)
+            os.replace(tmp_file, output_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                output_file, text = item
+                try:
+                    self.write(output_file, text)
+                except Exception as e:
+                    with self.lock:
+                        self.errors[output_file] = f"{type(e).__name__}: {e}"
+            finally:
+                self.queue.task_done()
+
+    def submit(self, output_file: str, text: str):
+        self.queue.put((output_file, text))
+
+    def drain(self) -> dict:
+        '''Waits for every submitted page, returns {output file: error} for the ones that failed'''
+        self.queue.join()
+        with self.lock:
+            errors, self.errors = self.errors, {}
+        return errors
+
+    def close(self) -> dict:
+        '''Drains the writer and stops its threads, closing it again does nothing'''
+        errors = self.drain()
+        if self.closed:
+            return errors
+        self.closed = True
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        return errors